@@ -0,0 +1,148 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import pathlib
+from typing import Any
+
+from aws_cdk import Duration
+from aws_cdk import Stack
+from aws_cdk import aws_iam as iam
+from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_s3 as s3
+from aws_cdk import aws_sns as sns
+from constructs import Construct
+
+# Where the anomalies are emitted: JSON log records, EventBridge events or SNS
+# notifications
+ANOMALY_SINKS = ("log", "eventbridge", "sns")
+
+ANOMALY_DETECTOR_PREFIX = "anomaly-detector/"
+
+
+class AnomalyDetector(Construct):
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        state_bucket: s3.Bucket,
+        work_group_name: str,
+        sink: str = "log",
+        z_score_threshold: float = 4.0,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Keeps rolling traffic statistics per app pair (overall and per hour of the
+        week) in `state_bucket`, and emits to `sink` the new results whose bytes jump
+        more than `z_score_threshold` standard deviations above them
+        """
+        super().__init__(scope, id, **kwargs)
+
+        if sink not in ANOMALY_SINKS:
+            raise ValueError(f"sink must be one of {ANOMALY_SINKS}, got: {sink}")
+
+        self.topic = self.__create_anomalies_topic() if sink == "sns" else None
+
+        self.lambda_function = self.__create_anomaly_detector_lambda_function(
+            state_bucket, sink, z_score_threshold
+        )
+        state_bucket.grant_read_write(self.lambda_function)
+
+        self.__add_iam_policies_to_lambda_function(
+            self.lambda_function, work_group_name, sink
+        )
+
+    def __create_anomalies_topic(self) -> sns.Topic:
+        """
+        Creates the SNS Topic the anomalies are notified to
+        """
+        topic = sns.Topic(
+            self,
+            "anomalies-topic",
+            topic_name="cross-az-traffic-anomalies",
+            enforce_ssl=True,
+        )
+        return topic
+
+    def __create_anomaly_detector_lambda_function(
+        self, state_bucket: s3.Bucket, sink: str, z_score_threshold: float
+    ) -> lambda_.Function:
+        """
+        Creates a Lambda Function that folds the results of each analysis run into the
+        traffic statistics, in O(new results), and emits the anomalies
+        """
+        environment = {
+            "REGION": Stack.of(self).region,
+            "CURRENT_ACCOUNT_ID": Stack.of(self).account,
+            "STATE_BUCKET_NAME": state_bucket.bucket_name,
+            "STATE_PREFIX": ANOMALY_DETECTOR_PREFIX,
+            "ANOMALY_SINK": sink,
+            "Z_SCORE_THRESHOLD": str(z_score_threshold),
+        }
+        if self.topic is not None:
+            environment["ANOMALY_TOPIC_ARN"] = self.topic.topic_arn
+
+        lambda_function = lambda_.Function(
+            self,
+            "anomaly-detector-lambda-function",
+            function_name="cross_az_traffic_anomaly_detector",
+            description="Detects cross-AZ traffic anomalies in the analysis results",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            code=lambda_.Code.from_asset(
+                str(pathlib.Path(__file__).parent.joinpath("runtime").resolve())
+            ),
+            handler="detect_anomalies.lambda_handler",
+            timeout=Duration.minutes(1),
+            environment=environment,
+            tracing=lambda_.Tracing.ACTIVE,
+        )
+        return lambda_function
+
+    def __add_iam_policies_to_lambda_function(
+        self, lambda_function: lambda_.Function, work_group_name: str, sink: str
+    ) -> None:
+        """
+        Adds necessary IAM policies to the Lambda Function's IAM Role.
+        """
+        lambda_function.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["athena:GetQueryResults"],
+                effect=iam.Effect.ALLOW,
+                resources=[
+                    Stack.of(self).format_arn(
+                        service="athena",
+                        resource="workgroup",
+                        resource_name=work_group_name,
+                    )
+                ],
+            )
+        )
+
+        if sink == "eventbridge":
+            lambda_function.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["events:PutEvents"],
+                    effect=iam.Effect.ALLOW,
+                    resources=[
+                        Stack.of(self).format_arn(
+                            service="events",
+                            resource="event-bus",
+                            resource_name="default",
+                        )
+                    ],
+                )
+            )
+
+        if self.topic is not None:
+            self.topic.grant_publish(lambda_function)
@@ -0,0 +1,198 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Iterator
+
+from sinks import SINKS
+from traffic_statistics import new_state
+from traffic_statistics import prune_statistics
+from traffic_statistics import update_statistics
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+HTTP_OK = 200
+HTTP_INTERNAL_SERVER_ERROR = 500
+
+REGION = os.getenv("REGION")
+CURRENT_ACCOUNT_ID = os.getenv("CURRENT_ACCOUNT_ID")
+STATE_BUCKET_NAME = os.getenv("STATE_BUCKET_NAME")
+STATE_PREFIX = os.getenv("STATE_PREFIX", "anomaly-detector/")
+ANOMALY_SINK = os.getenv("ANOMALY_SINK", "log")
+
+# Weight of a new observation in the pair's overall statistics, and in its hour of
+# the week statistics (seen once a week, hence a larger weight)
+EWMA_ALPHA = float(os.getenv("EWMA_ALPHA", "0.02"))
+SEASONAL_EWMA_ALPHA = float(os.getenv("SEASONAL_EWMA_ALPHA", "0.2"))
+Z_SCORE_THRESHOLD = float(os.getenv("Z_SCORE_THRESHOLD", "4"))
+MIN_SAMPLES = int(os.getenv("MIN_SAMPLES", "30"))
+PAIRS_RETENTION_SECONDS = int(os.getenv("PAIRS_RETENTION_SECONDS", str(30 * 86400)))
+
+SECONDS_PER_MINUTE = 60
+
+# Clients are created on first use and kept across warm invocations
+s3_client = None
+athena_client = None
+
+
+def get_s3_client() -> Any:
+    global s3_client
+
+    if s3_client is None:
+        import boto3
+
+        s3_client = boto3.client("s3", region_name=REGION)
+    return s3_client
+
+
+def get_athena_client() -> Any:
+    global athena_client
+
+    if athena_client is None:
+        import boto3
+
+        athena_client = boto3.client("athena", region_name=REGION)
+    return athena_client
+
+
+def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
+    """
+    Folds the results of an analysis run into the per app pair traffic statistics of
+    its source, and emits the anomalies to the configured sink.
+    The event carries the Athena QueryExecutionId of the run's results, the source, the
+    run time (the StepFunction execution start time) and the window end (the extractor's
+    run time, where the next run's window starts).
+    """
+    source = event["source"]
+    run_time = parse_execution_time(event["run_time"])
+    window_end = int(event["window_end"])
+
+    try:
+        state = load_state(source)
+    except Exception as exception:
+        error_message = (
+            f"There was a problem loading the traffic statistics: {exception}"
+        )
+        logging.error(error_message)
+        return {"statusCode": HTTP_INTERNAL_SERVER_ERROR, "body": error_message}
+
+    # The minute of the window end is partial, the next run's results complete it
+    complete_before = window_end // SECONDS_PER_MINUTE * SECONDS_PER_MINUTE
+    observations = sorted(
+        observation
+        for observation in get_query_results_rows(event["QueryExecutionId"])
+        if observation[0] < complete_before
+    )
+
+    anomalies = update_statistics(
+        state,
+        observations,
+        EWMA_ALPHA,
+        SEASONAL_EWMA_ALPHA,
+        Z_SCORE_THRESHOLD,
+        MIN_SAMPLES,
+    )
+    pruned_pairs = prune_statistics(state, run_time, PAIRS_RETENTION_SECONDS)
+    logging.info(
+        f"{len(observations)} observations of {source}, {len(anomalies)} anomalies, {len(state['pairs'])} pairs tracked ({pruned_pairs} pruned)"
+    )
+
+    if anomalies:
+        try:
+            SINKS[ANOMALY_SINK](source, anomalies)
+        except Exception as exception:
+            logging.error(f"There was a problem emitting the anomalies: {exception}")
+
+    try:
+        save_state(source, state)
+    except Exception as exception:
+        error_message = (
+            f"There was a problem saving the traffic statistics: {exception}"
+        )
+        logging.error(error_message)
+        return {"statusCode": HTTP_INTERNAL_SERVER_ERROR, "body": error_message}
+
+    return {
+        "statusCode": HTTP_OK,
+        "body": "Traffic statistics successfully updated",
+        "observations": len(observations),
+        "anomalies": len(anomalies),
+    }
+
+
+def parse_execution_time(execution_time: str) -> int:
+    """
+    Parses a StepFunction context object time (e.g. 2024-01-01T12:00:00.123Z) to epoch seconds
+    """
+    return int(
+        datetime.fromisoformat(execution_time.replace("Z", "+00:00")).timestamp()
+    )
+
+
+def get_query_results_rows(query_execution_id: str) -> Iterator[tuple[int, str, int]]:
+    """
+    Yields the (timestamp, app pair, bytes) rows of the new results query
+    """
+    paginator = get_athena_client().get_paginator("get_query_results")
+
+    is_header = True
+    for page in paginator.paginate(QueryExecutionId=query_execution_id):
+        for row in page["ResultSet"]["Rows"]:
+            if is_header:
+                is_header = False
+                continue
+
+            timestamp, pair, bytes_transfered = (
+                column.get("VarCharValue") for column in row["Data"]
+            )
+            yield int(timestamp), pair, int(bytes_transfered)
+
+
+def get_state_object_key(source: str) -> str:
+    return f"{STATE_PREFIX}state/{source}.json"
+
+
+def load_state(source: str) -> dict[str, Any]:
+    """
+    Loads the traffic statistics of the source from S3, returns a new state on the first run
+    """
+    s3_client = get_s3_client()
+
+    try:
+        response = s3_client.get_object(
+            Bucket=STATE_BUCKET_NAME,
+            Key=get_state_object_key(source),
+            ExpectedBucketOwner=CURRENT_ACCOUNT_ID,
+        )
+    except s3_client.exceptions.NoSuchKey:
+        logging.info(f"No traffic statistics found for {source}, starting fresh")
+        state: dict[str, Any] = new_state()
+    else:
+        state = json.loads(response["Body"].read())
+
+    return state
+
+
+def save_state(source: str, state: dict[str, Any]) -> None:
+    get_s3_client().put_object(
+        Bucket=STATE_BUCKET_NAME,
+        Key=get_state_object_key(source),
+        Body=json.dumps(state, separators=(",", ":")).encode("utf-8"),
+        ExpectedBucketOwner=CURRENT_ACCOUNT_ID,
+    )
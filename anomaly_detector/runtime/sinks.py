@@ -0,0 +1,101 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import logging
+import os
+from typing import Any, Callable
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+REGION = os.getenv("REGION")
+ANOMALY_TOPIC_ARN = os.getenv("ANOMALY_TOPIC_ARN")
+ANOMALY_EVENT_BUS_NAME = os.getenv("ANOMALY_EVENT_BUS_NAME", "default")
+
+ANOMALY_EVENT_SOURCE = "eks-inter-az-visibility"
+ANOMALY_EVENT_DETAIL_TYPE = "Cross-AZ Traffic Anomaly"
+
+# PutEvents takes up to 10 entries per request
+EVENTS_BATCH_SIZE = 10
+
+# Keeps the SNS message under its 256 KB limit
+MAX_ANOMALIES_PER_MESSAGE = 100
+
+# Clients are created on first use and kept across warm invocations
+clients: dict[str, Any] = {}
+
+
+def get_client(service_name: str) -> Any:
+    if service_name not in clients:
+        import boto3
+
+        clients[service_name] = boto3.client(service_name, region_name=REGION)
+    return clients[service_name]
+
+
+def emit_to_log(source: str, anomalies: list[dict[str, Any]]) -> None:
+    """
+    Logs each anomaly as a JSON record, for CloudWatch Logs metric filters or subscriptions
+    """
+    for anomaly in anomalies:
+        logging.warning(json.dumps({"source": source, **anomaly}))
+
+
+def emit_to_eventbridge(source: str, anomalies: list[dict[str, Any]]) -> None:
+    """
+    Puts each anomaly as an event on the event bus, to be routed by EventBridge rules
+    """
+    events_client = get_client("events")
+
+    for batch_start in range(0, len(anomalies), EVENTS_BATCH_SIZE):
+        entries = [
+            {
+                "Source": ANOMALY_EVENT_SOURCE,
+                "DetailType": ANOMALY_EVENT_DETAIL_TYPE,
+                "Detail": json.dumps({"source": source, **anomaly}),
+                "EventBusName": ANOMALY_EVENT_BUS_NAME,
+            }
+            for anomaly in anomalies[batch_start : batch_start + EVENTS_BATCH_SIZE]
+        ]
+        response = events_client.put_events(Entries=entries)
+        if response["FailedEntryCount"]:
+            logging.error(
+                f"{response['FailedEntryCount']} anomaly events were not put on the event bus"
+            )
+
+
+def emit_to_sns(source: str, anomalies: list[dict[str, Any]]) -> None:
+    """
+    Publishes one notification listing the anomalies of the run to the SNS topic
+    """
+    get_client("sns").publish(
+        TopicArn=ANOMALY_TOPIC_ARN,
+        Subject=f"{len(anomalies)} cross-AZ traffic anomalies in {source}"[:100],
+        Message=json.dumps(
+            {
+                "source": source,
+                "anomalies_count": len(anomalies),
+                "anomalies": anomalies[:MAX_ANOMALIES_PER_MESSAGE],
+            }
+        ),
+    )
+
+
+SINKS: dict[str, Callable[[str, list[dict[str, Any]]], None]] = {
+    "log": emit_to_log,
+    "eventbridge": emit_to_eventbridge,
+    "sns": emit_to_sns,
+}
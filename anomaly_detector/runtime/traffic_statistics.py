@@ -0,0 +1,150 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import math
+from typing import Any, Iterable, Optional
+
+HOURS_PER_WEEK = 7 * 24
+SECONDS_PER_HOUR = 3600
+
+# The epoch (1970-01-01) is a Thursday, hours of the week are counted from Monday 00:00 UTC
+EPOCH_HOUR_OF_WEEK = 3 * 24
+
+STATE_VERSION = 1
+
+# Pair statistics list layout, kept as lists to keep the state object compact:
+# [samples, mean, variance, last_seen, {hour_of_week: [samples, mean, variance]}]
+SAMPLES, MEAN, VARIANCE, LAST_SEEN, SEASONAL = range(5)
+
+# Keeps the z-score finite for pairs whose traffic never varied
+MIN_STANDARD_DEVIATION = 0.1
+
+
+def new_state() -> dict[str, Any]:
+    return {"version": STATE_VERSION, "watermark": None, "pairs": {}}
+
+
+def get_hour_of_week(timestamp: int) -> int:
+    return (timestamp // SECONDS_PER_HOUR + EPOCH_HOUR_OF_WEEK) % HOURS_PER_WEEK
+
+
+def update_ewma(
+    samples: int, mean: float, variance: float, value: float, alpha: float
+) -> tuple[int, float, float]:
+    """
+    Updates an exponentially weighted moving mean and variance with a new value.
+    Early samples get a 1/samples weight so the statistics converge from the first values.
+    """
+    weight = max(alpha, 1 / (samples + 1))
+    delta = value - mean
+
+    return (
+        samples + 1,
+        mean + weight * delta,
+        (1 - weight) * (variance + weight * delta * delta),
+    )
+
+
+def get_z_score(
+    pair_statistics: list[Any], value: float, hour_of_week: int, min_samples: int
+) -> Optional[tuple[float, float]]:
+    """
+    Returns the z-score of a value and the expected value, against the pair's hour of week
+    statistics once they have `min_samples` samples, against its overall statistics otherwise.
+    Returns None while the pair has less than `min_samples` samples.
+    """
+    seasonal_statistics = pair_statistics[SEASONAL].get(str(hour_of_week))
+    if seasonal_statistics and seasonal_statistics[SAMPLES] >= min_samples:
+        samples, mean, variance = seasonal_statistics
+    else:
+        samples, mean, variance = pair_statistics[:LAST_SEEN]
+
+    if samples < min_samples:
+        return None
+
+    standard_deviation = max(math.sqrt(variance), MIN_STANDARD_DEVIATION)
+    return (value - mean) / standard_deviation, mean
+
+
+def update_statistics(
+    state: dict[str, Any],
+    observations: Iterable[tuple[int, str, int]],
+    alpha: float,
+    seasonal_alpha: float,
+    z_score_threshold: float,
+    min_samples: int,
+) -> list[dict[str, Any]]:
+    """
+    Scores and folds the new (timestamp, app pair, bytes) observations into the state,
+    in O(observations). Observations must be sorted by timestamp, the ones at or before
+    the state watermark (the latest timestamp folded in) are skipped.
+    Returns the anomalies: the observations whose bytes jumped more than
+    `z_score_threshold` standard deviations above the pair's usual traffic.
+    Bytes are modeled on a log scale, cross-AZ traffic spans orders of magnitude.
+    """
+    anomalies = []
+    watermark = state["watermark"]
+    pairs = state["pairs"]
+
+    for timestamp, pair, bytes_transfered in observations:
+        if watermark is not None and timestamp <= watermark:
+            continue
+        state["watermark"] = max(state["watermark"] or timestamp, timestamp)
+
+        value = math.log1p(bytes_transfered)
+        hour_of_week = get_hour_of_week(timestamp)
+        pair_statistics = pairs.setdefault(pair, [0, 0.0, 0.0, timestamp, {}])
+
+        score = get_z_score(pair_statistics, value, hour_of_week, min_samples)
+        if score is not None and score[0] > z_score_threshold:
+            z_score, expected_value = score
+            anomalies.append(
+                {
+                    "timestamp": timestamp,
+                    "cross_az_traffic": pair,
+                    "bytes_transfered": bytes_transfered,
+                    "expected_bytes_transfered": round(math.expm1(expected_value)),
+                    "z_score": round(z_score, 2),
+                }
+            )
+
+        samples, mean, variance = pair_statistics[:LAST_SEEN]
+        pair_statistics[:LAST_SEEN] = update_ewma(samples, mean, variance, value, alpha)
+        pair_statistics[LAST_SEEN] = timestamp
+
+        seasonal_statistics = pair_statistics[SEASONAL].setdefault(
+            str(hour_of_week), [0, 0.0, 0.0]
+        )
+        samples, mean, variance = seasonal_statistics
+        seasonal_statistics[:] = update_ewma(
+            samples, mean, variance, value, seasonal_alpha
+        )
+
+    return anomalies
+
+
+def prune_statistics(state: dict[str, Any], now: int, retention_seconds: int) -> int:
+    """
+    Drops the pairs not seen for `retention_seconds`, returns the number of pairs dropped
+    """
+    stale_pairs = [
+        pair
+        for pair, pair_statistics in state["pairs"].items()
+        if pair_statistics[LAST_SEEN] < now - retention_seconds
+    ]
+    for pair in stale_pairs:
+        del state["pairs"][pair]
+
+    return len(stale_pairs)
@@ -22,9 +22,26 @@ pod_table_columns = [
     glue_alpha.Column(name="creation_time", type=glue_alpha.Schema.STRING),
     glue_alpha.Column(name="node", type=glue_alpha.Schema.STRING),
     glue_alpha.Column(name="az", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="az_id", type=glue_alpha.Schema.STRING),
+    # ip as a 128-bit integer (IPv4-mapped for IPv4), the keys flows are joined on
+    glue_alpha.Column(name="ip_hi", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(name="ip_lo", type=glue_alpha.Schema.BIG_INT),
+]
+
+network_interfaces_table_columns = [
+    glue_alpha.Column(name="ip", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="interface_id", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="owner_type", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="owner_name", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="app", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="az_id", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="ip_hi", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(name="ip_lo", type=glue_alpha.Schema.BIG_INT),
 ]
 
 # ${az-id} ${flow-direction} ${pkt-srcaddr} ${pkt-dstaddr} ${start} ${bytes}
+# ${packets} ${subnet-id} ${interface-id}
+# ${pkt-src-aws-service} ${pkt-dst-aws-service} ${traffic-path}
 vpc_flow_logs_table_columns = [
     glue_alpha.Column(name="az_id", type=glue_alpha.Schema.STRING),
     glue_alpha.Column(name="flow_direction", type=glue_alpha.Schema.STRING),
@@ -32,10 +49,60 @@ vpc_flow_logs_table_columns = [
     glue_alpha.Column(name="pkt_dstaddr", type=glue_alpha.Schema.STRING),
     glue_alpha.Column(name="start", type=glue_alpha.Schema.BIG_INT),
     glue_alpha.Column(name="bytes", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(name="packets", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(name="subnet_id", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="interface_id", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="pkt_src_aws_service", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="pkt_dst_aws_service", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="traffic_path", type=glue_alpha.Schema.INTEGER),
 ]
 
 athena_results_table_columns = [
     glue_alpha.Column(name="timestamp", type=glue_alpha.Schema.TIMESTAMP),
     glue_alpha.Column(name="cross_az_traffic", type=glue_alpha.Schema.STRING),
     glue_alpha.Column(name="bytes_transfered", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(name="packets_transfered", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(name="bytes_transfered_ci95", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(name="sample_rate", type=glue_alpha.Schema.DOUBLE),
+    glue_alpha.Column(name="src_az_id", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="dst_az_id", type=glue_alpha.Schema.STRING),
+]
+
+# The results tables are partitioned by day (of the results timestamp, in UTC), so the
+# anomaly detection reads the days of its window only instead of all the results
+results_partition_keys = [glue_alpha.Column(name="dt", type=glue_alpha.Schema.DATE)]
+
+# Per-shard results of a sharded analysis run, tagged with the shard attempt, until committed
+shard_results_table_columns = athena_results_table_columns + [
+    glue_alpha.Column(name="shard_attempt", type=glue_alpha.Schema.STRING),
+]
+
+# Per-source results of central analysis mode, tagged with the orchestrator run that merged them
+fleet_results_table_columns = athena_results_table_columns + [
+    glue_alpha.Column(name="source", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="run_id", type=glue_alpha.Schema.STRING),
+]
+
+fleet_cross_az_traffic_table_columns = [
+    glue_alpha.Column(name="timestamp", type=glue_alpha.Schema.TIMESTAMP),
+    glue_alpha.Column(name="cross_az_traffic", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="bytes_transfered", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(name="packets_transfered", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(name="bytes_transfered_ci95", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(name="src_az_id", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="dst_az_id", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="sources", type=glue_alpha.Schema.BIG_INT),
+]
+
+# Statistics and estimated cost of the analysis queries, per orchestrator run
+analysis_runs_table_columns = [
+    glue_alpha.Column(name="timestamp", type=glue_alpha.Schema.TIMESTAMP),
+    glue_alpha.Column(name="run_id", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="source", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="query_name", type=glue_alpha.Schema.STRING),
+    glue_alpha.Column(name="data_scanned_bytes", type=glue_alpha.Schema.BIG_INT),
+    glue_alpha.Column(
+        name="engine_execution_time_millis", type=glue_alpha.Schema.BIG_INT
+    ),
+    glue_alpha.Column(name="estimated_cost_usd", type=glue_alpha.Schema.DOUBLE),
 ]
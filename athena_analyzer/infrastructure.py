@@ -13,8 +13,8 @@
 # IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import pathlib
-from typing import Any
+from dataclasses import dataclass
+from typing import Any, cast
 
 from aws_cdk import Duration
 from aws_cdk import RemovalPolicy
@@ -22,12 +22,56 @@ from aws_cdk import aws_athena as athena
 from aws_cdk import aws_glue as glue
 from aws_cdk import aws_glue_alpha as glue_alpha
 from aws_cdk import aws_kms as kms
+from aws_cdk import aws_lambda as lambda_
 from aws_cdk import aws_s3 as s3
 from constructs import Construct
 
+from pod_metadata_extractor.infrastructure import NETWORK_INTERFACES_PREFIX
+from pod_metadata_extractor.infrastructure import PODS_METADATA_PREFIX
+
+from .glue_tables_columns import analysis_runs_table_columns
 from .glue_tables_columns import athena_results_table_columns
+from .glue_tables_columns import fleet_cross_az_traffic_table_columns
+from .glue_tables_columns import fleet_results_table_columns
+from .glue_tables_columns import network_interfaces_table_columns
 from .glue_tables_columns import pod_table_columns
+from .glue_tables_columns import results_partition_keys
+from .glue_tables_columns import shard_results_table_columns
 from .glue_tables_columns import vpc_flow_logs_table_columns
+from .query_template import ATHENA_PRICE_PER_TERABYTE_SCANNED_USD
+from .query_template import QUERY_COMMIT_SHARDS_PATH
+from .query_template import QUERY_FLEET_CROSS_AZ_TRAFFIC_PATH
+from .query_template import QUERY_NEW_RESULTS_PATH
+from .query_template import QUERY_RECORD_ANALYSIS_RUN_PATH
+from .query_template import QUERY_TRAFFIC_MATRIX_BY_APP_AND_AZ_PATH
+from .query_template import format_analysis_run_query
+from .query_template import format_commit_shards_query
+from .query_template import format_fleet_query
+from .query_template import format_new_results_query
+from .query_template import format_query
+from .query_template import format_traffic_matrix_query
+from .query_template import get_query_execution_parameter_names
+from .query_template import get_sample_buckets
+from .query_template import load_query_template
+from .query_template import validate_shard_count
+from .query_template import validate_source_id
+
+SHARD_RESULTS_PREFIX = "shards/inter-az-traffic"
+# Committed shard results are never read again, the failed attempts' ones are never committed
+SHARD_RESULTS_EXPIRATION = Duration.days(1)
+
+
+@dataclass
+class AnalysisSource:
+    """
+    A cluster analyzed in central analysis mode: its pod_metadata_extractor Lambda Function
+    and the buckets it and its VPC Flow Logs write to, possibly in another account
+    """
+
+    source_id: str
+    pod_metadata_extractor_lambda_function: lambda_.IFunction
+    pod_metadata_extractor_bucket: s3.IBucket
+    flow_logs_bucket: s3.IBucket
 
 
 class AthenaAnalyzer(Construct):
@@ -37,13 +81,35 @@ class AthenaAnalyzer(Construct):
         id: str,
         pod_metadata_extractor_bucket: s3.Bucket,
         flow_logs_bucket: s3.Bucket,
-        frequency: Duration,
         server_access_logs_bucket: s3.Bucket,
+        sample_rate: float = 1.0,
+        max_bytes_scanned_per_query: int = 100 * 1024**3,
+        price_per_terabyte_scanned: float = ATHENA_PRICE_PER_TERABYTE_SCANNED_USD,
+        shard_count: int = 1,
         **kwargs: Any,
     ) -> None:
+        """
+        `sample_rate` is the fraction (0 < sample_rate <= 1) of flow keys (source and
+        destination addresses) the analysis is run on. Flow keys are selected
+        deterministically by hash, the results are scaled up and come with 95% confidence intervals.
+
+        The queries run in a dedicated workgroup that cancels any query scanning more than
+        `max_bytes_scanned_per_query`, the runs are recorded with their estimated cost
+        at `price_per_terabyte_scanned` (USD).
+
+        With a `shard_count` above 1, the scheduled runs split the flows into `shard_count`
+        shards by source address, analyzed by independent queries whose results are
+        committed together once all of them succeeded.
+        """
         super().__init__(scope, id, **kwargs)
 
+        self.sample_buckets = get_sample_buckets(sample_rate)
+        self.shard_count = validate_shard_count(shard_count)
+
         self.results_bucket = self.__create_results_bucket(server_access_logs_bucket)
+        self.work_group_name = self.__create_work_group(
+            self.results_bucket, max_bytes_scanned_per_query
+        )
 
         self.glue_database = self.__create_glue_catalog_database()
         self.__set_glue_data_catalog_encryption(self.glue_database.catalog_id)
@@ -51,6 +117,9 @@ class AthenaAnalyzer(Construct):
         pods_table = self.__create_pods_table(
             pod_metadata_extractor_bucket, self.glue_database
         )
+        network_interfaces_table = self.__create_network_interfaces_table(
+            pod_metadata_extractor_bucket, self.glue_database
+        )
         flow_logs_table = self.__create_flow_logs_table(
             flow_logs_bucket, self.glue_database
         )
@@ -58,14 +127,95 @@ class AthenaAnalyzer(Construct):
             self.glue_database, self.results_bucket
         )
 
+        query_template = load_query_template()
+        self.query_execution_parameter_names = get_query_execution_parameter_names(
+            query_template
+        )
         self.sql_query_string = self.__create_athena_named_query(
             self.glue_database,
             pods_table,
+            network_interfaces_table,
             flow_logs_table,
             athena_results_table,
-            frequency,
+            query_template,
+        )
+
+        analysis_runs_table = self.__create_analysis_runs_table(
+            self.glue_database, self.results_bucket
+        )
+        analysis_run_query_template = load_query_template(
+            QUERY_RECORD_ANALYSIS_RUN_PATH
+        )
+        self.analysis_run_query_execution_parameter_names = (
+            get_query_execution_parameter_names(analysis_run_query_template)
+        )
+        self.analysis_run_sql_query_string = format_analysis_run_query(
+            analysis_run_query_template,
+            analysis_runs_table_name=analysis_runs_table.table_name,
+            price_per_terabyte_scanned=price_per_terabyte_scanned,
+        )
+
+        new_results_query_template = load_query_template(QUERY_NEW_RESULTS_PATH)
+        self.new_results_query_execution_parameter_names = (
+            get_query_execution_parameter_names(new_results_query_template)
+        )
+        self.new_results_sql_query_string = format_new_results_query(
+            new_results_query_template,
+            results_table_name=athena_results_table.table_name,
         )
 
+        self.__create_traffic_matrix_named_query(
+            self.glue_database, pods_table, flow_logs_table
+        )
+
+        if self.shard_count > 1:
+            shard_results_table = self.__create_shard_results_table(
+                self.glue_database, self.results_bucket
+            )
+            self.shard_query_execution_parameter_names = (
+                get_query_execution_parameter_names(query_template, sharded=True)
+            )
+            self.shard_sql_query_string = format_query(
+                query_template,
+                self.sample_buckets,
+                athena_results_table_name=shard_results_table.table_name,
+                pods_table_name=pods_table.table_name,
+                network_interfaces_table_name=network_interfaces_table.table_name,
+                vpc_flow_logs_table_name=flow_logs_table.table_name,
+                shard_count=self.shard_count,
+            )
+
+            commit_shards_query_template = load_query_template(QUERY_COMMIT_SHARDS_PATH)
+            self.commit_shards_query_execution_parameter_names = (
+                get_query_execution_parameter_names(commit_shards_query_template)
+            )
+            self.commit_shards_sql_query_string = format_commit_shards_query(
+                commit_shards_query_template,
+                athena_results_table_name=athena_results_table.table_name,
+                shard_results_table_name=shard_results_table.table_name,
+            )
+
+    def create_source_tables(
+        self, source: AnalysisSource
+    ) -> tuple[glue_alpha.Table, glue_alpha.Table, glue_alpha.Table]:
+        """
+        Creates the pods, network interfaces and VPC Flow Logs tables of a central
+        analysis mode source, their names are suffixed with the source ID
+        """
+        name_suffix = f"-{validate_source_id(source.source_id)}"
+
+        pods_table = self.__create_pods_table(
+            source.pod_metadata_extractor_bucket, self.glue_database, name_suffix
+        )
+        network_interfaces_table = self.__create_network_interfaces_table(
+            source.pod_metadata_extractor_bucket, self.glue_database, name_suffix
+        )
+        flow_logs_table = self.__create_flow_logs_table(
+            source.flow_logs_bucket, self.glue_database, name_suffix
+        )
+
+        return pods_table, network_interfaces_table, flow_logs_table
+
     def __set_glue_data_catalog_encryption(self, catalog_id: str) -> None:
         encryption_at_rest_settings = (
             glue.CfnDataCatalogEncryptionSettings.EncryptionAtRestProperty(
@@ -100,6 +250,37 @@ class AthenaAnalyzer(Construct):
         )
         return bucket
 
+    def __create_work_group(
+        self, results_bucket: s3.Bucket, max_bytes_scanned_per_query: int
+    ) -> str:
+        """
+        Creates the Athena workgroup of the analysis queries, it enforces the results
+        location and encryption, and cancels the queries that scan more than
+        `max_bytes_scanned_per_query` (e.g. the whole flow logs bucket on an unpruned window)
+        """
+        result_configuration = athena.CfnWorkGroup.ResultConfigurationProperty(
+            output_location=f"s3://{results_bucket.bucket_name}/query_results/",
+            encryption_configuration=athena.CfnWorkGroup.EncryptionConfigurationProperty(
+                encryption_option="SSE_S3"
+            ),
+        )
+
+        work_group = athena.CfnWorkGroup(
+            self,
+            "work-group",
+            name="eks-inter-az-visibility",
+            description="Runs the inter-az traffic analysis queries",
+            recursive_delete_option=True,
+            work_group_configuration=athena.CfnWorkGroup.WorkGroupConfigurationProperty(
+                bytes_scanned_cutoff_per_query=max_bytes_scanned_per_query,
+                enforce_work_group_configuration=True,
+                publish_cloud_watch_metrics_enabled=True,
+                result_configuration=result_configuration,
+            ),
+        )
+
+        return work_group.ref
+
     def __create_glue_catalog_database(self) -> glue_alpha.Database:
         glue_database = glue_alpha.Database(
             self,
@@ -110,32 +291,70 @@ class AthenaAnalyzer(Construct):
 
     def __create_pods_table(
         self,
-        pod_metadata_extractor_bucket: s3.Bucket,
+        pod_metadata_extractor_bucket: s3.IBucket,
         glue_database: glue_alpha.Database,
+        name_suffix: str = "",
     ) -> glue_alpha.Table:
         pods_table = glue_alpha.Table(
             self,
-            "pods-table",
-            table_name="pods-table",
+            f"pods-table{name_suffix}",
+            table_name=f"pods-table{name_suffix}",
             database=glue_database,
             columns=pod_table_columns,
             data_format=glue_alpha.DataFormat.CSV,
             bucket=pod_metadata_extractor_bucket,
+            s3_prefix=PODS_METADATA_PREFIX,
         )
 
         # Inject skip.header.line.count = 1 Glue Table Propertie
         cfn_pods_table = pods_table.node.default_child
-        cfn_pods_table.add_override("Properties.TableInput.Parameters.skip\.header\.line\.count", "1")
+        cfn_pods_table.add_override(
+            r"Properties.TableInput.Parameters.skip\.header\.line\.count", "1"
+        )
 
         return pods_table
 
+    def __create_network_interfaces_table(
+        self,
+        pod_metadata_extractor_bucket: s3.IBucket,
+        glue_database: glue_alpha.Database,
+        name_suffix: str = "",
+    ) -> glue_alpha.Table:
+        """
+        Creates the table of the load balancer ENIs and node IPs, used to resolve
+        load balancer and NodePort hops
+        """
+        network_interfaces_table = glue_alpha.Table(
+            self,
+            f"network-interfaces-table{name_suffix}",
+            table_name=f"network-interfaces-table{name_suffix}",
+            database=glue_database,
+            columns=network_interfaces_table_columns,
+            data_format=glue_alpha.DataFormat.CSV,
+            bucket=pod_metadata_extractor_bucket,
+            s3_prefix=NETWORK_INTERFACES_PREFIX,
+        )
+
+        # Inject skip.header.line.count = 1 Glue Table Propertie
+        cfn_network_interfaces_table = cast(
+            glue.CfnTable, network_interfaces_table.node.default_child
+        )
+        cfn_network_interfaces_table.add_override(
+            r"Properties.TableInput.Parameters.skip\.header\.line\.count", "1"
+        )
+
+        return network_interfaces_table
+
     def __create_flow_logs_table(
-        self, flow_logs_bucket: s3.Bucket, glue_database: glue_alpha.Database
+        self,
+        flow_logs_bucket: s3.IBucket,
+        glue_database: glue_alpha.Database,
+        name_suffix: str = "",
     ) -> glue_alpha.Table:
         flow_logs_table = glue_alpha.Table(
             self,
-            "flow-logs-table",
-            table_name="vpc-flow-logs-table",
+            f"flow-logs-table{name_suffix}",
+            table_name=f"vpc-flow-logs-table{name_suffix}",
             database=glue_database,
             columns=vpc_flow_logs_table_columns,
             data_format=glue_alpha.DataFormat.PARQUET,
@@ -152,28 +371,70 @@ class AthenaAnalyzer(Construct):
             table_name="athena-results-table",
             database=glue_database,
             columns=athena_results_table_columns,
+            partition_keys=results_partition_keys,
             data_format=glue_alpha.DataFormat.PARQUET,
             bucket=bucket,
             s3_prefix="inter-az-traffic",
         )
         return athena_results_table
 
+    def __create_shard_results_table(
+        self, glue_database: glue_alpha.Database, bucket: s3.Bucket
+    ) -> glue_alpha.Table:
+        """
+        Creates the table the shards of a sharded run write to, before their results are
+        committed to the results table. Its objects expire after SHARD_RESULTS_EXPIRATION,
+        so the commit query scans a day of shard results at most
+        """
+        bucket.add_lifecycle_rule(
+            id="expire-shard-results",
+            prefix=f"{SHARD_RESULTS_PREFIX}/",
+            expiration=SHARD_RESULTS_EXPIRATION,
+        )
+
+        shard_results_table = glue_alpha.Table(
+            self,
+            "shard-results-table",
+            table_name="shard-results-table",
+            database=glue_database,
+            columns=shard_results_table_columns,
+            partition_keys=results_partition_keys,
+            data_format=glue_alpha.DataFormat.PARQUET,
+            bucket=bucket,
+            s3_prefix=SHARD_RESULTS_PREFIX,
+        )
+        return shard_results_table
+
+    def __create_analysis_runs_table(
+        self, glue_database: glue_alpha.Database, bucket: s3.Bucket
+    ) -> glue_alpha.Table:
+        analysis_runs_table = glue_alpha.Table(
+            self,
+            "analysis-runs-table",
+            table_name="analysis-runs-table",
+            database=glue_database,
+            columns=analysis_runs_table_columns,
+            data_format=glue_alpha.DataFormat.PARQUET,
+            bucket=bucket,
+            s3_prefix="analysis-runs",
+        )
+        return analysis_runs_table
+
     def __create_athena_named_query(
         self,
         glue_database: glue_alpha.Database,
         pods_table: glue_alpha.Table,
+        network_interfaces_table: glue_alpha.Table,
         flow_logs_table: glue_alpha.Table,
         athena_results_table: glue_alpha.Table,
-        frequency: Duration,
+        query_template: str,
     ) -> athena.CfnNamedQuery:
-        query_cross_az_traffic_by_app_path = self.__get_query_template_file_path()
-
         query_cross_az_traffic_by_app = self.__get_formatted_query(
             pods_table,
+            network_interfaces_table,
             flow_logs_table,
             athena_results_table,
-            query_cross_az_traffic_by_app_path,
-            frequency,
+            query_template,
         )
 
         query = athena.CfnNamedQuery(
@@ -181,43 +442,198 @@ class AthenaAnalyzer(Construct):
             "query-cross-az-traffic-by-app",
             name="query-cross-az-traffic-by-app",
             database=glue_database.database_name,
+            work_group=self.work_group_name,
             query_string=query_cross_az_traffic_by_app,
             description="Joins VPC Flow Logs and pod-metadata-extractor results to gain visibility of inter-az traffic between pods in an EKS cluster",
         )
 
         return query.query_string
 
-    def __get_query_template_file_path(self) -> str:
-        queries_dir_path = str(
-            pathlib.Path(__file__).parent.joinpath("queries").resolve()
-        )
-        query_cross_az_traffic_by_app_path = (
-            f"{queries_dir_path}/cross_az_traffic_by_app.sql"
+    def __create_traffic_matrix_named_query(
+        self,
+        glue_database: glue_alpha.Database,
+        pods_table: glue_alpha.Table,
+        flow_logs_table: glue_alpha.Table,
+    ) -> None:
+        """
+        The app pair / AZ pair traffic matrix is only needed for the (on demand) placement
+        recommendations, it is not part of the scheduled analysis runs
+        """
+        athena.CfnNamedQuery(
+            self,
+            "query-traffic-matrix-by-app-and-az",
+            name="query-traffic-matrix-by-app-and-az",
+            database=glue_database.database_name,
+            work_group=self.work_group_name,
+            query_string=format_traffic_matrix_query(
+                load_query_template(QUERY_TRAFFIC_MATRIX_BY_APP_AND_AZ_PATH),
+                pods_table_name=pods_table.table_name,
+                vpc_flow_logs_table_name=flow_logs_table.table_name,
+            ),
+            description="Selects the traffic between apps by AZ pair, same-AZ traffic included, the input of the placement recommendations",
         )
-        return query_cross_az_traffic_by_app_path
 
     def __get_formatted_query(
         self,
         pods_table: glue_alpha.Table,
+        network_interfaces_table: glue_alpha.Table,
         flow_logs_table: glue_alpha.Table,
         athena_results_table: glue_alpha.Table,
-        query_cross_az_traffic_by_app_path: str,
-        invokation_frequency: Duration,
+        query_template: str,
     ) -> str:
-        query_cross_az_traffic_by_app = ""
-
-        with open(query_cross_az_traffic_by_app_path, "r") as file:
-            for line in file:
-                # Skip comment-lines that start with '#'
-                if line.startswith("#"):
-                    continue
-                query_cross_az_traffic_by_app += line
-
-        query_cross_az_traffic_by_app = query_cross_az_traffic_by_app.format(
+        query_cross_az_traffic_by_app = format_query(
+            query_template,
+            self.sample_buckets,
             athena_results_table_name=athena_results_table.table_name,
             pods_table_name=pods_table.table_name,
+            network_interfaces_table_name=network_interfaces_table.table_name,
             vpc_flow_logs_table_name=flow_logs_table.table_name,
-            invokation_frequency=invokation_frequency.to_minutes(),
         )
 
         return query_cross_az_traffic_by_app
+
+
+class FleetAthenaAnalyzer(Construct):
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        athena_analyzer: AthenaAnalyzer,
+        sources: list[AnalysisSource],
+        **kwargs: Any,
+    ) -> None:
+        """
+        Central analysis mode: catalogs the pod snapshots and VPC Flow Logs of several
+        sources (clusters in other VPCs or accounts sharing AZ IDs) in the `athena_analyzer`
+        database. Each source has its own query, the results of a run are then merged
+        into a fleet-wide cross-AZ traffic table
+        """
+        super().__init__(scope, id, **kwargs)
+
+        self.glue_database = athena_analyzer.glue_database
+        self.results_bucket = athena_analyzer.results_bucket
+        self.work_group_name = athena_analyzer.work_group_name
+        self.analysis_run_query_execution_parameter_names = (
+            athena_analyzer.analysis_run_query_execution_parameter_names
+        )
+        self.analysis_run_sql_query_string = (
+            athena_analyzer.analysis_run_sql_query_string
+        )
+
+        fleet_results_table = self.__create_fleet_results_table(
+            self.glue_database, self.results_bucket
+        )
+        fleet_cross_az_traffic_table = self.__create_fleet_cross_az_traffic_table(
+            self.glue_database, self.results_bucket
+        )
+
+        query_template = load_query_template()
+        self.query_execution_parameter_names = get_query_execution_parameter_names(
+            query_template, fleet=True
+        )
+        self.source_query_strings = {
+            source.source_id: self.__get_formatted_source_query(
+                athena_analyzer,
+                source,
+                fleet_results_table,
+                query_template,
+            )
+            for source in sources
+        }
+
+        new_results_query_template = load_query_template(QUERY_NEW_RESULTS_PATH)
+        self.new_results_query_execution_parameter_names = (
+            get_query_execution_parameter_names(new_results_query_template)
+        )
+        self.source_new_results_query_strings = {
+            source.source_id: format_new_results_query(
+                new_results_query_template,
+                results_table_name=fleet_results_table.table_name,
+                source_id=source.source_id,
+            )
+            for source in sources
+        }
+
+        fleet_query_template = load_query_template(QUERY_FLEET_CROSS_AZ_TRAFFIC_PATH)
+        self.fleet_query_execution_parameter_names = (
+            get_query_execution_parameter_names(fleet_query_template)
+        )
+        self.fleet_sql_query_string = self.__create_fleet_athena_named_query(
+            fleet_results_table, fleet_cross_az_traffic_table, fleet_query_template
+        )
+
+    def __create_fleet_results_table(
+        self, glue_database: glue_alpha.Database, bucket: s3.Bucket
+    ) -> glue_alpha.Table:
+        fleet_results_table = glue_alpha.Table(
+            self,
+            "fleet-results-table",
+            table_name="fleet-results-table",
+            database=glue_database,
+            columns=fleet_results_table_columns,
+            partition_keys=results_partition_keys,
+            data_format=glue_alpha.DataFormat.PARQUET,
+            bucket=bucket,
+            s3_prefix="fleet-inter-az-traffic/by-source",
+        )
+        return fleet_results_table
+
+    def __create_fleet_cross_az_traffic_table(
+        self, glue_database: glue_alpha.Database, bucket: s3.Bucket
+    ) -> glue_alpha.Table:
+        fleet_cross_az_traffic_table = glue_alpha.Table(
+            self,
+            "fleet-cross-az-traffic-table",
+            table_name="fleet-cross-az-traffic-table",
+            database=glue_database,
+            columns=fleet_cross_az_traffic_table_columns,
+            data_format=glue_alpha.DataFormat.PARQUET,
+            bucket=bucket,
+            s3_prefix="fleet-inter-az-traffic/fleet",
+        )
+        return fleet_cross_az_traffic_table
+
+    def __get_formatted_source_query(
+        self,
+        athena_analyzer: AthenaAnalyzer,
+        source: AnalysisSource,
+        fleet_results_table: glue_alpha.Table,
+        query_template: str,
+    ) -> str:
+        pods_table, network_interfaces_table, flow_logs_table = (
+            athena_analyzer.create_source_tables(source)
+        )
+
+        return format_query(
+            query_template,
+            athena_analyzer.sample_buckets,
+            athena_results_table_name=fleet_results_table.table_name,
+            pods_table_name=pods_table.table_name,
+            network_interfaces_table_name=network_interfaces_table.table_name,
+            vpc_flow_logs_table_name=flow_logs_table.table_name,
+            source_id=source.source_id,
+        )
+
+    def __create_fleet_athena_named_query(
+        self,
+        fleet_results_table: glue_alpha.Table,
+        fleet_cross_az_traffic_table: glue_alpha.Table,
+        query_template: str,
+    ) -> str:
+        query_fleet_cross_az_traffic = format_fleet_query(
+            query_template,
+            fleet_results_table_name=fleet_results_table.table_name,
+            fleet_cross_az_traffic_table_name=fleet_cross_az_traffic_table.table_name,
+        )
+
+        query = athena.CfnNamedQuery(
+            self,
+            "query-fleet-cross-az-traffic",
+            name="query-fleet-cross-az-traffic",
+            database=self.glue_database.database_name,
+            work_group=self.work_group_name,
+            query_string=query_fleet_cross_az_traffic,
+            description="Merges the per-source inter-az traffic of an orchestrator run into fleet-wide inter-az traffic",
+        )
+
+        return query.query_string
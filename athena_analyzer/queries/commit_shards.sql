@@ -0,0 +1,31 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Commits the results of a sharded run: only the rows of the successful attempt of each shard are
+# merged, those of the failed attempts are left out. Shards have disjoint flow keys, so their
+# 95% confidence interval half-widths add in quadrature
+INSERT INTO "{athena_results_table_name}"
+SELECT timestamp, cross_az_traffic,
+sum(bytes_transfered) as bytes_transfered,
+sum(packets_transfered) as packets_transfered,
+CAST(round(sqrt(sum(CAST(bytes_transfered_ci95 AS double) * bytes_transfered_ci95))) AS bigint) as bytes_transfered_ci95,
+sample_rate,
+src_az_id,
+dst_az_id,
+dt
+FROM "{shard_results_table_name}"
+WHERE strpos({shard_attempts}, concat('"', shard_attempt, '"')) > 0
+GROUP BY timestamp, cross_az_traffic, sample_rate, src_az_id, dst_az_id, dt
+ORDER BY timestamp, bytes_transfered DESC
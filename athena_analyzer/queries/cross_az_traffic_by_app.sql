@@ -15,25 +15,55 @@
 
 INSERT INTO "{athena_results_table_name}"
 WITH
-ip_addresses_and_az_mapping AS (
-SELECT DISTINCT pkt_srcaddr as ipaddress, az_id
-FROM "{vpc_flow_logs_table_name}"
-WHERE flow_direction = 'egress'
-and from_unixtime("{vpc_flow_logs_table_name}".start)>(CURRENT_TIMESTAMP - ({invokation_frequency} * interval '1' minute))
+# Pods, load balancer ENIs and nodes (NodePort hops) are all endpoints a flow can be attributed to.
+# A flow through a hop is attributed as two legs, to and from the hop: the legs are not stitched
+endpoints AS (
+SELECT name, ip_hi, ip_lo, app, az_id FROM "{pods_table_name}"
+UNION ALL
+SELECT owner_name as name, ip_hi, ip_lo, app, az_id FROM "{network_interfaces_table_name}"
 ),
-egress_flows_of_pods_with_status AS (
+
+# Addresses are parsed once and joined as 128-bit integers (high and low BIGINT halves of
+# the IPADDRESS binary form) instead of comparing variable-length strings
+egress_flows AS (
 SELECT
-"{pods_table_name}".name as srcpodname,
-"{pods_table_name}".app as srcpodapp,
 pkt_srcaddr as srcaddr,
 pkt_dstaddr as dstaddr,
-"{vpc_flow_logs_table_name}".az_id as srcazid,
-bytes, 
+from_big_endian_64(substr(CAST(TRY_CAST(pkt_srcaddr AS IPADDRESS) AS VARBINARY), 1, 8)) as srcaddr_hi,
+from_big_endian_64(substr(CAST(TRY_CAST(pkt_srcaddr AS IPADDRESS) AS VARBINARY), 9, 8)) as srcaddr_lo,
+from_big_endian_64(substr(CAST(TRY_CAST(pkt_dstaddr AS IPADDRESS) AS VARBINARY), 1, 8)) as dstaddr_hi,
+from_big_endian_64(substr(CAST(TRY_CAST(pkt_dstaddr AS IPADDRESS) AS VARBINARY), 9, 8)) as dstaddr_lo,
+az_id as srcazid,
+bytes,
+packets,
 start
 FROM "{vpc_flow_logs_table_name}"
-INNER JOIN "{pods_table_name}" ON "{vpc_flow_logs_table_name}".pkt_srcaddr = "{pods_table_name}".ip
 WHERE flow_direction = 'egress'
-and from_unixtime("{vpc_flow_logs_table_name}".start)>(CURRENT_TIMESTAMP - ({invokation_frequency} * interval '1' minute))
+and start > {window_start}
+# Cheap prefilter on the endpoints' address space, keeps only candidate flows for the joins
+and any_match(split({pod_cidrs}, ','), cidr -> contains(cidr, TRY_CAST(pkt_srcaddr AS IPADDRESS)))
+and any_match(split({pod_cidrs}, ','), cidr -> contains(cidr, TRY_CAST(pkt_dstaddr AS IPADDRESS)))
+and coalesce(pkt_src_aws_service, '-') = '-'
+and coalesce(pkt_dst_aws_service, '-') = '-'
+and {flow_sample_predicate}
+# Sharded runs split the flows by source address, every shard has all the flows of its pods
+and {flow_shard_predicate}
+),
+
+egress_flows_of_pods_with_status AS (
+SELECT
+srcendpoint.name as srcpodname,
+srcendpoint.app as srcpodapp,
+srcaddr,
+dstaddr,
+dstaddr_hi,
+dstaddr_lo,
+srcazid,
+bytes,
+packets,
+start
+FROM egress_flows
+INNER JOIN endpoints srcendpoint ON srcaddr_hi = srcendpoint.ip_hi AND srcaddr_lo = srcendpoint.ip_lo
 ),
 
 cross_az_traffic_by_pod as (
@@ -42,20 +72,47 @@ srcaddr,
 srcpodname,
 srcpodapp,
 dstaddr,
-"{pods_table_name}".name as dstpodname,
-"{pods_table_name}".app as dstpodapp,
+dstendpoint.name as dstpodname,
+dstendpoint.app as dstpodapp,
 srcazid,
-ip_addresses_and_az_mapping.az_id as dstazid,
+dstendpoint.az_id as dstazid,
 bytes,
+packets,
 start
 FROM egress_flows_of_pods_with_status
-INNER JOIN "{pods_table_name}" ON dstaddr = "{pods_table_name}".ip
-LEFT JOIN ip_addresses_and_az_mapping ON dstaddr = ipaddress
-WHERE ip_addresses_and_az_mapping.az_id != srcazid
-)
+INNER JOIN endpoints dstendpoint ON dstaddr_hi = dstendpoint.ip_hi AND dstaddr_lo = dstendpoint.ip_lo
+# Endpoints whose AZ could not be resolved are not counted as cross-AZ
+WHERE dstendpoint.az_id != srcazid AND dstendpoint.az_id != '<none>'
+),
 
-SELECT date_trunc('MINUTE', from_unixtime(start)) AS time, CONCAT(srcpodapp, ' -> ', dstpodapp) as inter_az_traffic, sum(bytes) as total_bytes
+cross_az_traffic_by_flow_key as (
+SELECT
+date_trunc('MINUTE', from_unixtime(start)) AS time,
+srcpodapp,
+dstpodapp,
+srcaddr,
+dstaddr,
+srcazid,
+dstazid,
+sum(bytes) as bytes,
+sum(packets) as packets
 FROM cross_az_traffic_by_pod
 WHERE srcpodapp!='<none>' AND dstpodapp!='<none>'
-GROUP BY date_trunc('MINUTE', from_unixtime(start)), CONCAT(srcpodapp, ' -> ', dstpodapp)
-ORDER BY time, total_bytes DESC
\ No newline at end of file
+GROUP BY date_trunc('MINUTE', from_unixtime(start)), srcpodapp, dstpodapp, srcaddr, dstaddr, srcazid, dstazid
+)
+
+# Results are by minute, app pair and AZ pair.
+# Flow keys are sampled with probability {sample_rate}: totals are scaled up (Horvitz-Thompson)
+# and the 95% confidence interval half-width is derived from the sampled flow keys' variance.
+# The day partition column comes last, see results_partition_keys
+SELECT time, CONCAT(srcpodapp, ' -> ', dstpodapp) as inter_az_traffic,
+CAST(round(sum(bytes) / {sample_rate}) AS bigint) as total_bytes,
+CAST(round(sum(packets) / {sample_rate}) AS bigint) as total_packets,
+CAST(round(1.96 * sqrt((1 - {sample_rate}) * sum(CAST(bytes AS double) * bytes)) / {sample_rate}) AS bigint) as total_bytes_ci95,
+{sample_rate} as sample_rate,
+srcazid as src_az_id,
+dstazid as dst_az_id{source_columns},
+CAST(time AS date) as dt
+FROM cross_az_traffic_by_flow_key
+GROUP BY time, CONCAT(srcpodapp, ' -> ', dstpodapp), srcazid, dstazid
+ORDER BY time, total_bytes DESC
@@ -0,0 +1,23 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# The results of the analyzed window by minute and app pair, for the anomaly detection. The first minute of
+# the window also holds the end of the previous window: it is complete once both are summed up.
+# The day partitions of the window bound the results scanned
+SELECT CAST(to_unixtime(timestamp) AS bigint) as timestamp, cross_az_traffic, sum(bytes_transfered) as bytes_transfered
+FROM "{results_table_name}"
+WHERE dt >= CAST(from_unixtime({window_start}) AS date)
+AND timestamp >= date_trunc('minute', from_unixtime({window_start})){source_predicate}
+GROUP BY timestamp, cross_az_traffic
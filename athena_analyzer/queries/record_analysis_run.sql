@@ -0,0 +1,25 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Records the statistics of an analysis query, its estimated cost is derived from the billed bytes:
+# the bytes scanned rounded up to the megabyte, 10 MB at least
+INSERT INTO "{analysis_runs_table_name}"
+SELECT CAST(current_timestamp AS timestamp) as timestamp,
+{run_id} as run_id,
+{source} as source,
+{query_name} as query_name,
+CAST({data_scanned_bytes} AS bigint) as data_scanned_bytes,
+CAST({engine_execution_time_millis} AS bigint) as engine_execution_time_millis,
+greatest(ceiling(CAST({data_scanned_bytes} AS double) / {billed_bytes_increment}), {min_billed_increments}) * {price_per_billed_increment} as estimated_cost_usd
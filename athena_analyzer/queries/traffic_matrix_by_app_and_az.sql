@@ -0,0 +1,46 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# App pair / AZ pair traffic matrix since {window_start}, same-AZ traffic included: the input of
+# the placement recommendations (python -m placement_recommender). Only pod to pod flows are
+# kept, the traffic zone-local routing of a Service can keep in the clients' AZ.
+WITH
+egress_flows AS (
+SELECT
+from_big_endian_64(substr(CAST(TRY_CAST(pkt_srcaddr AS IPADDRESS) AS VARBINARY), 1, 8)) as srcaddr_hi,
+from_big_endian_64(substr(CAST(TRY_CAST(pkt_srcaddr AS IPADDRESS) AS VARBINARY), 9, 8)) as srcaddr_lo,
+from_big_endian_64(substr(CAST(TRY_CAST(pkt_dstaddr AS IPADDRESS) AS VARBINARY), 1, 8)) as dstaddr_hi,
+from_big_endian_64(substr(CAST(TRY_CAST(pkt_dstaddr AS IPADDRESS) AS VARBINARY), 9, 8)) as dstaddr_lo,
+az_id as srcazid,
+bytes
+FROM "{vpc_flow_logs_table_name}"
+WHERE flow_direction = 'egress'
+and start > {window_start}
+and coalesce(pkt_src_aws_service, '-') = '-'
+and coalesce(pkt_dst_aws_service, '-') = '-'
+)
+
+SELECT
+srcpod.app as src_app,
+dstpod.app as dst_app,
+srcazid as src_az_id,
+dstpod.az_id as dst_az_id,
+sum(bytes) as bytes
+FROM egress_flows
+INNER JOIN "{pods_table_name}" srcpod ON srcaddr_hi = srcpod.ip_hi AND srcaddr_lo = srcpod.ip_lo
+INNER JOIN "{pods_table_name}" dstpod ON dstaddr_hi = dstpod.ip_hi AND dstaddr_lo = dstpod.ip_lo
+WHERE srcpod.app != '<none>' AND dstpod.app != '<none>' AND dstpod.az_id != '<none>'
+GROUP BY srcpod.app, dstpod.app, srcazid, dstpod.az_id
+ORDER BY bytes DESC
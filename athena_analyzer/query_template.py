@@ -0,0 +1,317 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import pathlib
+import re
+import string
+from typing import Optional
+
+QUERIES_DIR_PATH = pathlib.Path(__file__).parent.joinpath("queries").resolve()
+
+QUERY_CROSS_AZ_TRAFFIC_BY_APP_PATH = str(
+    QUERIES_DIR_PATH.joinpath("cross_az_traffic_by_app.sql")
+)
+
+QUERY_FLEET_CROSS_AZ_TRAFFIC_PATH = str(
+    QUERIES_DIR_PATH.joinpath("fleet_cross_az_traffic.sql")
+)
+
+QUERY_RECORD_ANALYSIS_RUN_PATH = str(
+    QUERIES_DIR_PATH.joinpath("record_analysis_run.sql")
+)
+
+QUERY_NEW_RESULTS_PATH = str(QUERIES_DIR_PATH.joinpath("new_results.sql"))
+
+QUERY_TRAFFIC_MATRIX_BY_APP_AND_AZ_PATH = str(
+    QUERIES_DIR_PATH.joinpath("traffic_matrix_by_app_and_az.sql")
+)
+
+QUERY_COMMIT_SHARDS_PATH = str(QUERIES_DIR_PATH.joinpath("commit_shards.sql"))
+
+# Query placeholders bound at execution time (Athena execution parameters) from the
+# pod_metadata_extractor Lambda Function output, instead of being rendered at synth time
+QUERY_EXECUTION_PARAMETERS = ("window_start", "pod_cidrs")
+
+# In central analysis mode the per-source results are tagged with the orchestrator run
+# (bound at execution time too), which then merges them into the fleet-wide results
+FLEET_QUERY_EXECUTION_PARAMETERS = ("run_id",)
+
+# Sharded analysis queries select the flows of their shard, their results are tagged with
+# the shard attempt (run ID, shard and attempt) until the orchestrator commits them
+SHARD_QUERY_EXECUTION_PARAMETERS = ("shard", "shard_attempt")
+
+# The committed shard attempts, a JSON array of strings
+COMMIT_SHARDS_QUERY_EXECUTION_PARAMETERS = ("shard_attempts",)
+
+# The statistics of an analysis query, recorded by the orchestrator once it completes
+ANALYSIS_RUN_QUERY_EXECUTION_PARAMETERS = (
+    "run_id",
+    "source",
+    "query_name",
+    "data_scanned_bytes",
+    "engine_execution_time_millis",
+)
+
+# Athena bills the bytes scanned rounded up to the megabyte, with a 10 MB minimum per query
+ATHENA_BILLED_BYTES_INCREMENT = 1024**2
+ATHENA_MIN_BILLED_BYTES = 10 * ATHENA_BILLED_BYTES_INCREMENT
+ATHENA_PRICE_PER_TERABYTE_SCANNED_USD = 5.0
+
+# Source IDs end up in Glue table names and SQL string literals
+SOURCE_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,31}$")
+
+# Flow keys are hashed into FLOW_SAMPLE_BUCKETS buckets, the sample rate is rounded to a bucket
+FLOW_SAMPLE_BUCKETS = 65536
+
+# Source addresses are hashed into FLOW_SHARD_BUCKETS buckets, spread over the shards
+FLOW_SHARD_BUCKETS = 65536
+
+
+def validate_shard_count(shard_count: int) -> int:
+    if not 1 <= shard_count <= FLOW_SHARD_BUCKETS:
+        raise ValueError(
+            f"shard_count must be in [1, {FLOW_SHARD_BUCKETS}], got: {shard_count}"
+        )
+
+    return shard_count
+
+
+def get_sample_buckets(sample_rate: float) -> int:
+    """
+    Returns the number of flow key hash buckets kept for a sample rate in (0, 1]
+    """
+    if not 0 < sample_rate <= 1:
+        raise ValueError(f"sample_rate must be in (0, 1], got: {sample_rate}")
+
+    return max(round(sample_rate * FLOW_SAMPLE_BUCKETS), 1)
+
+
+def load_query_template(query_path: str = QUERY_CROSS_AZ_TRAFFIC_BY_APP_PATH) -> str:
+    query_template = ""
+
+    with open(query_path, "r") as file:
+        for line in file:
+            # Skip comment-lines that start with '#'
+            if line.startswith("#"):
+                continue
+            query_template += line
+
+    return query_template
+
+
+def validate_source_id(source_id: str) -> str:
+    if not SOURCE_ID_PATTERN.match(source_id):
+        raise ValueError(
+            f"source_id must match {SOURCE_ID_PATTERN.pattern}, got: {source_id}"
+        )
+
+    return source_id
+
+
+def get_query_execution_parameter_names(
+    query_template: str, fleet: bool = False, sharded: bool = False
+) -> list[str]:
+    """
+    Returns the names of the execution parameters, in the order of their
+    positional '?' placeholders in the formatted query. Fleet (per-source) queries
+    end with the source columns, hence with the fleet execution parameters. Sharded
+    queries end with the shard predicate, then with the shard attempt column
+    """
+    execution_parameter_names = [
+        field_name
+        for _, field_name, _, _ in string.Formatter().parse(query_template)
+        if field_name
+        in QUERY_EXECUTION_PARAMETERS
+        + FLEET_QUERY_EXECUTION_PARAMETERS
+        + ANALYSIS_RUN_QUERY_EXECUTION_PARAMETERS
+        + COMMIT_SHARDS_QUERY_EXECUTION_PARAMETERS
+    ]
+
+    if fleet:
+        execution_parameter_names.extend(FLEET_QUERY_EXECUTION_PARAMETERS)
+    if sharded:
+        execution_parameter_names.extend(SHARD_QUERY_EXECUTION_PARAMETERS)
+
+    return execution_parameter_names
+
+
+def get_source_columns(source_id: Optional[str]) -> str:
+    """
+    Returns the SQL select list suffix tagging the results of a fleet source
+    with its ID and the orchestrator run ID
+    """
+    if source_id is None:
+        return ""
+
+    return f", '{validate_source_id(source_id)}' as source, ? as run_id"
+
+
+def get_shard_columns(shard_count: int) -> str:
+    """
+    Returns the SQL select list suffix tagging the results of a sharded query with the shard attempt
+    """
+    if shard_count == 1:
+        return ""
+
+    return ", ? as shard_attempt"
+
+
+def get_flow_shard_predicate(shard_count: int) -> str:
+    """
+    Returns the SQL predicate that selects the flows of the shard (execution parameter)
+    by a hash of their source address
+    """
+    if validate_shard_count(shard_count) == 1:
+        return "TRUE"
+
+    source_address_hash = "from_big_endian_64(xxhash64(to_utf8(pkt_srcaddr)))"
+    return f"mod(bitwise_and({source_address_hash}, {FLOW_SHARD_BUCKETS - 1}), {shard_count}) = ?"
+
+
+def get_flow_sample_predicate(sample_buckets: int) -> str:
+    """
+    Returns the SQL predicate that deterministically selects the sampled flow keys
+    """
+    if sample_buckets == FLOW_SAMPLE_BUCKETS:
+        return "TRUE"
+
+    flow_key_hash = (
+        "from_big_endian_64(xxhash64(to_utf8(concat(pkt_srcaddr, '>', pkt_dstaddr))))"
+    )
+    return f"bitwise_and({flow_key_hash}, {FLOW_SAMPLE_BUCKETS - 1}) < {sample_buckets}"
+
+
+def format_query(
+    query_template: str,
+    sample_buckets: int,
+    athena_results_table_name: str,
+    pods_table_name: str,
+    network_interfaces_table_name: str,
+    vpc_flow_logs_table_name: str,
+    source_id: Optional[str] = None,
+    shard_count: int = 1,
+) -> str:
+    """
+    Renders the query template, execution parameters are left as '?' placeholders.
+    Queries of a fleet `source_id` return its results tagged for the fleet results table.
+    With a `shard_count` above 1, the query analyzes the flows of one shard and returns
+    its results tagged for the shard results table
+    """
+    if source_id is not None and shard_count != 1:
+        raise ValueError("Fleet source queries are not sharded")
+
+    return query_template.format(
+        athena_results_table_name=athena_results_table_name,
+        pods_table_name=pods_table_name,
+        network_interfaces_table_name=network_interfaces_table_name,
+        vpc_flow_logs_table_name=vpc_flow_logs_table_name,
+        flow_sample_predicate=get_flow_sample_predicate(sample_buckets),
+        flow_shard_predicate=get_flow_shard_predicate(shard_count),
+        # Exponent notation makes a DOUBLE literal (not a DECIMAL) in Athena
+        sample_rate=f"{sample_buckets / FLOW_SAMPLE_BUCKETS:.15E}",
+        source_columns=get_source_columns(source_id) + get_shard_columns(shard_count),
+        **{name: "?" for name in QUERY_EXECUTION_PARAMETERS},
+    )
+
+
+def format_commit_shards_query(
+    query_template: str, athena_results_table_name: str, shard_results_table_name: str
+) -> str:
+    """
+    Renders the query committing the results of the successful shard attempts of a run
+    """
+    return query_template.format(
+        athena_results_table_name=athena_results_table_name,
+        shard_results_table_name=shard_results_table_name,
+        **{name: "?" for name in COMMIT_SHARDS_QUERY_EXECUTION_PARAMETERS},
+    )
+
+
+def format_fleet_query(
+    query_template: str,
+    fleet_results_table_name: str,
+    fleet_cross_az_traffic_table_name: str,
+) -> str:
+    """
+    Renders the query merging the per-source results of a run into the fleet-wide results
+    """
+    return query_template.format(
+        fleet_results_table_name=fleet_results_table_name,
+        fleet_cross_az_traffic_table_name=fleet_cross_az_traffic_table_name,
+        **{name: "?" for name in FLEET_QUERY_EXECUTION_PARAMETERS},
+    )
+
+
+def get_estimated_query_cost(
+    data_scanned_bytes: int,
+    price_per_terabyte_scanned: float = ATHENA_PRICE_PER_TERABYTE_SCANNED_USD,
+) -> float:
+    """
+    Returns the estimated cost (USD) of an Athena query, same as the recorded analysis runs
+    """
+    billed_increments = max(
+        -(-data_scanned_bytes // ATHENA_BILLED_BYTES_INCREMENT),
+        ATHENA_MIN_BILLED_BYTES // ATHENA_BILLED_BYTES_INCREMENT,
+    )
+    return billed_increments * price_per_terabyte_scanned / 1024**2
+
+
+def format_analysis_run_query(
+    query_template: str,
+    analysis_runs_table_name: str,
+    price_per_terabyte_scanned: float = ATHENA_PRICE_PER_TERABYTE_SCANNED_USD,
+) -> str:
+    """
+    Renders the query recording the statistics and estimated cost of an analysis query
+    """
+    return query_template.format(
+        analysis_runs_table_name=analysis_runs_table_name,
+        billed_bytes_increment=ATHENA_BILLED_BYTES_INCREMENT,
+        min_billed_increments=ATHENA_MIN_BILLED_BYTES // ATHENA_BILLED_BYTES_INCREMENT,
+        price_per_billed_increment=f"{price_per_terabyte_scanned / 1024**2:.15E}",
+        **{name: "?" for name in ANALYSIS_RUN_QUERY_EXECUTION_PARAMETERS},
+    )
+
+
+def format_new_results_query(
+    query_template: str, results_table_name: str, source_id: Optional[str] = None
+) -> str:
+    """
+    Renders the query selecting the results of the analyzed window, for the anomaly
+    detection. Results of a fleet `source_id` are selected from the fleet results table
+    """
+    source_predicate = ""
+    if source_id is not None:
+        source_predicate = f" AND source = '{validate_source_id(source_id)}'"
+
+    return query_template.format(
+        results_table_name=results_table_name,
+        source_predicate=source_predicate,
+        **{name: "?" for name in QUERY_EXECUTION_PARAMETERS},
+    )
+
+
+def format_traffic_matrix_query(
+    query_template: str, pods_table_name: str, vpc_flow_logs_table_name: str
+) -> str:
+    """
+    Renders the query selecting the app pair / AZ pair traffic matrix, the input of
+    the placement recommendations
+    """
+    return query_template.format(
+        pods_table_name=pods_table_name,
+        vpc_flow_logs_table_name=vpc_flow_logs_table_name,
+        **{name: "?" for name in QUERY_EXECUTION_PARAMETERS},
+    )
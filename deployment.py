@@ -22,15 +22,76 @@ from aws_cdk import aws_ec2 as ec2
 from aws_cdk import aws_eks as eks
 from aws_cdk import aws_events as events
 from aws_cdk import aws_events_targets as events_targets
+from aws_cdk import aws_iam as iam
+from aws_cdk import aws_lambda as lambda_
 from aws_cdk import aws_s3 as s3
 from constructs import Construct
 
+from anomaly_detector.infrastructure import AnomalyDetector
+from athena_analyzer.infrastructure import AnalysisSource
 from athena_analyzer.infrastructure import AthenaAnalyzer
+from athena_analyzer.infrastructure import FleetAthenaAnalyzer
+from flow_logs_compactor.infrastructure import FlowLogsCompactor
+from orchestrator_step_function.infrastructure import FleetOrchestratorStepFunction
 from orchestrator_step_function.infrastructure import OrchestratorStepFunction
 from pod_metadata_extractor.infrastructure import PodMetaDataExtractor
+from scan_cost_estimator.infrastructure import ScanCostEstimator
 from vpc_flow_logs.infrastructure import VPCFlowLogs
 
-EVENT_BRIDGE_SCHEDULED_RULE_FREQUENCY = Duration.minutes(60)
+# The scheduled rule fires every SCHEDULE_MIN_INTERVAL, the pod metadata extractor
+# skips runs that are not due according to the observed pod churn
+SCHEDULE_MIN_INTERVAL = Duration.minutes(15)
+SCHEDULE_MAX_INTERVAL = Duration.minutes(60)
+
+METRICS_NAMESPACE = "EksInterAzVisibility"
+
+# Fraction of the flow keys analyzed, lower it to trade accuracy for Athena cost on very large VPCs
+ANALYSIS_SAMPLE_RATE = 1.0
+
+# The analysis queries run in a dedicated Athena workgroup that cancels the queries scanning more
+# than ANALYSIS_MAX_BYTES_SCANNED_PER_QUERY, each run is recorded with its estimated cost
+ANALYSIS_MAX_BYTES_SCANNED_PER_QUERY = 100 * 1024**3
+ATHENA_PRICE_PER_TERABYTE_SCANNED_USD = 5.0
+
+# The analysis query is split into ANALYSIS_SHARDS shards by source address, run concurrently and
+# retried independently, then committed together. Keep it under the account's Athena DML query quota.
+ANALYSIS_SHARDS = 1
+
+# Before each run, the closed hours of VPC Flow Logs are rewritten into a few large Parquet objects
+# sorted by flow direction and source address, so the query skips most row groups by their statistics
+FLOW_LOGS_COMPACTION = False
+
+# Before each run, the bytes the query scans are estimated from the flow logs object sizes. A run over
+# ANALYSIS_SCAN_BUDGET_BYTES fails before the query starts and leaves its window to the next run ("abort"),
+# or has its window narrowed to the most recent hours that fit ("narrow-window"). The flow logs of the
+# narrowed out span are never analyzed, they are published as the ScanBudgetDroppedSeconds metric. Set it
+# to None to skip the estimate.
+ANALYSIS_SCAN_BUDGET_BYTES = ANALYSIS_MAX_BYTES_SCANNED_PER_QUERY
+ANALYSIS_SCAN_BUDGET_ACTION = "abort"
+
+# After each run, the app pairs whose cross-AZ bytes jump more than ANOMALY_Z_SCORE_THRESHOLD standard
+# deviations above their rolling statistics are emitted to ANOMALY_SINK: "log", "eventbridge" or "sns"
+ANOMALY_SINK = "log"
+ANOMALY_Z_SCORE_THRESHOLD = 4.0
+
+# Central analysis mode: the other clusters (in other VPCs or accounts sharing AZ IDs) analyzed
+# by this stack along with its own cluster, on its schedule, into one fleet-wide results table.
+# Their stacks set CENTRAL_ANALYSIS_ACCOUNT_ID to this stack's account.
+FLEET_SOURCES: list[dict[str, str]] = [
+    # {
+    #     "source_id": "cluster-b",
+    #     "pod_metadata_extractor_function_arn": "arn:aws:lambda:<region>:<account>:function:<name>",
+    #     "pod_metadata_extractor_bucket_name": "<bucket>",
+    #     "flow_logs_bucket_name": "<bucket>",
+    # },
+]
+LOCAL_SOURCE_ID = "local"
+# Per-source queries run concurrently, keep it under the account's Athena DML query quota
+FLEET_MAX_CONCURRENT_QUERIES = 4
+
+# Set on the stacks of the FLEET_SOURCES of a central stack: they only extract the pod metadata
+# and VPC Flow Logs, and grant the central account access to them
+CENTRAL_ANALYSIS_ACCOUNT_ID = None
 
 
 class EksInterAzVisibility(Stack):
@@ -46,7 +107,11 @@ class EksInterAzVisibility(Stack):
             scope=self,
             id="PodMetaDataExtractor",
             eks_cluster=eks_cluster,
+            vpc_id=eks_vpc.vpc_id,
             server_access_logs_bucket=server_access_logs_bucket,
+            schedule_min_interval=SCHEDULE_MIN_INTERVAL,
+            schedule_max_interval=SCHEDULE_MAX_INTERVAL,
+            metrics_namespace=METRICS_NAMESPACE,
         )
 
         vpc_flow_logs = VPCFlowLogs(
@@ -56,31 +121,152 @@ class EksInterAzVisibility(Stack):
             server_access_logs_bucket=server_access_logs_bucket,
         )
 
+        CfnOutput(
+            self,
+            "Lambda-K8S-Client-Role-ARN",
+            value=pod_metadata_extractor.eks_client_role.role_arn,
+        )
+
+        if CENTRAL_ANALYSIS_ACCOUNT_ID:
+            self.grant_central_analysis_access(
+                pod_metadata_extractor, vpc_flow_logs, CENTRAL_ANALYSIS_ACCOUNT_ID
+            )
+            return
+
         athena_analyzer = AthenaAnalyzer(
             scope=self,
             id="AthenaAnalyzer",
             pod_metadata_extractor_bucket=pod_metadata_extractor.bucket,
             flow_logs_bucket=vpc_flow_logs.bucket,
-            frequency=EVENT_BRIDGE_SCHEDULED_RULE_FREQUENCY,
+            sample_rate=ANALYSIS_SAMPLE_RATE,
+            max_bytes_scanned_per_query=ANALYSIS_MAX_BYTES_SCANNED_PER_QUERY,
+            price_per_terabyte_scanned=ATHENA_PRICE_PER_TERABYTE_SCANNED_USD,
+            shard_count=ANALYSIS_SHARDS,
             server_access_logs_bucket=server_access_logs_bucket,
         )
 
-        orchestrator = OrchestratorStepFunction(
+        anomaly_detector = AnomalyDetector(
             scope=self,
-            id="OrchestratorStepFunction",
-            pod_metadata_extractor_lambda_function=pod_metadata_extractor.lambda_k8s_client,
-            athena_analyzer=athena_analyzer,
+            id="AnomalyDetector",
+            state_bucket=athena_analyzer.results_bucket,
+            work_group_name=athena_analyzer.work_group_name,
+            sink=ANOMALY_SINK,
+            z_score_threshold=ANOMALY_Z_SCORE_THRESHOLD,
         )
 
-        self.create_event_bridge_scheduled_rule(
-            orchestrator, EVENT_BRIDGE_SCHEDULED_RULE_FREQUENCY
+        orchestrator: OrchestratorStepFunction | FleetOrchestratorStepFunction
+        if FLEET_SOURCES:
+            sources = [
+                AnalysisSource(
+                    source_id=LOCAL_SOURCE_ID,
+                    pod_metadata_extractor_lambda_function=pod_metadata_extractor.lambda_k8s_client,
+                    pod_metadata_extractor_bucket=pod_metadata_extractor.bucket,
+                    flow_logs_bucket=vpc_flow_logs.bucket,
+                )
+            ] + [self.get_fleet_source(source) for source in FLEET_SOURCES]
+
+            fleet_athena_analyzer = FleetAthenaAnalyzer(
+                scope=self,
+                id="FleetAthenaAnalyzer",
+                athena_analyzer=athena_analyzer,
+                sources=sources,
+            )
+
+            orchestrator = FleetOrchestratorStepFunction(
+                scope=self,
+                id="FleetOrchestratorStepFunction",
+                fleet_athena_analyzer=fleet_athena_analyzer,
+                anomaly_detector=anomaly_detector,
+                sources=sources,
+                max_concurrent_queries=FLEET_MAX_CONCURRENT_QUERIES,
+                metrics_namespace=METRICS_NAMESPACE,
+            )
+        else:
+            flow_logs_compactor = (
+                FlowLogsCompactor(
+                    scope=self,
+                    id="FlowLogsCompactor",
+                    flow_logs_bucket=vpc_flow_logs.bucket,
+                )
+                if FLOW_LOGS_COMPACTION
+                else None
+            )
+            scan_cost_estimator = (
+                ScanCostEstimator(
+                    scope=self,
+                    id="ScanCostEstimator",
+                    flow_logs_bucket=vpc_flow_logs.bucket,
+                    scan_budget_bytes=ANALYSIS_SCAN_BUDGET_BYTES,
+                    scan_budget_action=ANALYSIS_SCAN_BUDGET_ACTION,
+                )
+                if ANALYSIS_SCAN_BUDGET_BYTES is not None
+                else None
+            )
+
+            orchestrator = OrchestratorStepFunction(
+                scope=self,
+                id="OrchestratorStepFunction",
+                pod_metadata_extractor_lambda_function=pod_metadata_extractor.lambda_k8s_client,
+                athena_analyzer=athena_analyzer,
+                anomaly_detector=anomaly_detector,
+                cluster_name=eks_cluster.cluster_name,
+                metrics_namespace=METRICS_NAMESPACE,
+                flow_logs_compactor=flow_logs_compactor,
+                scan_cost_estimator=scan_cost_estimator,
+            )
+
+        self.create_event_bridge_scheduled_rule(orchestrator, SCHEDULE_MIN_INTERVAL)
+
+    def get_fleet_source(self, source: dict[str, str]) -> AnalysisSource:
+        source_id = source["source_id"]
+
+        return AnalysisSource(
+            source_id=source_id,
+            pod_metadata_extractor_lambda_function=lambda_.Function.from_function_attributes(
+                self,
+                f"{source_id}-pod-metadata-extractor",
+                function_arn=source["pod_metadata_extractor_function_arn"],
+                skip_permissions=True,
+            ),
+            pod_metadata_extractor_bucket=s3.Bucket.from_bucket_name(
+                self,
+                f"{source_id}-pod-metadata-extractor-bucket",
+                source["pod_metadata_extractor_bucket_name"],
+            ),
+            flow_logs_bucket=s3.Bucket.from_bucket_name(
+                self,
+                f"{source_id}-flow-logs-bucket",
+                source["flow_logs_bucket_name"],
+            ),
         )
 
+    def grant_central_analysis_access(
+        self,
+        pod_metadata_extractor: PodMetaDataExtractor,
+        vpc_flow_logs: VPCFlowLogs,
+        central_account_id: str,
+    ) -> None:
+        """
+        Lets the central analysis account invoke the pod_metadata_extractor and read
+        the pod metadata and VPC Flow Logs buckets
+        """
+        central_account = iam.AccountPrincipal(central_account_id)
+
+        pod_metadata_extractor.lambda_k8s_client.grant_invoke(central_account)
+        pod_metadata_extractor.bucket.grant_read(central_account)
+        vpc_flow_logs.bucket.grant_read(central_account)
+
         CfnOutput(
             self,
-            "Lambda-K8S-Client-Role-ARN",
-            value=pod_metadata_extractor.eks_client_role.role_arn,
+            "Pod-Metadata-Extractor-Function-ARN",
+            value=pod_metadata_extractor.lambda_k8s_client.function_arn,
+        )
+        CfnOutput(
+            self,
+            "Pod-Metadata-Extractor-Bucket-Name",
+            value=pod_metadata_extractor.bucket.bucket_name,
         )
+        CfnOutput(self, "Flow-Logs-Bucket-Name", value=vpc_flow_logs.bucket.bucket_name)
 
     def create_server_access_logs_bucket(self):
         server_access_logs_bucket = s3.Bucket(
@@ -96,7 +282,9 @@ class EksInterAzVisibility(Stack):
         return server_access_logs_bucket
 
     def create_event_bridge_scheduled_rule(
-        self, orchestrator: OrchestratorStepFunction, frequency: Duration
+        self,
+        orchestrator: OrchestratorStepFunction | FleetOrchestratorStepFunction,
+        frequency: Duration,
     ):
         return events.Rule(
             scope=self,
@@ -0,0 +1,102 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import pathlib
+from typing import Any
+
+from aws_cdk import Duration
+from aws_cdk import RemovalPolicy
+from aws_cdk import Stack
+from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_s3 as s3
+from constructs import Construct
+
+
+class FlowLogsCompactor(Construct):
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        flow_logs_bucket: s3.Bucket,
+        compaction_delay: Duration = Duration.minutes(20),
+        lookback_hours: int = 6,
+        **kwargs: Any
+    ) -> None:
+        """
+        Rewrites each hour of flow logs in `flow_logs_bucket`, once closed for
+        `compaction_delay`, into a few large Parquet objects sorted by flow direction and
+        source address. The last `lookback_hours` closed hours are compacted by each run.
+        """
+        super().__init__(scope, id, **kwargs)
+
+        self.lambda_function = self.__create_flow_logs_compactor_lambda_function(
+            flow_logs_bucket, compaction_delay, lookback_hours
+        )
+        flow_logs_bucket.grant_read_write(self.lambda_function)
+        flow_logs_bucket.grant_delete(self.lambda_function)
+
+    def __create_flow_logs_compactor_lambda_function(
+        self,
+        flow_logs_bucket: s3.Bucket,
+        compaction_delay: Duration,
+        lookback_hours: int,
+    ) -> lambda_.Function:
+        """
+        Creates a Lambda Function that compacts the closed hours of flow logs. An hour is
+        read in memory, sorted, and written back in row groups with their statistics.
+        """
+        lambda_function = lambda_.Function(
+            self,
+            "flow-logs-compactor-lambda-function",
+            function_name="flow_logs_compactor",
+            description="Compacts the closed hours of VPC Flow Logs into sorted Parquet",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            code=lambda_.Code.from_asset(
+                str(pathlib.Path(__file__).parent.joinpath("runtime").resolve())
+            ),
+            handler="compact_flow_logs.lambda_handler",
+            memory_size=3008,
+            timeout=Duration.minutes(5),
+            environment={
+                "REGION": Stack.of(self).region,
+                "CURRENT_ACCOUNT_ID": Stack.of(self).account,
+                "FLOW_LOGS_BUCKET_NAME": flow_logs_bucket.bucket_name,
+                "COMPACTION_DELAY_SECONDS": str(compaction_delay.to_seconds()),
+                "COMPACTION_LOOKBACK_HOURS": str(lookback_hours),
+            },
+            layers=[self.__create_dependencies_lambda_layer()],
+            tracing=lambda_.Tracing.ACTIVE,
+        )
+        return lambda_function
+
+    def __create_dependencies_lambda_layer(self) -> lambda_.LayerVersion:
+        """
+        Creates a Lambda Layer that has the dependencies for our Lambda Function.
+        The dependencies are stored in the `./runtime/requirements.in` file.
+        """
+        python_pyarrow_lambda_layer = lambda_.LayerVersion(
+            self,
+            "layer-python-pyarrow",
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_9],
+            code=lambda_.Code.from_asset(
+                str(
+                    pathlib.Path(__file__)
+                    .parent.joinpath("requirements_layer")
+                    .resolve()
+                )
+            ),
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+        return python_pyarrow_lambda_layer
@@ -0,0 +1,330 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import io
+import json
+import logging
+import os
+import time
+from typing import Any, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+HTTP_OK = 200
+HTTP_INTERNAL_SERVER_ERROR = 500
+
+REGION = os.getenv("REGION")
+CURRENT_ACCOUNT_ID = os.getenv("CURRENT_ACCOUNT_ID")
+FLOW_LOGS_BUCKET_NAME = os.getenv("FLOW_LOGS_BUCKET_NAME", "")
+
+# An hour is closed once its last flow logs are delivered: aggregation interval and
+# delivery delay, see the VPC Flow Logs documentation
+COMPACTION_DELAY_SECONDS = int(os.getenv("COMPACTION_DELAY_SECONDS", "1200"))
+# The closed hours compacted by each invocation, most recent first
+COMPACTION_LOOKBACK_HOURS = int(os.getenv("COMPACTION_LOOKBACK_HOURS", "6"))
+ROW_GROUP_ROWS = int(os.getenv("ROW_GROUP_ROWS", str(128 * 1024)))
+MAX_ROWS_PER_FILE = int(os.getenv("MAX_ROWS_PER_FILE", str(8 * 1024 * 1024)))
+
+# Per hour partitions, without Hive-compatible names (see VPCFlowLogs destination options)
+FLOW_LOGS_HOUR_PREFIX_TEMPLATE = "AWSLogs/{account_id}/vpcflowlogs/{region}/{hour}/"
+HOUR_PREFIX_FORMAT = "%Y/%m/%d/%H"
+
+# The query filters on flow_direction first, then on the source address
+SORT_COLUMNS = ("flow_direction", "pkt_srcaddr")
+
+COMPACTED_OBJECT_NAME_TEMPLATE = "compacted-{part:05d}.parquet"
+# Athena skips the objects whose name starts with an underscore: the compacted objects
+# are written under a staging name, and only promoted once the delivered ones are gone
+STAGED_OBJECT_NAME_PREFIX = "_staged-"
+MANIFEST_NAME = "_compaction-manifest.json"
+MANIFEST_WRITTEN = "written"
+MANIFEST_DONE = "done"
+
+DELETE_OBJECTS_BATCH_SIZE = 1000
+
+SECONDS_PER_HOUR = 3600
+
+# Clients are created on first use and kept across warm invocations
+s3_client = None
+
+
+def get_s3_client() -> Any:
+    global s3_client
+
+    if s3_client is None:
+        import boto3
+
+        s3_client = boto3.client("s3", region_name=REGION)
+    return s3_client
+
+
+def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
+    """
+    Rewrites each closed hour of flow logs into a few large Parquet objects sorted by
+    flow direction and source address, so the row group statistics let the analysis
+    query skip most of the row groups it filters out
+    """
+    try:
+        hours = compact_closed_hours(
+            get_s3_client(), FLOW_LOGS_BUCKET_NAME, int(time.time())
+        )
+    except Exception as exception:
+        error_message = f"There was a problem compacting the flow logs: {exception}"
+        logging.error(error_message)
+        return {"statusCode": HTTP_INTERNAL_SERVER_ERROR, "body": error_message}
+
+    return {
+        "statusCode": HTTP_OK,
+        "body": f"{len(hours)} hours of flow logs compacted",
+        "hours": hours,
+    }
+
+
+def get_closed_hours(now: int, delay_seconds: int, lookback_hours: int) -> list[int]:
+    """
+    Returns the start times of the last closed hours, most recent first
+    """
+    last_closed_hour = (now - delay_seconds - SECONDS_PER_HOUR) // SECONDS_PER_HOUR
+    return [
+        (last_closed_hour - hour) * SECONDS_PER_HOUR for hour in range(lookback_hours)
+    ]
+
+
+def get_hour_prefix(hour_start: int) -> str:
+    return FLOW_LOGS_HOUR_PREFIX_TEMPLATE.format(
+        account_id=CURRENT_ACCOUNT_ID,
+        region=REGION,
+        hour=time.strftime(HOUR_PREFIX_FORMAT, time.gmtime(hour_start)),
+    )
+
+
+def compact_closed_hours(
+    s3_client: Any, bucket_name: str, now: int
+) -> list[dict[str, Any]]:
+    """
+    Compacts the closed hours that are not yet, returns their compaction statistics
+    """
+    hours = []
+
+    for hour_start in get_closed_hours(
+        now, COMPACTION_DELAY_SECONDS, COMPACTION_LOOKBACK_HOURS
+    ):
+        prefix = get_hour_prefix(hour_start)
+        statistics = compact_hour(s3_client, bucket_name, prefix)
+        if statistics is not None:
+            logging.info(f"Compacted {prefix}: {statistics}")
+            hours.append({"prefix": prefix, **statistics})
+
+    return hours
+
+
+def load_manifest(
+    s3_client: Any, bucket_name: str, prefix: str
+) -> Optional[dict[str, Any]]:
+    try:
+        response = s3_client.get_object(
+            Bucket=bucket_name,
+            Key=f"{prefix}{MANIFEST_NAME}",
+            ExpectedBucketOwner=CURRENT_ACCOUNT_ID,
+        )
+    except s3_client.exceptions.NoSuchKey:
+        return None
+
+    manifest: dict[str, Any] = json.loads(response["Body"].read())
+    return manifest
+
+
+def save_manifest(
+    s3_client: Any, bucket_name: str, prefix: str, manifest: dict[str, Any]
+) -> None:
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=f"{prefix}{MANIFEST_NAME}",
+        Body=json.dumps(manifest).encode("utf-8"),
+        ContentType="application/json",
+        ExpectedBucketOwner=CURRENT_ACCOUNT_ID,
+    )
+
+
+def list_source_objects(s3_client: Any, bucket_name: str, prefix: str) -> list[str]:
+    """
+    Returns the keys of the delivered flow logs objects of the hour
+    """
+    keys = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for content in page.get("Contents", []):
+            name = content["Key"][len(prefix) :]
+            if "/" in name or name.startswith(("_", "compacted-")):
+                continue
+            keys.append(content["Key"])
+
+    return keys
+
+
+def compact_hour(
+    s3_client: Any, bucket_name: str, prefix: str
+) -> Optional[dict[str, Any]]:
+    """
+    Compacts an hour of flow logs. The manifest makes it resumable: the compacted
+    objects are staged (under deterministic names hidden from Athena) before the
+    manifest, the delivered objects are deleted only after it, then the staged objects
+    are promoted. A query never reads both the delivered and the compacted objects of
+    an hour, but it misses the hour's flows until its manifest is done. Returns None
+    when there was nothing to do.
+    """
+    manifest = load_manifest(s3_client, bucket_name, prefix)
+    if manifest is not None and manifest["state"] == MANIFEST_DONE:
+        return None
+
+    statistics: dict[str, int] = {}
+    if manifest is None:
+        sources = list_source_objects(s3_client, bucket_name, prefix)
+        if not sources:
+            return None
+
+        table = read_flow_logs(s3_client, bucket_name, sources)
+        outputs, statistics = write_compacted_objects(
+            s3_client, bucket_name, prefix, sort_flow_logs(table)
+        )
+        manifest = {"state": MANIFEST_WRITTEN, "sources": sources, "outputs": outputs}
+        save_manifest(s3_client, bucket_name, prefix, manifest)
+
+    delete_objects(s3_client, bucket_name, manifest["sources"])
+    promote_staged_objects(s3_client, bucket_name, manifest["outputs"])
+    manifest["state"] = MANIFEST_DONE
+    save_manifest(s3_client, bucket_name, prefix, manifest)
+
+    return {
+        "source_objects": len(manifest["sources"]),
+        "compacted_objects": len(manifest["outputs"]),
+        **statistics,
+    }
+
+
+def read_flow_logs(s3_client: Any, bucket_name: str, keys: list[str]) -> pa.Table:
+    tables = []
+
+    for key in keys:
+        response = s3_client.get_object(
+            Bucket=bucket_name, Key=key, ExpectedBucketOwner=CURRENT_ACCOUNT_ID
+        )
+        tables.append(pq.read_table(io.BytesIO(response["Body"].read())))
+
+    return pa.concat_tables(tables, promote_options="default")
+
+
+def sort_flow_logs(table: pa.Table) -> pa.Table:
+    # Dictionary encoded columns (read back as such when written by pyarrow) are not sortable
+    for column in SORT_COLUMNS:
+        field = table.schema.field(column)
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(
+                table.schema.get_field_index(column),
+                field.with_type(field.type.value_type),
+                table[column].cast(field.type.value_type),
+            )
+
+    return table.sort_by([(column, "ascending") for column in SORT_COLUMNS])
+
+
+def write_compacted_objects(
+    s3_client: Any, bucket_name: str, prefix: str, table: pa.Table
+) -> tuple[list[str], dict[str, int]]:
+    """
+    Writes the sorted flow logs in objects of up to MAX_ROWS_PER_FILE rows, in row groups
+    of ROW_GROUP_ROWS rows with their min/max statistics and page indexes. Bloom filters
+    are not written, the pyarrow Parquet writer does not support them. The objects are
+    staged, their keys once promoted are returned.
+    """
+    sorting_columns = [
+        pq.SortingColumn(table.schema.get_field_index(column))
+        for column in SORT_COLUMNS
+    ]
+    outputs = []
+    row_groups = 0
+    compacted_bytes = 0
+
+    for part, offset in enumerate(range(0, table.num_rows, MAX_ROWS_PER_FILE)):
+        buffer = io.BytesIO()
+        pq.write_table(
+            table.slice(offset, MAX_ROWS_PER_FILE),
+            buffer,
+            row_group_size=ROW_GROUP_ROWS,
+            write_statistics=True,
+            write_page_index=True,
+            sorting_columns=sorting_columns,
+        )
+        body = buffer.getvalue()
+        key = f"{prefix}{COMPACTED_OBJECT_NAME_TEMPLATE.format(part=part)}"
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=get_staged_key(key),
+            Body=body,
+            ExpectedBucketOwner=CURRENT_ACCOUNT_ID,
+        )
+        outputs.append(key)
+        row_groups += pq.read_metadata(pa.BufferReader(body)).num_row_groups
+        compacted_bytes += len(body)
+
+    return outputs, {
+        "rows": table.num_rows,
+        "row_groups": row_groups,
+        "compacted_bytes": compacted_bytes,
+    }
+
+
+def get_staged_key(key: str) -> str:
+    prefix, name = key.rsplit("/", 1)
+    return f"{prefix}/{STAGED_OBJECT_NAME_PREFIX}{name}"
+
+
+def promote_staged_objects(s3_client: Any, bucket_name: str, keys: list[str]) -> None:
+    """
+    Copies the staged objects to their keys, then deletes them. Objects already
+    promoted by an interrupted invocation are skipped.
+    """
+    for key in keys:
+        try:
+            s3_client.copy_object(
+                Bucket=bucket_name,
+                Key=key,
+                CopySource={"Bucket": bucket_name, "Key": get_staged_key(key)},
+                ExpectedBucketOwner=CURRENT_ACCOUNT_ID,
+            )
+        except s3_client.exceptions.NoSuchKey:
+            continue
+
+    delete_objects(s3_client, bucket_name, [get_staged_key(key) for key in keys])
+
+
+def delete_objects(s3_client: Any, bucket_name: str, keys: list[str]) -> None:
+    for offset in range(0, len(keys), DELETE_OBJECTS_BATCH_SIZE):
+        s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={
+                "Objects": [
+                    {"Key": key}
+                    for key in keys[offset : offset + DELETE_OBJECTS_BATCH_SIZE]
+                ],
+                "Quiet": True,
+            },
+            ExpectedBucketOwner=CURRENT_ACCOUNT_ID,
+        )
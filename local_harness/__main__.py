@@ -0,0 +1,139 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Runs the pipeline end to end locally at several scales:
+
+    python -m local_harness --pods 100 1000 10000
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+
+from .pipeline import import_anomaly_detector_runtime
+from .pipeline import import_extractor_runtime
+from .pipeline import import_flow_logs_compactor_runtime
+from .pipeline import run_pipeline
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m local_harness")
+    parser.add_argument("--pods", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--flows-per-pod", type=int, default=20)
+    parser.add_argument("--sample-rate", type=float, default=1.0)
+    parser.add_argument(
+        "--churn-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of pods replaced per hour",
+    )
+    parser.add_argument(
+        "--compaction",
+        action="store_true",
+        help="Delivers the flow logs in small objects and compacts them before the query",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Runs the query shard by shard, the first attempt of a shard fails",
+    )
+    parser.add_argument("--work-dir", help="Defaults to a temporary directory")
+    parser.add_argument("--output", help="Writes the measurements as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Shows the runtime logs")
+    args = parser.parse_args()
+
+    # The runtime modules set the root logger level when they are imported
+    import_extractor_runtime()
+    import_anomaly_detector_runtime()
+    import_flow_logs_compactor_runtime()
+    logging.basicConfig()
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    measurements = []
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        for pods in args.pods:
+            work_dir = os.path.join(args.work_dir or temporary_dir, f"pods-{pods}")
+            measurement = run_pipeline(
+                work_dir,
+                pods,
+                args.flows_per_pod,
+                args.sample_rate,
+                args.churn_rate,
+                args.compaction,
+                args.shards,
+            )
+            results = measurement.pop("results")
+            measurement["result_rows"] = len(results)
+            recommendations = measurement.pop("recommendations")
+            measurement["top_recommendation"] = next(iter(recommendations), None)
+            measurements.append(measurement)
+            print(
+                f"pods={measurement['pods']} nodes={measurement['nodes']} "
+                f"flow_logs_rows={measurement['flow_logs_rows']} "
+                f"generation={measurement['flow_logs_generation_rows_per_second']} rows/s "
+                f"extractor={measurement['extractor_latency_ms']}ms "
+                f"query={measurement['query_latency_ms']}ms "
+                f"({measurement['query_rows_per_second']} rows/s) "
+                f"result_rows={measurement['result_rows']} "
+                f"reported/attributable/ground_truth_bytes={measurement['reported_bytes']}"
+                f"/{measurement['attributable_bytes']}/{measurement['ground_truth_bytes']}"
+            )
+            if args.shards > 1:
+                print(
+                    f"  shards: {measurement['shard_query_ms']}ms, "
+                    f"commit={measurement['commit_shards_ms']}ms"
+                )
+            if args.compaction:
+                print(
+                    f"  compaction: {measurement['flow_logs_objects_before']} -> "
+                    f"{measurement['flow_logs_objects_after']} objects, "
+                    f"row groups skipped by egress filter "
+                    f"{measurement['row_groups_before']['egress_skipped_row_groups']}"
+                    f"/{measurement['row_groups_before']['row_groups']} -> "
+                    f"{measurement['row_groups_after']['egress_skipped_row_groups']}"
+                    f"/{measurement['row_groups_after']['row_groups']} "
+                    f"({measurement['compaction_ms']}ms)"
+                )
+            print(
+                f"  scan estimate: {measurement['scan_estimate_bytes']} bytes in "
+                f"{measurement['scan_estimate_objects']} objects vs "
+                f"{measurement['data_scanned_bytes']} scanned with the metadata tables, "
+                f"cold={measurement['scan_estimate_cold_ms']}ms "
+                f"warm={measurement['scan_estimate_warm_ms']}ms; "
+                f"{measurement['narrowed_scan_estimate']}"
+            )
+            print(
+                f"  results query service: {measurement['results_query_bytes']} bytes, "
+                f"cold={measurement['results_query_cold_ms']}ms "
+                f"warm={measurement['results_query_warm_ms']}ms"
+            )
+            for recommendation in recommendations:
+                print(
+                    f"  {recommendation['rank']}. {recommendation['service']}: "
+                    f"{recommendation['action']} saves {recommendation['expected_saved_bytes']}"
+                    f"/{recommendation['cross_az_bytes']} cross-AZ bytes "
+                    f"({measurement['recommendations_ms']}ms)"
+                )
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(measurements, file, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import ipaddress
+from typing import Optional, Sequence
+
+import numpy as np
+
+# Same encoding as the pod_metadata_extractor (and Athena's IPADDRESS binary form):
+# addresses are 128-bit integers split in signed 64-bit halves, IPv4 addresses are IPv4-mapped
+IPV4_MAPPED_PREFIX = 0xFFFF << 32
+
+UINT64_SIGN_BIT = 1 << 63
+
+
+def encode_ipv4_addresses(addresses: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes integer IPv4 addresses, returns the high and low halves
+    """
+    return (
+        np.zeros(len(addresses), dtype=np.int64),
+        IPV4_MAPPED_PREFIX | addresses.astype(np.int64),
+    )
+
+
+def encode_ip_addresses(
+    addresses: Sequence[Optional[str]],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Parses the addresses once into compact arrays: the high and low halves, and
+    whether the address is valid (TRY_CAST AS IPADDRESS succeeds)
+    """
+    hi = np.zeros(len(addresses), dtype=np.int64)
+    lo = np.zeros(len(addresses), dtype=np.int64)
+    valid = np.zeros(len(addresses), dtype=bool)
+
+    for index, address in enumerate(addresses):
+        if address is None:
+            continue
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            continue
+        value = int(ip) | IPV4_MAPPED_PREFIX if ip.version == 4 else int(ip)
+        hi[index] = to_signed_64(value >> 64)
+        lo[index] = to_signed_64(value & (2**64 - 1))
+        valid[index] = True
+
+    return hi, lo, valid
+
+
+def to_signed_64(value: int) -> int:
+    return value - (1 << 64) if value >= UINT64_SIGN_BIT else value
+
+
+def parse_cidrs_ranges(cidrs: str) -> np.ndarray:
+    """
+    Returns the first and last 128-bit addresses of the comma separated CIDRs, as
+    rows of unsigned (first hi, first lo, last hi, last lo)
+    """
+    ranges = []
+
+    for cidr in cidrs.split(","):
+        network = ipaddress.ip_network(cidr)
+        first, last = int(network[0]), int(network[-1])
+        if network.version == 4:
+            first, last = first | IPV4_MAPPED_PREFIX, last | IPV4_MAPPED_PREFIX
+        ranges.append(
+            (first >> 64, first & (2**64 - 1), last >> 64, last & (2**64 - 1))
+        )
+
+    return np.array(ranges, dtype=np.uint64).reshape(-1, 4)
+
+
+def cidrs_contain(ranges: np.ndarray, hi: np.ndarray, lo: np.ndarray) -> np.ndarray:
+    """
+    Returns whether the encoded addresses are in any of the CIDRs ranges, vectorized
+    over the addresses
+    """
+    hi, lo = hi.view(np.uint64), lo.view(np.uint64)
+    contained = np.zeros(len(hi), dtype=bool)
+
+    for first_hi, first_lo, last_hi, last_lo in ranges:
+        after_first = (hi > first_hi) | ((hi == first_hi) & (lo >= first_lo))
+        before_last = (hi < last_hi) | ((hi == last_hi) & (lo <= last_lo))
+        contained |= after_first & before_last
+
+    return contained
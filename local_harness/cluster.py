@@ -0,0 +1,110 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import datetime
+from types import SimpleNamespace
+from typing import Optional
+
+AZ_LABEL = "topology.kubernetes.io/zone"
+AZ_ID_LABEL = "topology.k8s.aws/zone-id"
+
+DEFAULT_ZONES_IDS = {
+    "us-east-2a": "use2-az1",
+    "us-east-2b": "use2-az2",
+    "us-east-2c": "use2-az3",
+}
+
+# Each zone gets the 10.<zone index>.0.0/16 network: the load balancer ENI and the nodes
+# use its first /24, pod IPs are allocated in order from the rest of it
+ZONE_NETWORK_SIZE = 1 << 16
+LOAD_BALANCER_ADDRESS_OFFSET = 8
+NODE_ADDRESS_OFFSET = 16
+POD_ADDRESS_OFFSET = 256
+MAX_NODES_PER_ZONE = POD_ADDRESS_OFFSET - NODE_ADDRESS_OFFSET
+MAX_PODS_PER_ZONE = ZONE_NETWORK_SIZE - POD_ADDRESS_OFFSET
+
+
+def get_zone_network_address(zone_index: int) -> int:
+    """
+    Returns the first address of the zone's network, as an integer
+    """
+    return (10 << 24) | (zone_index << 16)
+
+
+def get_node_name(zone_index: int, node_index: int, region: str) -> str:
+    return f"ip-10-{zone_index}-0-{NODE_ADDRESS_OFFSET + node_index}.{region}.compute.internal"
+
+
+def make_node(name: str, zone_name: str, zone_id: str, ip: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        metadata=SimpleNamespace(
+            name=name, labels={AZ_LABEL: zone_name, AZ_ID_LABEL: zone_id}
+        ),
+        status=SimpleNamespace(
+            addresses=[SimpleNamespace(type="InternalIP", address=ip)]
+        ),
+    )
+
+
+def make_pod(
+    name: str,
+    ip: str,
+    labels: dict[str, str],
+    node_name: str,
+    ready_time: datetime.datetime,
+    owner_references: Optional[list[SimpleNamespace]] = None,
+) -> SimpleNamespace:
+    return SimpleNamespace(
+        metadata=SimpleNamespace(
+            name=name, labels=labels, owner_references=owner_references
+        ),
+        spec=SimpleNamespace(node_name=node_name, host_network=None),
+        status=SimpleNamespace(
+            pod_ip=ip,
+            conditions=[SimpleNamespace(type="Ready", last_transition_time=ready_time)],
+        ),
+    )
+
+
+def make_owner_reference(kind: str, name: str, uid: str) -> SimpleNamespace:
+    return SimpleNamespace(kind=kind, name=name, uid=uid, controller=True)
+
+
+def make_replica_set(name: str, uid: str, deployment_name: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        metadata=SimpleNamespace(
+            name=name,
+            uid=uid,
+            owner_references=[
+                make_owner_reference(
+                    "Deployment", deployment_name, f"{deployment_name}-uid"
+                )
+            ],
+        )
+    )
+
+
+def make_load_balancer_service(
+    name: str, selector: dict[str, str], hostname: str
+) -> SimpleNamespace:
+    return SimpleNamespace(
+        metadata=SimpleNamespace(name=name),
+        spec=SimpleNamespace(selector=selector),
+        status=SimpleNamespace(
+            load_balancer=SimpleNamespace(
+                ingress=[SimpleNamespace(hostname=hostname, ip=None)]
+            )
+        ),
+    )
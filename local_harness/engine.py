@@ -0,0 +1,331 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import glob
+import os
+import re
+import time
+from typing import Any
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from athena_analyzer.glue_tables_columns import athena_results_table_columns
+from athena_analyzer.glue_tables_columns import network_interfaces_table_columns
+from athena_analyzer.glue_tables_columns import pod_table_columns
+from athena_analyzer.glue_tables_columns import results_partition_keys
+from athena_analyzer.glue_tables_columns import shard_results_table_columns
+from athena_analyzer.glue_tables_columns import vpc_flow_logs_table_columns
+
+from .addresses import cidrs_contain
+from .addresses import encode_ip_addresses
+from .addresses import parse_cidrs_ranges
+
+# Same table names as the Glue tables AthenaAnalyzer creates
+PODS_TABLE_NAME = "pods-table"
+NETWORK_INTERFACES_TABLE_NAME = "network-interfaces-table"
+VPC_FLOW_LOGS_TABLE_NAME = "vpc-flow-logs-table"
+ATHENA_RESULTS_TABLE_NAME = "athena-results-table"
+SHARD_RESULTS_TABLE_NAME = "shard-results-table"
+
+GLUE_TO_DUCKDB_TYPES = {
+    "string": "VARCHAR",
+    "int": "INTEGER",
+    "bigint": "BIGINT",
+    "double": "DOUBLE",
+    "timestamp": "TIMESTAMP",
+    "date": "DATE",
+}
+
+# Flow logs address columns, parsed once into integer columns when the flow logs are loaded
+FLOW_LOGS_ADDRESS_COLUMNS = ("pkt_srcaddr", "pkt_dstaddr")
+
+# Athena (Trino) functions the query uses that DuckDB does not have (or has with another
+# signature). xxhash64 is replaced by DuckDB's hash: flow keys sampling is deterministic
+# but does not pick the same flow keys as Athena.
+TRINO_COMPATIBILITY_MACROS = [
+    "CREATE MACRO bitwise_and(a, b) AS (a & b)",
+    "CREATE MACRO to_utf8(value) AS value",
+    "CREATE MACRO xxhash64(value) AS hash(value)",
+    "CREATE MACRO from_big_endian_64(value) AS value",
+    "CREATE MACRO from_unixtime(seconds) AS make_timestamp(CAST(seconds AS BIGINT) * 1000000)",
+    "CREATE MACRO to_unixtime(value) AS epoch(value)",
+]
+
+# Vectorized UDF options, by name: their enums moved between DuckDB versions
+ARROW_UDF_OPTIONS: dict[str, Any] = {"type": "arrow", "null_handling": "special"}
+
+# from_big_endian_64(substr(CAST(TRY_CAST(<address> AS IPADDRESS) AS VARBINARY), 1|9, 8))
+ENCODED_ADDRESS_PATTERN = re.compile(
+    r"from_big_endian_64\(substr\(CAST\(TRY_CAST\((\w+) AS IPADDRESS\) AS VARBINARY\), (1|9), 8\)\)"
+)
+
+# any_match(split(<cidrs>, ','), cidr -> contains(cidr, TRY_CAST(<address> AS IPADDRESS)))
+CIDRS_PREFILTER_PATTERN = re.compile(
+    r"any_match\(split\((\S+?), ','\), (\w+) -> contains\(\2, TRY_CAST\((\w+) AS IPADDRESS\)\)\)"
+)
+
+
+def get_duckdb_columns(columns: list[Any]) -> dict[str, str]:
+    return {
+        column.name: GLUE_TO_DUCKDB_TYPES[column.type.input_string]
+        for column in columns
+    }
+
+
+def to_duckdb_dialect(query_string: str) -> str:
+    """
+    Rewrites the Trino constructs of the query that macros can not stand in for
+    (IPADDRESS is not a DuckDB type, lambdas can not be passed to macros) to the
+    flow logs integer address columns
+    """
+    query_string = ENCODED_ADDRESS_PATTERN.sub(
+        lambda match: f"{match[1]}_{'hi' if match[2] == '1' else 'lo'}", query_string
+    )
+    return CIDRS_PREFILTER_PATTERN.sub(
+        lambda match: f"cidrs_contain({match[1]}, {match[3]}_hi, {match[3]}_lo)",
+        query_string,
+    )
+
+
+def cidrs_contain_function(cidrs: pa.Array, hi: pa.Array, lo: pa.Array) -> pa.Array:
+    """
+    Vectorized DuckDB function: whether the addresses are in the comma separated CIDRs
+    """
+    contained = np.zeros(len(hi), dtype=bool)
+    hi_values = pc.fill_null(hi, 0).to_numpy()
+    lo_values = pc.fill_null(lo, 0).to_numpy()
+
+    for value in pc.unique(cidrs).to_pylist():
+        rows = pc.equal(cidrs, value).to_numpy(zero_copy_only=False)
+        contained[rows] = cidrs_contain(
+            parse_cidrs_ranges(value), hi_values[rows], lo_values[rows]
+        )
+
+    return pa.array(contained, mask=pc.is_null(hi).to_numpy(zero_copy_only=False))
+
+
+def load_flow_logs(files: list[str]) -> pa.Table:
+    """
+    Reads the flow logs, adds the <address>_hi and <address>_lo integer columns.
+    Addresses are parsed once per distinct value (Parquet dictionary), not per row.
+    """
+    table = pa.concat_tables(
+        [
+            pq.read_table(file, read_dictionary=FLOW_LOGS_ADDRESS_COLUMNS)
+            for file in files
+        ]
+    )
+
+    for column in FLOW_LOGS_ADDRESS_COLUMNS:
+        hi_chunks, lo_chunks = [], []
+        for chunk in table[column].chunks:
+            if not pa.types.is_dictionary(chunk.type):
+                chunk = pc.dictionary_encode(chunk)
+            hi, lo, valid = encode_ip_addresses(chunk.dictionary.to_pylist())
+            indices = pc.fill_null(chunk.indices, 0).to_numpy()
+            null = (
+                pc.is_null(chunk.indices).to_numpy(zero_copy_only=False)
+                | ~valid[indices]
+            )
+            hi_chunks.append(pa.array(hi[indices], mask=null))
+            lo_chunks.append(pa.array(lo[indices], mask=null))
+        table = table.append_column(f"{column}_hi", pa.chunked_array(hi_chunks))
+        table = table.append_column(f"{column}_lo", pa.chunked_array(lo_chunks))
+
+    return table
+
+
+def bind_execution_parameters(
+    query_string: str, execution_parameters: list[str]
+) -> str:
+    """
+    Replaces the '?' placeholders in order, the values are SQL text like Athena execution parameters
+    """
+    parts = query_string.split("?")
+    if len(parts) - 1 != len(execution_parameters):
+        raise ValueError(
+            f"The query has {len(parts) - 1} execution parameters, got {len(execution_parameters)}"
+        )
+
+    bound_query = parts[0]
+    for value, part in zip(execution_parameters, parts[1:]):
+        bound_query += value + part
+
+    return bound_query
+
+
+class LocalAthenaEngine:
+    """
+    Stand-in for Athena: runs the rendered analysis query with an embedded DuckDB database
+    against the objects of the local buckets, with the table layouts AthenaAnalyzer defines
+    """
+
+    def __init__(
+        self, pods_path: str, network_interfaces_path: str, flow_logs_path: str
+    ) -> None:
+        self.connection = duckdb.connect()
+        self.table_files = {
+            PODS_TABLE_NAME: glob.glob(os.path.join(pods_path, "*")),
+            NETWORK_INTERFACES_TABLE_NAME: glob.glob(
+                os.path.join(network_interfaces_path, "*")
+            ),
+            VPC_FLOW_LOGS_TABLE_NAME: glob.glob(
+                os.path.join(flow_logs_path, "**", "*.parquet"), recursive=True
+            ),
+        }
+
+        for macro in TRINO_COMPATIBILITY_MACROS:
+            self.connection.execute(macro)
+        self.connection.create_function(
+            "cidrs_contain",
+            cidrs_contain_function,
+            ["VARCHAR", "BIGINT", "BIGINT"],
+            "BOOLEAN",
+            **ARROW_UDF_OPTIONS,
+        )
+
+        self.__create_csv_table_view(PODS_TABLE_NAME, pod_table_columns)
+        self.__create_csv_table_view(
+            NETWORK_INTERFACES_TABLE_NAME, network_interfaces_table_columns
+        )
+        self.__create_flow_logs_table_view(
+            VPC_FLOW_LOGS_TABLE_NAME, vpc_flow_logs_table_columns
+        )
+        # Partition keys are the last columns, as Athena returns them
+        self.__create_results_table(
+            ATHENA_RESULTS_TABLE_NAME,
+            athena_results_table_columns + results_partition_keys,
+        )
+        self.__create_results_table(
+            SHARD_RESULTS_TABLE_NAME,
+            shard_results_table_columns + results_partition_keys,
+        )
+
+    def __create_csv_table_view(self, table_name: str, columns: list[Any]) -> None:
+        files = self.table_files[table_name]
+        duckdb_columns = get_duckdb_columns(columns)
+
+        if not files:
+            self.__create_results_table(table_name, columns)
+            return
+
+        # skip.header.line.count = 1
+        self.connection.execute(
+            f'CREATE VIEW "{table_name}" AS SELECT * FROM read_csv({files!r}, header = true, columns = {duckdb_columns!r})'
+        )
+
+    def __create_flow_logs_table_view(
+        self, table_name: str, columns: list[Any]
+    ) -> None:
+        files = self.table_files[table_name]
+        duckdb_columns = get_duckdb_columns(columns)
+        address_columns = [
+            f"{column}_{half}"
+            for column in FLOW_LOGS_ADDRESS_COLUMNS
+            for half in ("hi", "lo")
+        ]
+
+        if not files:
+            table_columns = ", ".join(
+                [
+                    f'"{name}" {duckdb_type}'
+                    for name, duckdb_type in duckdb_columns.items()
+                ]
+                + [f'"{name}" BIGINT' for name in address_columns]
+            )
+            self.connection.execute(f'CREATE TABLE "{table_name}" ({table_columns})')
+            return
+
+        self.connection.register(f"{table_name}-arrow", load_flow_logs(files))
+        selected_columns = ", ".join(
+            [
+                f'CAST("{name}" AS {duckdb_type}) AS "{name}"'
+                for name, duckdb_type in duckdb_columns.items()
+            ]
+            + [f'"{name}"' for name in address_columns]
+        )
+        self.connection.execute(
+            f'CREATE VIEW "{table_name}" AS SELECT {selected_columns} FROM "{table_name}-arrow"'
+        )
+
+    def __create_results_table(self, table_name: str, columns: list[Any]) -> None:
+        table_columns = ", ".join(
+            f'"{name}" {duckdb_type}'
+            for name, duckdb_type in get_duckdb_columns(columns).items()
+        )
+        self.connection.execute(f'CREATE TABLE "{table_name}" ({table_columns})')
+
+    def start_query_execution(
+        self, query_string: str, execution_parameters: list[str]
+    ) -> dict[str, int]:
+        """
+        Runs the query to completion, returns the statistics the orchestrator reads from Athena
+        """
+        query = bind_execution_parameters(
+            to_duckdb_dialect(query_string), execution_parameters
+        )
+
+        start = time.perf_counter()
+        self.connection.execute(query)
+        elapsed = time.perf_counter() - start
+
+        return {
+            "DataScannedInBytes": sum(
+                os.path.getsize(file)
+                for files in self.table_files.values()
+                for file in files
+            ),
+            "EngineExecutionTimeInMillis": int(elapsed * 1000),
+        }
+
+    def get_query_results(
+        self, query_string: str, execution_parameters: list[str]
+    ) -> list[tuple[Any, ...]]:
+        """
+        Runs a SELECT query, returns its rows
+        """
+        query = bind_execution_parameters(
+            to_duckdb_dialect(query_string), execution_parameters
+        )
+        return self.connection.execute(query).fetchall()
+
+    def get_query_results_table(
+        self, query_string: str, execution_parameters: list[str]
+    ) -> pa.Table:
+        """
+        Runs a SELECT query, returns its rows as an Arrow table
+        """
+        query = bind_execution_parameters(
+            to_duckdb_dialect(query_string), execution_parameters
+        )
+        return self.connection.execute(query).fetch_arrow_table()
+
+    def export_results(self, file_path: str) -> None:
+        """
+        Writes the results table as a Parquet object, like the INSERT INTO of Athena
+        """
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self.connection.execute(
+            f"COPY \"{ATHENA_RESULTS_TABLE_NAME}\" TO '{file_path}' (FORMAT PARQUET)"
+        )
+
+    def get_results(self) -> list[tuple[Any, ...]]:
+        return self.connection.execute(
+            f'SELECT * FROM "{ATHENA_RESULTS_TABLE_NAME}" ORDER BY 1, 3 DESC'
+        ).fetchall()
@@ -0,0 +1,112 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import datetime
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Same columns and order as FLOW_LOGS_FORMAT (and the flow logs Glue table)
+FLOW_LOGS_SCHEMA = pa.schema(
+    [
+        ("az_id", pa.string()),
+        ("flow_direction", pa.string()),
+        ("pkt_srcaddr", pa.string()),
+        ("pkt_dstaddr", pa.string()),
+        ("start", pa.int64()),
+        ("bytes", pa.int64()),
+        ("packets", pa.int64()),
+        ("subnet_id", pa.string()),
+        ("interface_id", pa.string()),
+        ("pkt_src_aws_service", pa.string()),
+        ("pkt_dst_aws_service", pa.string()),
+        ("traffic_path", pa.int32()),
+    ]
+)
+
+FLOW_LOG_ID = "fl-0123456789abcdef0"
+
+MAX_ROWS_PER_FILE = 1_000_000
+
+# Per hour partitions, without Hive-compatible names (see VPCFlowLogs destination options)
+FLOW_LOGS_OBJECT_KEY_TEMPLATE = (
+    "AWSLogs/{account_id}/vpcflowlogs/{region}/{hour:%Y/%m/%d/%H}/"
+    "{account_id}_vpcflowlogs_{region}_{flow_log_id}_{hour:%Y%m%dT%H%MZ}_{part:08x}.log.parquet"
+)
+
+
+def write_flow_logs(
+    table: pa.Table,
+    bucket_path: str,
+    account_id: str,
+    region: str,
+    max_rows_per_file: int = MAX_ROWS_PER_FILE,
+) -> list[str]:
+    """
+    Writes flow logs records sorted by start time as Parquet objects, in the per hour
+    layout the VPC Flow Logs delivery uses. Returns the written files.
+    """
+    hours = table["start"].to_numpy() // 3600
+    hour_starts = np.flatnonzero(np.diff(hours, prepend=-1))
+    hour_ends = np.append(hour_starts[1:], len(hours))
+    file_paths = []
+
+    for hour_start, hour_end in zip(hour_starts, hour_ends):
+        hour = datetime.datetime.fromtimestamp(
+            int(hours[hour_start]) * 3600, tz=datetime.timezone.utc
+        )
+        for part, offset in enumerate(range(hour_start, hour_end, max_rows_per_file)):
+            object_key = FLOW_LOGS_OBJECT_KEY_TEMPLATE.format(
+                account_id=account_id,
+                region=region,
+                hour=hour,
+                flow_log_id=FLOW_LOG_ID,
+                part=part,
+            )
+            file_path = os.path.join(bucket_path, *object_key.split("/"))
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            pq.write_table(
+                table.slice(offset, min(max_rows_per_file, hour_end - offset)),
+                file_path,
+            )
+            file_paths.append(file_path)
+
+    return file_paths
+
+
+def get_row_groups_statistics(file_paths: list[str]) -> dict[str, int]:
+    """
+    Counts the row groups of the flow logs objects, and those a query filtering on
+    flow_direction = 'egress' skips by their min/max statistics
+    """
+    row_groups = 0
+    ingress_row_groups = 0
+
+    for file_path in file_paths:
+        metadata = pq.read_metadata(file_path)
+        column = metadata.schema.to_arrow_schema().get_field_index("flow_direction")
+        for row_group in range(metadata.num_row_groups):
+            statistics = metadata.row_group(row_group).column(column).statistics
+            row_groups += 1
+            if (
+                statistics is not None
+                and statistics.has_min_max
+                and statistics.min == statistics.max == "ingress"
+            ):
+                ingress_row_groups += 1
+
+    return {"row_groups": row_groups, "egress_skipped_row_groups": ingress_row_groups}
@@ -0,0 +1,567 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import datetime
+import ipaddress
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any, Optional
+
+import numpy as np
+import pyarrow as pa
+
+from .addresses import encode_ipv4_addresses
+from .cluster import DEFAULT_ZONES_IDS
+from .cluster import LOAD_BALANCER_ADDRESS_OFFSET
+from .cluster import MAX_NODES_PER_ZONE
+from .cluster import MAX_PODS_PER_ZONE
+from .cluster import NODE_ADDRESS_OFFSET
+from .cluster import POD_ADDRESS_OFFSET
+from .cluster import get_node_name
+from .cluster import get_zone_network_address
+from .cluster import make_load_balancer_service
+from .cluster import make_node
+from .cluster import make_owner_reference
+from .cluster import make_pod
+from .cluster import make_replica_set
+from .flow_logs import FLOW_LOGS_SCHEMA
+
+# Same columns as the CSV file the pod_metadata_extractor Lambda Function writes
+PODS_METADATA_COLUMNS = [
+    "name",
+    "ip",
+    "app",
+    "creation_time",
+    "node",
+    "az",
+    "az_id",
+    "ip_hi",
+    "ip_lo",
+]
+
+TIME_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# The first of the extractor's default APP_LABEL_FALLBACKS
+APP_NAME_LABEL = "app.kubernetes.io/name"
+
+# Creation time of the pods running when the window starts
+INITIAL_PODS_AGE_SECONDS = 86400
+
+NOT_REPLACED = np.iinfo(np.int64).max
+
+FLOW_DIRECTIONS = ["egress", "ingress"]
+
+# traffic-path of egress flows to a resource in the same VPC, ingress flows have none
+SAME_VPC_TRAFFIC_PATH = 1
+
+MIN_PACKET_SIZE = 64
+MAX_PACKET_SIZE = 1500
+
+
+@dataclass
+class Topology:
+    """
+    Synthetic cluster and traffic description.
+    `traffic_matrix` holds the flows per second from a source app to a destination app,
+    every flow picks its pods uniformly among the apps' replicas. `churn_rate` is the
+    fraction of the pods replaced per hour: every `churn_interval` seconds, replaced pods
+    get a new name, a new IP and a random node.
+    """
+
+    apps: list[str]
+    replicas: int
+    nodes_per_zone: int
+    traffic_matrix: dict[tuple[str, str], float]
+    churn_rate: float = 0.0
+    churn_interval: int = 300
+    mean_packets: int = 20
+    zones_ids: dict[str, str] = field(default_factory=lambda: dict(DEFAULT_ZONES_IDS))
+
+
+@dataclass
+class SyntheticTraffic:
+    """
+    Pods and egress flows generated for a topology, indexed by pod ID
+    """
+
+    topology: Topology
+    window_start: int
+    window_end: int
+    pod_app: np.ndarray
+    pod_node: np.ndarray
+    pod_zone: np.ndarray
+    pod_ip: np.ndarray
+    pod_birth: np.ndarray
+    pod_death: np.ndarray
+    flow_src: np.ndarray
+    flow_dst: np.ndarray
+    flow_start: np.ndarray
+    flow_bytes: np.ndarray
+    flow_packets: np.ndarray
+
+
+def uniform_traffic_matrix(
+    apps: list[str], flows_per_second: float
+) -> dict[tuple[str, str], float]:
+    """
+    Spreads the flows evenly over all the (source app, destination app) pairs
+    """
+    pair_rate = flows_per_second / (len(apps) * len(apps))
+
+    return {(src, dst): pair_rate for src in apps for dst in apps}
+
+
+def generate_traffic(
+    topology: Topology, window_start: int, window_end: int, seed: int = 0
+) -> SyntheticTraffic:
+    """
+    Generates the pods (with churn) and the flows started in (window_start, window_end).
+    All the per-flow values are drawn as whole arrays, only the churn steps and the
+    traffic matrix pairs are iterated over.
+    """
+    if not 0 < topology.nodes_per_zone <= MAX_NODES_PER_ZONE:
+        raise ValueError(f"nodes_per_zone must be in (0, {MAX_NODES_PER_ZONE}]")
+
+    rng = np.random.default_rng(seed)
+    zones = len(topology.zones_ids)
+    nodes = zones * topology.nodes_per_zone
+    replicas = topology.replicas
+    slots = len(topology.apps) * replicas
+    steps = max(-(-(window_end - window_start) // topology.churn_interval), 1)
+
+    # Replacements of each churn step, the initial pods have the IDs of their slots
+    replacement_probability = min(
+        topology.churn_rate * topology.churn_interval / 3600, 1.0
+    )
+    step_replacements = rng.binomial(slots, replacement_probability, size=steps)
+    step_replacements[0] = 0
+    replaced_slots = [
+        rng.choice(slots, replacements, replace=False)
+        for replacements in step_replacements
+    ]
+    pod_slot = np.concatenate([np.arange(slots), *replaced_slots])
+    pods = len(pod_slot)
+
+    # Initial pods are spread round-robin over the zones, then over the zones' nodes
+    initial_nodes = (np.arange(slots) % zones) * topology.nodes_per_zone + (
+        np.arange(slots) // zones
+    ) % topology.nodes_per_zone
+    pod_node = np.concatenate(
+        [initial_nodes, rng.integers(0, nodes, pods - slots)]
+    ).astype(np.int32)
+    pod_zone = pod_node // topology.nodes_per_zone
+    pod_app = (pod_slot // replicas).astype(np.int32)
+
+    # Pod IPs are allocated in order in their zone's network, and are never reused
+    zone_pods = np.bincount(pod_zone, minlength=zones)
+    if zone_pods.max() > MAX_PODS_PER_ZONE:
+        raise ValueError(f"More than {MAX_PODS_PER_ZONE} pods in a zone")
+    by_zone = np.argsort(pod_zone, kind="stable")
+    pod_zone_rank = np.empty(pods, dtype=np.int64)
+    pod_zone_rank[by_zone] = np.arange(pods) - np.repeat(
+        np.cumsum(zone_pods) - zone_pods, zone_pods
+    )
+    zones_addresses = np.array(
+        [get_zone_network_address(zone) for zone in range(zones)], dtype=np.int64
+    )
+    pod_ip = zones_addresses[pod_zone] + POD_ADDRESS_OFFSET + pod_zone_rank
+
+    # Pods of each slot at every churn step, and the pods' lifetimes
+    pod_birth = np.full(pods, window_start - INITIAL_PODS_AGE_SECONDS, dtype=np.int64)
+    pod_death = np.full(pods, NOT_REPLACED, dtype=np.int64)
+    slot_pods = np.empty((steps, slots), dtype=np.int64)
+    current_pods = np.arange(slots)
+    next_pod = slots
+    for step, replaced in enumerate(replaced_slots):
+        step_start = window_start + step * topology.churn_interval
+        new_pods = np.arange(next_pod, next_pod + len(replaced))
+        pod_death[current_pods[replaced]] = step_start
+        pod_birth[new_pods] = step_start
+        current_pods[replaced] = new_pods
+        slot_pods[step] = current_pods
+        next_pod += len(replaced)
+
+    apps_indices = {app: index for index, app in enumerate(topology.apps)}
+    flow_src, flow_dst, flow_starts = [], [], []
+    for (src_app, dst_app), flows_per_second in topology.traffic_matrix.items():
+        flows = rng.poisson(flows_per_second * (window_end - window_start))
+        start = rng.integers(window_start + 1, window_end, flows, endpoint=True)
+        flow_step = np.minimum(
+            (start - window_start) // topology.churn_interval, steps - 1
+        )
+        src_slot = apps_indices[src_app] * replicas + rng.integers(0, replicas, flows)
+        dst_slot = apps_indices[dst_app] * replicas + rng.integers(0, replicas, flows)
+        flow_src.append(slot_pods[flow_step, src_slot])
+        flow_dst.append(slot_pods[flow_step, dst_slot])
+        flow_starts.append(start)
+
+    flow_start = np.concatenate(flow_starts)
+    order = np.argsort(flow_start, kind="stable")
+    flows = len(order)
+    flow_packets = rng.integers(1, 2 * topology.mean_packets, flows, endpoint=True)
+    flow_bytes = flow_packets * rng.integers(
+        MIN_PACKET_SIZE, MAX_PACKET_SIZE, flows, endpoint=True
+    )
+
+    return SyntheticTraffic(
+        topology=topology,
+        window_start=window_start,
+        window_end=window_end,
+        pod_app=pod_app,
+        pod_node=pod_node,
+        pod_zone=pod_zone,
+        pod_ip=pod_ip,
+        pod_birth=pod_birth,
+        pod_death=pod_death,
+        flow_src=np.concatenate(flow_src)[order],
+        flow_dst=np.concatenate(flow_dst)[order],
+        flow_start=flow_start[order],
+        flow_bytes=flow_bytes,
+        flow_packets=flow_packets,
+    )
+
+
+def format_ipv4_addresses(addresses: np.ndarray) -> list[str]:
+    return [str(ipaddress.IPv4Address(int(address))) for address in addresses]
+
+
+def get_flow_logs_table(traffic: SyntheticTraffic) -> pa.Table:
+    """
+    Returns the flow logs records of the traffic, sorted by start time: every flow is
+    logged twice, egress on the source pod's node ENI and ingress on the destination's.
+    Columns are dictionary encoded, the way they are stored in the Parquet files.
+    """
+    topology = traffic.topology
+    flows = len(traffic.flow_start)
+    nodes = len(topology.zones_ids) * topology.nodes_per_zone
+    zones_ids = list(topology.zones_ids.values())
+
+    # Egress and ingress records of a flow are next to each other
+    direction = np.tile(np.arange(2, dtype=np.int32), flows)
+    observer = np.stack([traffic.flow_src, traffic.flow_dst], axis=1).ravel()
+    src = np.repeat(traffic.flow_src, 2)
+    dst = np.repeat(traffic.flow_dst, 2)
+    ips = pa.array(format_ipv4_addresses(traffic.pod_ip))
+
+    def dictionary(indices: np.ndarray, values: list[str]) -> pa.DictionaryArray:
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, pa.int32()), pa.array(values, pa.string())
+        )
+
+    columns = {
+        "az_id": dictionary(traffic.pod_zone[observer], zones_ids),
+        "flow_direction": dictionary(direction, FLOW_DIRECTIONS),
+        "pkt_srcaddr": pa.DictionaryArray.from_arrays(pa.array(src, pa.int32()), ips),
+        "pkt_dstaddr": pa.DictionaryArray.from_arrays(pa.array(dst, pa.int32()), ips),
+        "start": pa.array(np.repeat(traffic.flow_start, 2), pa.int64()),
+        "bytes": pa.array(np.repeat(traffic.flow_bytes, 2), pa.int64()),
+        "packets": pa.array(np.repeat(traffic.flow_packets, 2), pa.int64()),
+        "subnet_id": dictionary(
+            traffic.pod_zone[observer],
+            [f"subnet-0{zone:016x}" for zone in range(len(zones_ids))],
+        ),
+        "interface_id": dictionary(
+            traffic.pod_node[observer], [f"eni-0{node:016x}" for node in range(nodes)]
+        ),
+        "pkt_src_aws_service": pa.nulls(2 * flows, pa.string()),
+        "pkt_dst_aws_service": pa.nulls(2 * flows, pa.string()),
+        "traffic_path": pa.array(
+            np.full(2 * flows, SAME_VPC_TRAFFIC_PATH, dtype=np.int32),
+            mask=direction == 1,
+        ),
+    }
+
+    return pa.Table.from_arrays(
+        [columns[name] for name in FLOW_LOGS_SCHEMA.names],
+        names=FLOW_LOGS_SCHEMA.names,
+    )
+
+
+def get_ground_truth(
+    traffic: SyntheticTraffic,
+    since: Optional[int] = None,
+    alive_at: Optional[int] = None,
+) -> pa.Table:
+    """
+    Returns the cross-AZ bytes and packets by minute and (source app -> destination app),
+    in the layout of the results table. `since` keeps the flows started after it, like
+    the query's window. `alive_at` keeps the flows between pods that are running at that
+    time, which are the flows the analysis can attribute from a pods snapshot taken then.
+    """
+    selected = traffic.pod_zone[traffic.flow_src] != traffic.pod_zone[traffic.flow_dst]
+    if since is not None:
+        selected &= traffic.flow_start > since
+    if alive_at is not None:
+        alive = (traffic.pod_birth <= alive_at) & (alive_at < traffic.pod_death)
+        selected &= alive[traffic.flow_src] & alive[traffic.flow_dst]
+
+    apps = len(traffic.topology.apps)
+    minute = traffic.flow_start[selected] // 60
+    pair = (
+        traffic.pod_app[traffic.flow_src[selected]] * apps
+        + traffic.pod_app[traffic.flow_dst[selected]]
+    )
+    keys, inverse = np.unique(minute * apps * apps + pair, return_inverse=True)
+    pairs_names = np.array(
+        [
+            f"{src} -> {dst}"
+            for src in traffic.topology.apps
+            for dst in traffic.topology.apps
+        ]
+    )
+
+    return pa.table(
+        {
+            "timestamp": pa.array((keys // (apps * apps)) * 60, pa.timestamp("s")),
+            "cross_az_traffic": pa.array(pairs_names[keys % (apps * apps)]),
+            "bytes_transfered": pa.array(
+                np.bincount(inverse, traffic.flow_bytes[selected]), pa.int64()
+            ),
+            "packets_transfered": pa.array(
+                np.bincount(inverse, traffic.flow_packets[selected]), pa.int64()
+            ),
+        }
+    )
+
+
+def get_alive_pods(traffic: SyntheticTraffic, at: int) -> np.ndarray:
+    return np.flatnonzero((traffic.pod_birth <= at) & (at < traffic.pod_death))
+
+
+def get_pods_snapshot(
+    traffic: SyntheticTraffic, at: int, region: str
+) -> list[dict[str, Any]]:
+    """
+    Returns the rows of the pods table for the pods running at `at`
+    """
+    topology = traffic.topology
+    zones_names = list(topology.zones_ids)
+    pods = get_alive_pods(traffic, at)
+    pods_ips_hi, pods_ips_lo = encode_ipv4_addresses(traffic.pod_ip[pods])
+    rows = []
+
+    for pod, ip_hi, ip_lo in zip(pods, pods_ips_hi, pods_ips_lo):
+        zone = int(traffic.pod_zone[pod])
+        rows.append(
+            {
+                "name": f"{topology.apps[traffic.pod_app[pod]]}-{pod}",
+                "ip": str(ipaddress.IPv4Address(int(traffic.pod_ip[pod]))),
+                "app": topology.apps[traffic.pod_app[pod]],
+                "creation_time": datetime.datetime.fromtimestamp(
+                    int(traffic.pod_birth[pod]), tz=datetime.timezone.utc
+                ).strftime(TIME_DATE_FORMAT),
+                "node": get_node_name(
+                    zone, traffic.pod_node[pod] % topology.nodes_per_zone, region
+                ),
+                "az": zones_names[zone],
+                "az_id": topology.zones_ids[zones_names[zone]],
+                "ip_hi": str(ip_hi),
+                "ip_lo": str(ip_lo),
+            }
+        )
+
+    return rows
+
+
+def write_pods_snapshot(rows: list[dict[str, Any]], file_path: str) -> None:
+    """
+    Writes a pods snapshot the way the pod_metadata_extractor Lambda Function does
+    """
+    data_rows = [
+        ",".join(row[column] for column in PODS_METADATA_COLUMNS) for row in rows
+    ]
+
+    with open(file_path, "w") as f:
+        f.write(f"{','.join(PODS_METADATA_COLUMNS)}\n")
+        f.write("\n".join(data_rows))
+
+
+def get_cluster_snapshot(
+    traffic: SyntheticTraffic,
+    at: int,
+    region: str,
+    vpc_id: str,
+    app_label: str = "app",
+) -> dict[str, Any]:
+    """
+    Returns the Kubernetes objects and ENIs of the cluster at `at`, for the stub clients.
+    The first app is exposed through a Network Load Balancer with one ENI per zone.
+    """
+    topology = traffic.topology
+    nodes = []
+    network_interfaces = []
+    load_balancer_name = f"{topology.apps[0]}-lb"
+
+    for zone, (zone_name, zone_id) in enumerate(topology.zones_ids.items()):
+        zone_address = get_zone_network_address(zone)
+        for node in range(topology.nodes_per_zone):
+            nodes.append(
+                make_node(
+                    get_node_name(zone, node, region),
+                    zone_name,
+                    zone_id,
+                    str(
+                        ipaddress.IPv4Address(zone_address + NODE_ADDRESS_OFFSET + node)
+                    ),
+                )
+            )
+        network_interfaces.append(
+            {
+                "NetworkInterfaceId": f"eni-1{zone:016x}",
+                "Description": f"ELB net/{load_balancer_name}/0123456789abcdef",
+                "VpcId": vpc_id,
+                "AvailabilityZone": zone_name,
+                "PrivateIpAddresses": [
+                    {
+                        "PrivateIpAddress": str(
+                            ipaddress.IPv4Address(
+                                zone_address + LOAD_BALANCER_ADDRESS_OFFSET
+                            )
+                        )
+                    }
+                ],
+            }
+        )
+
+    # Every app is a Deployment. The apps are labeled in turn with app_label, with the
+    # fallback app.kubernetes.io/name label or not at all (labeled by their Deployment)
+    replica_sets = {
+        app: make_replica_set(f"{app}-5d4f8b7c9", f"{app}-5d4f8b7c9-uid", app)
+        for app in topology.apps
+    }
+    apps_labels = {
+        app: [{app_label: app}, {APP_NAME_LABEL: app}, {}][index % 3]
+        for index, app in enumerate(topology.apps)
+    }
+    pods = [
+        make_pod(
+            row["name"],
+            row["ip"],
+            apps_labels[row["app"]],
+            row["node"],
+            datetime.datetime.strptime(row["creation_time"], TIME_DATE_FORMAT),
+            [
+                make_owner_reference(
+                    "ReplicaSet",
+                    replica_sets[row["app"]].metadata.name,
+                    replica_sets[row["app"]].metadata.uid,
+                )
+            ],
+        )
+        for row in get_pods_snapshot(traffic, at, region)
+    ]
+    services = [
+        make_load_balancer_service(
+            topology.apps[0],
+            {app_label: topology.apps[0]},
+            f"{load_balancer_name}-0123456789abcdef.elb.{region}.amazonaws.com",
+        )
+    ]
+
+    return {
+        "zones_ids": dict(topology.zones_ids),
+        "nodes": nodes,
+        "pods": pods,
+        "replica_sets": list(replica_sets.values()),
+        "services": services,
+        "network_interfaces": network_interfaces,
+    }
+
+
+def main() -> None:
+    """
+    Writes the flow logs (per hour Parquet objects), the pods snapshots of every churn
+    step and the ground truth of a synthetic topology:
+
+        python -m local_harness.generator --output-dir /tmp/synthetic --replicas 2000
+    """
+    import argparse
+    import json
+    import os
+    import time
+
+    import pyarrow.csv
+
+    from .flow_logs import write_flow_logs
+
+    parser = argparse.ArgumentParser(prog="python -m local_harness.generator")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--apps", nargs="+", default=["frontend", "cart", "checkout"])
+    parser.add_argument("--replicas", type=int, default=100)
+    parser.add_argument("--nodes-per-zone", type=int, default=10)
+    parser.add_argument("--flows-per-second", type=float, default=1000)
+    parser.add_argument(
+        "--traffic-matrix",
+        help='JSON {"<src app> -> <dst app>": <flows per second>}, overrides --flows-per-second',
+    )
+    parser.add_argument("--churn-rate", type=float, default=0.0)
+    parser.add_argument("--hours", type=int, default=1)
+    parser.add_argument("--account-id", default="123456789012")
+    parser.add_argument("--region", default="us-east-2")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.traffic_matrix:
+        traffic_matrix = {
+            tuple(pair.split(" -> ")): flows_per_second
+            for pair, flows_per_second in json.loads(args.traffic_matrix).items()
+        }
+    else:
+        traffic_matrix = uniform_traffic_matrix(args.apps, args.flows_per_second)
+
+    topology = Topology(
+        apps=args.apps,
+        replicas=args.replicas,
+        nodes_per_zone=args.nodes_per_zone,
+        traffic_matrix=traffic_matrix,
+        churn_rate=args.churn_rate,
+    )
+    window_end = int(time.time()) // 3600 * 3600
+    window_start = window_end - args.hours * 3600
+
+    start = time.perf_counter()
+    traffic = generate_traffic(topology, window_start, window_end, args.seed)
+    table = get_flow_logs_table(traffic)
+    generation_latency = time.perf_counter() - start
+
+    start = time.perf_counter()
+    files = write_flow_logs(
+        table,
+        os.path.join(args.output_dir, "vpc-flow-logs"),
+        args.account_id,
+        args.region,
+    )
+    write_latency = time.perf_counter() - start
+
+    snapshots_dir = os.path.join(args.output_dir, "pods-snapshots")
+    os.makedirs(snapshots_dir, exist_ok=True)
+    for at in range(window_start, window_end + 1, topology.churn_interval):
+        write_pods_snapshot(
+            get_pods_snapshot(traffic, at, args.region),
+            os.path.join(snapshots_dir, f"pods_metadata_{at}.csv"),
+        )
+    pyarrow.csv.write_csv(
+        get_ground_truth(traffic), os.path.join(args.output_dir, "ground_truth.csv")
+    )
+
+    print(
+        f"{table.num_rows} flow logs rows in {len(files)} files, "
+        f"generated at {table.num_rows / generation_latency:.0f} rows/s, "
+        f"written at {table.num_rows / write_latency:.0f} rows/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
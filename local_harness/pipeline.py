@@ -0,0 +1,551 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import datetime
+import importlib
+import json
+import os
+import sys
+import time
+from types import ModuleType
+from typing import Any
+from unittest import mock
+
+import pyarrow as pa
+
+from athena_analyzer.query_template import QUERY_COMMIT_SHARDS_PATH
+from athena_analyzer.query_template import QUERY_NEW_RESULTS_PATH
+from athena_analyzer.query_template import QUERY_TRAFFIC_MATRIX_BY_APP_AND_AZ_PATH
+from athena_analyzer.query_template import format_commit_shards_query
+from athena_analyzer.query_template import format_new_results_query
+from athena_analyzer.query_template import format_query
+from athena_analyzer.query_template import format_traffic_matrix_query
+from athena_analyzer.query_template import get_estimated_query_cost
+from athena_analyzer.query_template import get_query_execution_parameter_names
+from athena_analyzer.query_template import get_sample_buckets
+from athena_analyzer.query_template import load_query_template
+from placement_recommender.recommendations import read_pods
+from placement_recommender.recommendations import recommend_placements
+from pod_metadata_extractor.infrastructure import NETWORK_INTERFACES_PREFIX
+from pod_metadata_extractor.infrastructure import PODS_METADATA_PREFIX
+from results_query_service.results import RESULTS_PREFIX
+from results_query_service.results import ResultsReader
+
+from .engine import ATHENA_RESULTS_TABLE_NAME
+from .engine import NETWORK_INTERFACES_TABLE_NAME
+from .engine import PODS_TABLE_NAME
+from .engine import SHARD_RESULTS_TABLE_NAME
+from .engine import VPC_FLOW_LOGS_TABLE_NAME
+from .engine import LocalAthenaEngine
+from .flow_logs import get_row_groups_statistics
+from .flow_logs import write_flow_logs
+from .generator import Topology
+from .generator import generate_traffic
+from .generator import get_cluster_snapshot
+from .generator import get_flow_logs_table
+from .generator import get_ground_truth
+from .generator import uniform_traffic_matrix
+from .stubs import LocalS3Client
+from .stubs import StubAppsV1Api
+from .stubs import StubBatchV1Api
+from .stubs import StubCoreV1Api
+from .stubs import StubEc2Client
+
+RUNTIME_DIR_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "pod_metadata_extractor",
+    "runtime",
+)
+ANOMALY_DETECTOR_RUNTIME_DIR_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "anomaly_detector",
+    "runtime",
+)
+FLOW_LOGS_COMPACTOR_RUNTIME_DIR_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "flow_logs_compactor",
+    "runtime",
+)
+SCAN_COST_ESTIMATOR_RUNTIME_DIR_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "scan_cost_estimator",
+    "runtime",
+)
+
+ACCOUNT_ID = "123456789012"
+REGION = "us-east-2"
+CLUSTER_NAME = "local-cluster"
+VPC_ID = "vpc-local"
+POD_METADATA_EXTRACTOR_BUCKET_NAME = "pod-metadata-extractor"
+FLOW_LOGS_BUCKET_NAME = "vpc-flow-logs"
+RESULTS_BUCKET_NAME = "athena-results"
+
+# The Lambda Function environment, see PodMetaDataExtractor
+EXTRACTOR_ENVIRONMENT = {
+    "REGION": REGION,
+    "CLUSTER_NAME": CLUSTER_NAME,
+    "VPC_ID": VPC_ID,
+    "OUTPUT_BUCKET_NAME": POD_METADATA_EXTRACTOR_BUCKET_NAME,
+    "PODS_METADATA_PREFIX": PODS_METADATA_PREFIX,
+    "NETWORK_INTERFACES_PREFIX": NETWORK_INTERFACES_PREFIX,
+    "CURRENT_ACCOUNT_ID": ACCOUNT_ID,
+}
+
+APPS = ["frontend", "cart", "checkout", "catalog", "payment"]
+ZONES_COUNT = 3
+PODS_PER_NODE = 30
+
+# The flow logs compactor Lambda Function environment, see FlowLogsCompactor
+FLOW_LOGS_COMPACTOR_ENVIRONMENT = {
+    "REGION": REGION,
+    "CURRENT_ACCOUNT_ID": ACCOUNT_ID,
+    "FLOW_LOGS_BUCKET_NAME": FLOW_LOGS_BUCKET_NAME,
+}
+# The delivered flow logs objects are small, many per hour (one per ENI batch and interval)
+DELIVERED_FLOW_LOGS_ROWS_PER_FILE = 5000
+# Scaled down from the Lambda Function's row groups to the harness traffic volumes
+COMPACTED_ROW_GROUP_ROWS = 4096
+
+# The scan cost estimator Lambda Function environment, see ScanCostEstimator
+SCAN_COST_ESTIMATOR_ENVIRONMENT = {
+    "REGION": REGION,
+    "CURRENT_ACCOUNT_ID": ACCOUNT_ID,
+    "FLOW_LOGS_BUCKET_NAME": FLOW_LOGS_BUCKET_NAME,
+}
+
+# The first run of the extractor analyzes the flow logs of the last SCHEDULE_MAX_INTERVAL
+TRAFFIC_WINDOW_SECONDS = 3600
+
+
+def import_extractor_runtime() -> ModuleType:
+    """
+    Imports the pod_metadata_extractor Lambda Function handler module the way the
+    Lambda runtime does: with its environment set and its directory on the path
+    """
+    for name, value in EXTRACTOR_ENVIRONMENT.items():
+        os.environ.setdefault(name, value)
+    if RUNTIME_DIR_PATH not in sys.path:
+        sys.path.insert(0, RUNTIME_DIR_PATH)
+
+    return importlib.import_module("get_pods")
+
+
+def import_anomaly_detector_runtime() -> ModuleType:
+    """
+    Imports the anomaly detector Lambda Function handler module, see import_extractor_runtime
+    """
+    if ANOMALY_DETECTOR_RUNTIME_DIR_PATH not in sys.path:
+        sys.path.insert(0, ANOMALY_DETECTOR_RUNTIME_DIR_PATH)
+
+    return importlib.import_module("detect_anomalies")
+
+
+def import_flow_logs_compactor_runtime() -> ModuleType:
+    """
+    Imports the flow logs compactor Lambda Function handler module, see import_extractor_runtime
+    """
+    for name, value in FLOW_LOGS_COMPACTOR_ENVIRONMENT.items():
+        os.environ.setdefault(name, value)
+    if FLOW_LOGS_COMPACTOR_RUNTIME_DIR_PATH not in sys.path:
+        sys.path.insert(0, FLOW_LOGS_COMPACTOR_RUNTIME_DIR_PATH)
+
+    return importlib.import_module("compact_flow_logs")
+
+
+def import_scan_cost_estimator_runtime() -> ModuleType:
+    """
+    Imports the scan cost estimator Lambda Function handler module, see import_extractor_runtime
+    """
+    for name, value in SCAN_COST_ESTIMATOR_ENVIRONMENT.items():
+        os.environ.setdefault(name, value)
+    if SCAN_COST_ESTIMATOR_RUNTIME_DIR_PATH not in sys.path:
+        sys.path.insert(0, SCAN_COST_ESTIMATOR_RUNTIME_DIR_PATH)
+
+    return importlib.import_module("estimate_scan_cost")
+
+
+def run_sharded_query(
+    engine: LocalAthenaEngine,
+    query_template: str,
+    sample_rate: float,
+    shards: int,
+    output: dict[str, Any],
+) -> tuple[dict[str, int], dict[str, Any]]:
+    """
+    Runs the shard queries then commits them, like the Analyze-Shards and Commit-Shards
+    states. The first attempt of shard 0 fails after writing its rows: they must not be
+    committed. Returns the statistics of the run, as if the shards ran concurrently.
+    """
+    shard_query_string = format_query(
+        query_template,
+        get_sample_buckets(sample_rate),
+        athena_results_table_name=SHARD_RESULTS_TABLE_NAME,
+        pods_table_name=PODS_TABLE_NAME,
+        network_interfaces_table_name=NETWORK_INTERFACES_TABLE_NAME,
+        vpc_flow_logs_table_name=VPC_FLOW_LOGS_TABLE_NAME,
+        shard_count=shards,
+    )
+    parameter_names = get_query_execution_parameter_names(query_template, sharded=True)
+    run_id = "local-run"
+    shard_attempts = []
+    shard_latencies = []
+
+    for shard in range(shards):
+        attempts = 2 if shard == 0 else 1
+        latency = 0
+        for attempt in range(attempts):
+            shard_attempt = f"{run_id}/{shard}/{attempt}"
+            execution_parameters = {
+                **output,
+                "shard": str(shard),
+                "shard_attempt": f"'{shard_attempt}'",
+            }
+            statistics = engine.start_query_execution(
+                shard_query_string,
+                [execution_parameters[name] for name in parameter_names],
+            )
+            latency += statistics["EngineExecutionTimeInMillis"]
+        shard_attempts.append(shard_attempt)
+        shard_latencies.append(latency)
+
+    commit_shards_query_template = load_query_template(QUERY_COMMIT_SHARDS_PATH)
+    commit_statistics = engine.start_query_execution(
+        format_commit_shards_query(
+            commit_shards_query_template,
+            athena_results_table_name=ATHENA_RESULTS_TABLE_NAME,
+            shard_results_table_name=SHARD_RESULTS_TABLE_NAME,
+        ),
+        [f"'{json.dumps(shard_attempts)}'"],
+    )
+
+    return {
+        "DataScannedInBytes": statistics["DataScannedInBytes"],
+        "EngineExecutionTimeInMillis": max(shard_latencies)
+        + commit_statistics["EngineExecutionTimeInMillis"],
+    }, {
+        "shard_query_ms": shard_latencies,
+        "commit_shards_ms": commit_statistics["EngineExecutionTimeInMillis"],
+    }
+
+
+def run_pipeline(
+    work_dir: str,
+    pods: int,
+    flows_per_pod: int,
+    sample_rate: float = 1.0,
+    churn_rate: float = 0.0,
+    compaction: bool = False,
+    shards: int = 1,
+) -> dict[str, Any]:
+    """
+    Runs the pipeline end to end on a synthetic cluster of `pods` pods:
+    pod metadata extractor -> local buckets -> Glue table layouts -> analysis query -> results table.
+    With `compaction`, the flow logs are delivered in small objects then compacted before the query.
+    With `shards`, the query runs shard by shard, the first attempt of the first shard fails.
+    Returns the latencies and throughputs of the stages, and the reported cross-AZ bytes
+    next to the generator's ground truth.
+    """
+    replicas = max(pods // len(APPS), 1)
+    topology = Topology(
+        apps=APPS,
+        replicas=replicas,
+        nodes_per_zone=max(replicas * len(APPS) // (PODS_PER_NODE * ZONES_COUNT), 1),
+        traffic_matrix=uniform_traffic_matrix(
+            APPS, flows_per_pod * replicas * len(APPS) / TRAFFIC_WINDOW_SECONDS
+        ),
+        churn_rate=churn_rate,
+    )
+    window_end = int(time.time())
+
+    start = time.perf_counter()
+    traffic = generate_traffic(
+        topology, window_end - TRAFFIC_WINDOW_SECONDS, window_end
+    )
+    flow_logs_table = get_flow_logs_table(traffic)
+    flow_logs_generation_latency = time.perf_counter() - start
+
+    s3_client = LocalS3Client(work_dir)
+    start = time.perf_counter()
+    flow_logs_files = write_flow_logs(
+        flow_logs_table,
+        s3_client.get_bucket_path(FLOW_LOGS_BUCKET_NAME),
+        ACCOUNT_ID,
+        REGION,
+        **(
+            {"max_rows_per_file": DELIVERED_FLOW_LOGS_ROWS_PER_FILE}
+            if compaction
+            else {}
+        ),
+    )
+    flow_logs_write_latency = time.perf_counter() - start
+
+    compaction_metrics = {}
+    if compaction:
+        compact_flow_logs = import_flow_logs_compactor_runtime()
+        now = window_end + 3600 + compact_flow_logs.COMPACTION_DELAY_SECONDS
+        row_groups_before = get_row_groups_statistics(flow_logs_files)
+        # Every hour of the window is closed by then
+        with mock.patch.multiple(
+            compact_flow_logs,
+            ROW_GROUP_ROWS=COMPACTED_ROW_GROUP_ROWS,
+            COMPACTION_LOOKBACK_HOURS=TRAFFIC_WINDOW_SECONDS // 3600 + 1,
+        ):
+            start = time.perf_counter()
+            hours = compact_flow_logs.compact_closed_hours(
+                s3_client, FLOW_LOGS_BUCKET_NAME, now
+            )
+            compaction_latency = time.perf_counter() - start
+        compacted_files = [
+            s3_client.get_object_path(FLOW_LOGS_BUCKET_NAME, content["Key"])
+            for page in s3_client.get_paginator("list_objects_v2").paginate(
+                Bucket=FLOW_LOGS_BUCKET_NAME
+            )
+            for content in page["Contents"]
+            if content["Key"].endswith(".parquet")
+        ]
+        compaction_metrics = {
+            "compaction_ms": round(compaction_latency * 1000, 1),
+            "compacted_hours": len(hours),
+            "flow_logs_objects_before": len(flow_logs_files),
+            "flow_logs_objects_after": len(compacted_files),
+            "row_groups_before": row_groups_before,
+            "row_groups_after": get_row_groups_statistics(compacted_files),
+        }
+
+    cluster = get_cluster_snapshot(traffic, window_end, REGION, VPC_ID)
+    get_pods = import_extractor_runtime()
+    # Every run is a new cluster, as seen by a cold Lambda Function container: the
+    # extractor gets new caches, kept for its warm invocation, and its client accessors
+    # return the stubs
+    ec2_client = StubEc2Client(cluster["zones_ids"], cluster["network_interfaces"])
+    core_v1_api = StubCoreV1Api(cluster["nodes"], cluster["pods"], cluster["services"])
+    apps_v1_api = StubAppsV1Api(cluster["replica_sets"])
+    batch_v1_api = StubBatchV1Api()
+    extractor_runtime = {
+        "nodes_cache": get_pods.new_nodes_cache(),
+        "owners_cache": get_pods.new_owners_cache(),
+        "availability_zone_ids": {},
+        "get_s3_client": lambda: s3_client,
+        "get_ec2_client": lambda: ec2_client,
+        "get_core_v1_api": lambda: core_v1_api,
+        "get_apps_v1_api": lambda: apps_v1_api,
+        "get_batch_v1_api": lambda: batch_v1_api,
+    }
+    metrics = get_pods.MetricsLogger(
+        get_pods.METRICS_NAMESPACE, {}, sink=lambda _: None
+    )
+
+    start = time.perf_counter()
+    with mock.patch.multiple(get_pods, **extractor_runtime):
+        output = get_pods.extract_pods_metadata({}, metrics)
+    extractor_latency = time.perf_counter() - start
+    if output["statusCode"] != get_pods.HTTP_OK:
+        raise RuntimeError(f"The pod metadata extractor failed: {output['body']}")
+
+    # The scan cost pre-flight, a cold estimate lists every hour of the window, a warm
+    # one only the hours still open. Every hour of the window is closed by then.
+    estimate_scan_cost = import_scan_cost_estimator_runtime()
+    estimate_now = window_end + 3600 + estimate_scan_cost.HOUR_CLOSED_DELAY_SECONDS
+    hour_listings_cache: dict[str, dict[str, int]] = {}
+    start = time.perf_counter()
+    scan_estimate = estimate_scan_cost.estimate_scan(
+        s3_client,
+        FLOW_LOGS_BUCKET_NAME,
+        int(output["window_start"]),
+        estimate_now,
+        hour_listings_cache,
+        estimate_scan_cost.SCAN_BUDGET_BYTES,
+        estimate_scan_cost.SCAN_BUDGET_ACTION,
+    )
+    scan_estimate_cold_latency = time.perf_counter() - start
+    start = time.perf_counter()
+    # Over a budget just under the estimate, the window is narrowed to its most recent
+    # hours, the older ones are reported as dropped
+    narrowed_scan_estimate = estimate_scan_cost.estimate_scan(
+        s3_client,
+        FLOW_LOGS_BUCKET_NAME,
+        int(output["window_start"]),
+        estimate_now,
+        hour_listings_cache,
+        scan_estimate["estimated_bytes_scanned"] - 1,
+        "narrow-window",
+    )
+    scan_estimate_warm_latency = time.perf_counter() - start
+
+    pod_metadata_extractor_bucket_path = s3_client.get_bucket_path(
+        POD_METADATA_EXTRACTOR_BUCKET_NAME
+    )
+    start = time.perf_counter()
+    engine = LocalAthenaEngine(
+        os.path.join(pod_metadata_extractor_bucket_path, PODS_METADATA_PREFIX),
+        os.path.join(pod_metadata_extractor_bucket_path, NETWORK_INTERFACES_PREFIX),
+        s3_client.get_bucket_path(FLOW_LOGS_BUCKET_NAME),
+    )
+    engine_load_latency = time.perf_counter() - start
+    query_template = load_query_template()
+    if shards > 1:
+        query_statistics, shards_metrics = run_sharded_query(
+            engine, query_template, sample_rate, shards, output
+        )
+        query_latency = query_statistics["EngineExecutionTimeInMillis"] / 1000
+    else:
+        query_string = format_query(
+            query_template,
+            get_sample_buckets(sample_rate),
+            athena_results_table_name=ATHENA_RESULTS_TABLE_NAME,
+            pods_table_name=PODS_TABLE_NAME,
+            network_interfaces_table_name=NETWORK_INTERFACES_TABLE_NAME,
+            vpc_flow_logs_table_name=VPC_FLOW_LOGS_TABLE_NAME,
+        )
+        # The orchestrator passes the extractor output fields, in the placeholders' order
+        execution_parameters = [
+            output[name] for name in get_query_execution_parameter_names(query_template)
+        ]
+        query_statistics = engine.start_query_execution(
+            query_string, execution_parameters
+        )
+        query_latency = query_statistics["EngineExecutionTimeInMillis"] / 1000
+        shards_metrics = {}
+    results = engine.get_results()
+    # The orchestrator commits the run once its query succeeded
+    with mock.patch.multiple(get_pods, **extractor_runtime):
+        commit_output = get_pods.commit_run(
+            {"commit_schedule_state": {"last_run": output["last_run"]}}
+        )
+    if commit_output["statusCode"] != get_pods.HTTP_OK:
+        raise RuntimeError(f"The schedule state commit failed: {commit_output['body']}")
+
+    # The anomaly detection stage, folding the new results into fresh traffic statistics
+    detect_anomalies = import_anomaly_detector_runtime()
+    new_results_query_template = load_query_template(QUERY_NEW_RESULTS_PATH)
+    new_results = engine.get_query_results(
+        format_new_results_query(new_results_query_template, ATHENA_RESULTS_TABLE_NAME),
+        [
+            output[name]
+            for name in get_query_execution_parameter_names(new_results_query_template)
+        ],
+    )
+    start = time.perf_counter()
+    detect_anomalies.update_statistics(
+        detect_anomalies.new_state(),
+        sorted(new_results),
+        detect_anomalies.EWMA_ALPHA,
+        detect_anomalies.SEASONAL_EWMA_ALPHA,
+        detect_anomalies.Z_SCORE_THRESHOLD,
+        detect_anomalies.MIN_SAMPLES,
+    )
+    anomaly_detection_latency = time.perf_counter() - start
+
+    # The placement recommendations, from the traffic matrix of the analyzed window
+    traffic_matrix_query_template = load_query_template(
+        QUERY_TRAFFIC_MATRIX_BY_APP_AND_AZ_PATH
+    )
+    traffic_matrix = engine.get_query_results_table(
+        format_traffic_matrix_query(
+            traffic_matrix_query_template, PODS_TABLE_NAME, VPC_FLOW_LOGS_TABLE_NAME
+        ),
+        [
+            output[name]
+            for name in get_query_execution_parameter_names(
+                traffic_matrix_query_template
+            )
+        ],
+    )
+    pods_snapshot = pa.concat_tables(
+        [read_pods(file_path) for file_path in engine.table_files[PODS_TABLE_NAME]]
+    )
+    start = time.perf_counter()
+    recommendations = recommend_placements(traffic_matrix, pods_snapshot)
+    recommendations_latency = time.perf_counter() - start
+
+    # The results query service, on the results object of the run
+    engine.export_results(
+        s3_client.get_object_path(
+            RESULTS_BUCKET_NAME, f"{RESULTS_PREFIX}{window_end}.parquet"
+        )
+    )
+    results_reader = ResultsReader(RESULTS_BUCKET_NAME, s3_client=s3_client)
+    results_range = (
+        datetime.datetime.fromtimestamp(
+            window_end - 2 * TRAFFIC_WINDOW_SECONDS, tz=datetime.timezone.utc
+        ),
+        datetime.datetime.fromtimestamp(window_end + 60, tz=datetime.timezone.utc),
+    )
+    start = time.perf_counter()
+    results_reader.get_cross_az_traffic(*results_range)
+    results_query_cold_latency = time.perf_counter() - start
+    start = time.perf_counter()
+    results_by_pair = results_reader.get_cross_az_traffic(*results_range)
+    results_query_warm_latency = time.perf_counter() - start
+
+    # A warm invocation, with the clients and the nodes cache of the first one
+    warm_metrics = get_pods.MetricsLogger(
+        get_pods.METRICS_NAMESPACE, {}, sink=lambda _: None
+    )
+    start = time.perf_counter()
+    with mock.patch.multiple(get_pods, **extractor_runtime):
+        get_pods.extract_pods_metadata({}, warm_metrics)
+    extractor_warm_latency = time.perf_counter() - start
+
+    window_start = int(output["window_start"])
+    ground_truth = get_ground_truth(traffic, since=window_start)
+    attributable = get_ground_truth(traffic, since=window_start, alive_at=window_end)
+
+    return {
+        "pods": len(cluster["pods"]),
+        "nodes": len(cluster["nodes"]),
+        "flow_logs_rows": flow_logs_table.num_rows,
+        "flow_logs_generation_ms": round(flow_logs_generation_latency * 1000, 1),
+        "flow_logs_generation_rows_per_second": round(
+            flow_logs_table.num_rows / max(flow_logs_generation_latency, 1e-3)
+        ),
+        "flow_logs_write_ms": round(flow_logs_write_latency * 1000, 1),
+        **compaction_metrics,
+        "extractor_latency_ms": round(extractor_latency * 1000, 1),
+        "scan_estimate_cold_ms": round(scan_estimate_cold_latency * 1000, 1),
+        "scan_estimate_warm_ms": round(scan_estimate_warm_latency * 1000, 1),
+        "scan_estimate_bytes": scan_estimate["estimated_bytes_scanned"],
+        "scan_estimate_objects": scan_estimate["objects"],
+        "narrowed_scan_estimate": narrowed_scan_estimate["body"],
+        "extractor_metrics": {
+            name: value for name, (value, _) in metrics.metrics.items()
+        },
+        "extractor_warm_latency_ms": round(extractor_warm_latency * 1000, 1),
+        "extractor_warm_metrics": {
+            name: value for name, (value, _) in warm_metrics.metrics.items()
+        },
+        "engine_load_ms": round(engine_load_latency * 1000, 1),
+        "query_latency_ms": round(query_latency * 1000, 1),
+        "query_rows_per_second": round(
+            flow_logs_table.num_rows / max(query_latency, 1e-3)
+        ),
+        **shards_metrics,
+        "data_scanned_bytes": query_statistics["DataScannedInBytes"],
+        "estimated_query_cost_usd": get_estimated_query_cost(
+            query_statistics["DataScannedInBytes"]
+        ),
+        "new_results_rows": len(new_results),
+        "anomaly_detection_ms": round(anomaly_detection_latency * 1000, 1),
+        "results_query_cold_ms": round(results_query_cold_latency * 1000, 1),
+        "results_query_warm_ms": round(results_query_warm_latency * 1000, 1),
+        "results_query_bytes": sum(results_by_pair["bytes_transfered"].to_pylist()),
+        "traffic_matrix_rows": traffic_matrix.num_rows,
+        "recommendations_ms": round(recommendations_latency * 1000, 1),
+        "recommendations": recommendations.to_pylist(),
+        "reported_bytes": sum(row[2] for row in results),
+        "ground_truth_bytes": sum(ground_truth["bytes_transfered"].to_pylist()),
+        "attributable_bytes": sum(attributable["bytes_transfered"].to_pylist()),
+        "results": results,
+    }
@@ -0,0 +1,293 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import datetime
+import io
+import os
+import shutil
+from types import SimpleNamespace
+from typing import Any, Iterator, Optional
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class LocalS3Client:
+    """
+    Stand-in for the boto3 S3 client calls of the runtime, backed by a local
+    directory: every bucket is a sub-directory and every object key a file path
+    """
+
+    class exceptions:
+        NoSuchKey = NoSuchKey
+
+    def __init__(self, root_dir: str) -> None:
+        self.root_dir = root_dir
+
+    def get_bucket_path(self, bucket_name: str) -> str:
+        return os.path.join(self.root_dir, bucket_name)
+
+    def get_object_path(self, bucket_name: str, key: str) -> str:
+        return os.path.join(self.get_bucket_path(bucket_name), *key.split("/"))
+
+    def upload_file(
+        self,
+        file_path: str,
+        bucket_name: str,
+        key: str,
+        ExtraArgs: Optional[dict[str, Any]] = None,
+    ) -> None:
+        object_path = self.get_object_path(bucket_name, key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        shutil.copyfile(file_path, object_path)
+
+    def put_object(
+        self, Bucket: str, Key: str, Body: bytes, **kwargs: Any
+    ) -> dict[str, Any]:
+        object_path = self.get_object_path(Bucket, Key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        with open(object_path, "wb") as file:
+            file.write(Body)
+        return {}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs: Any) -> dict[str, Any]:
+        object_path = self.get_object_path(Bucket, Key)
+        if not os.path.isfile(object_path):
+            raise NoSuchKey(f"s3://{Bucket}/{Key}")
+
+        with open(object_path, "rb") as file:
+            return {"Body": io.BytesIO(file.read())}
+
+    def copy_object(
+        self, Bucket: str, Key: str, CopySource: dict[str, str], **kwargs: Any
+    ) -> dict[str, Any]:
+        source_path = self.get_object_path(CopySource["Bucket"], CopySource["Key"])
+        if not os.path.isfile(source_path):
+            raise NoSuchKey(f"s3://{CopySource['Bucket']}/{CopySource['Key']}")
+
+        object_path = self.get_object_path(Bucket, Key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        shutil.copyfile(source_path, object_path)
+        return {}
+
+    def delete_objects(
+        self, Bucket: str, Delete: dict[str, Any], **kwargs: Any
+    ) -> dict[str, Any]:
+        for deleted_object in Delete["Objects"]:
+            object_path = self.get_object_path(Bucket, deleted_object["Key"])
+            if os.path.isfile(object_path):
+                os.remove(object_path)
+        return {}
+
+    def get_paginator(self, operation_name: str) -> SimpleNamespace:
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(operation_name)
+
+        return SimpleNamespace(paginate=self.__paginate_objects)
+
+    def __paginate_objects(
+        self, Bucket: str, Prefix: str = ""
+    ) -> Iterator[dict[str, Any]]:
+        bucket_path = self.get_bucket_path(Bucket)
+        contents = []
+        for dir_path, _, file_names in os.walk(bucket_path):
+            for file_name in file_names:
+                file_path = os.path.join(dir_path, file_name)
+                key = os.path.relpath(file_path, bucket_path).replace(os.sep, "/")
+                if not key.startswith(Prefix):
+                    continue
+                stat = os.stat(file_path)
+                contents.append(
+                    {
+                        "Key": key,
+                        # Objects are never rewritten in place by the harness
+                        "ETag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+                        "LastModified": datetime.datetime.fromtimestamp(
+                            stat.st_mtime, tz=datetime.timezone.utc
+                        ),
+                        "Size": stat.st_size,
+                    }
+                )
+
+        yield {"Contents": sorted(contents, key=lambda content: content["Key"])}
+
+
+class StubEc2Client:
+    """
+    Stand-in for the boto3 EC2 client calls of the runtime, serving the
+    synthetic cluster's Availability Zones and load balancer ENIs
+    """
+
+    def __init__(
+        self, zones_ids: dict[str, str], network_interfaces: list[dict[str, Any]]
+    ) -> None:
+        self.zones_ids = zones_ids
+        self.network_interfaces = network_interfaces
+
+    def describe_availability_zones(self) -> dict[str, Any]:
+        return {
+            "AvailabilityZones": [
+                {"ZoneName": zone_name, "ZoneId": zone_id}
+                for zone_name, zone_id in self.zones_ids.items()
+            ]
+        }
+
+    def get_paginator(self, operation_name: str) -> SimpleNamespace:
+        if operation_name != "describe_network_interfaces":
+            raise NotImplementedError(operation_name)
+
+        return SimpleNamespace(paginate=self.__paginate_network_interfaces)
+
+    def __paginate_network_interfaces(
+        self, Filters: list[dict[str, Any]]
+    ) -> Iterator[dict[str, Any]]:
+        interfaces = self.network_interfaces
+
+        for interface_filter in Filters:
+            name, values = interface_filter["Name"], interface_filter["Values"]
+            if name == "vpc-id":
+                interfaces = [i for i in interfaces if i["VpcId"] in values]
+            elif name == "description":
+                # Only trailing wildcards are supported, that is all the runtime uses
+                prefixes = [value.rstrip("*") for value in values]
+                interfaces = [
+                    i
+                    for i in interfaces
+                    if any(i["Description"].startswith(p) for p in prefixes)
+                ]
+
+        yield {"NetworkInterfaces": interfaces}
+
+
+def get_list_page(
+    items: list[Any], limit: Optional[int], _continue: Optional[str]
+) -> SimpleNamespace:
+    """
+    Returns a page of a list call, the continue token is the offset of the next page
+    """
+    offset = int(_continue) if _continue else 0
+    end = offset + limit if limit else len(items)
+
+    return SimpleNamespace(
+        items=items[offset:end],
+        metadata=SimpleNamespace(_continue=str(end) if end < len(items) else None),
+    )
+
+
+class StubCoreV1Api:
+    """
+    Stand-in for kubernetes.client.CoreV1Api serving synthetic nodes, pods and Services.
+    Pods are listed page by page (limit / _continue) like the Kubernetes API server does.
+    Node changes get a resourceVersion, nodes can be listed no older than a past one.
+    """
+
+    def __init__(self, nodes: list[Any], pods: list[Any], services: list[Any]) -> None:
+        self.nodes = nodes
+        self.pods = pods
+        self.services = services
+        self.resource_version = 1
+        self.nodes_resource_versions = {node.metadata.name: 1 for node in nodes}
+
+    def set_nodes(self, nodes: list[Any]) -> None:
+        """
+        Replaces the nodes, the added and modified nodes get a new resourceVersion
+        """
+        current_nodes = {node.metadata.name: node for node in self.nodes}
+
+        for node in nodes:
+            if current_nodes.get(node.metadata.name) is not node:
+                self.resource_version += 1
+                self.nodes_resource_versions[node.metadata.name] = self.resource_version
+        for name in current_nodes.keys() - {node.metadata.name for node in nodes}:
+            self.resource_version += 1
+            del self.nodes_resource_versions[name]
+        self.nodes = list(nodes)
+
+    def list_node(
+        self,
+        watch: bool = False,
+        resource_version: Optional[str] = None,
+        resource_version_match: Optional[str] = None,
+    ) -> SimpleNamespace:
+        return SimpleNamespace(
+            items=[
+                SimpleNamespace(
+                    metadata=SimpleNamespace(
+                        name=node.metadata.name,
+                        labels=node.metadata.labels,
+                        resource_version=str(
+                            self.nodes_resource_versions[node.metadata.name]
+                        ),
+                    ),
+                    status=node.status,
+                )
+                for node in self.nodes
+            ],
+            metadata=SimpleNamespace(
+                _continue=None, resource_version=str(self.resource_version)
+            ),
+        )
+
+    def list_pod_for_all_namespaces(
+        self,
+        label_selector: Optional[str] = None,
+        limit: Optional[int] = None,
+        _continue: Optional[str] = None,
+        watch: bool = False,
+    ) -> SimpleNamespace:
+        pods = self.pods
+        if label_selector:
+            pods = [pod for pod in pods if label_selector in pod.metadata.labels]
+
+        return get_list_page(pods, limit, _continue)
+
+    def list_service_for_all_namespaces(self, watch: bool = False) -> SimpleNamespace:
+        return SimpleNamespace(
+            items=self.services, metadata=SimpleNamespace(_continue=None)
+        )
+
+
+class StubAppsV1Api:
+    """
+    Stand-in for kubernetes.client.AppsV1Api serving the synthetic ReplicaSets
+    """
+
+    def __init__(self, replica_sets: list[Any]) -> None:
+        self.replica_sets = replica_sets
+        self.list_calls = 0
+
+    def list_replica_set_for_all_namespaces(
+        self,
+        limit: Optional[int] = None,
+        _continue: Optional[str] = None,
+        watch: bool = False,
+    ) -> SimpleNamespace:
+        self.list_calls += 1
+        return get_list_page(self.replica_sets, limit, _continue)
+
+
+class StubBatchV1Api:
+    """
+    Stand-in for kubernetes.client.BatchV1Api, the synthetic cluster has no Jobs
+    """
+
+    def list_job_for_all_namespaces(
+        self,
+        limit: Optional[int] = None,
+        _continue: Optional[str] = None,
+        watch: bool = False,
+    ) -> SimpleNamespace:
+        return get_list_page([], limit, _continue)
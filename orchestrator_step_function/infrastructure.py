@@ -13,7 +13,12 @@
 # IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+from typing import Any, Optional
+
+from aws_cdk import Aws
+from aws_cdk import Duration
 from aws_cdk import RemovalPolicy
+from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda as lambda_
 from aws_cdk import aws_logs as logs
 from aws_cdk import aws_s3 as s3
@@ -21,7 +26,197 @@ from aws_cdk import aws_stepfunctions as stepfunctions
 from aws_cdk import aws_stepfunctions_tasks as stepfunctions_tasks
 from constructs import Construct
 
+from anomaly_detector.infrastructure import AnomalyDetector
+from athena_analyzer.infrastructure import AnalysisSource
 from athena_analyzer.infrastructure import AthenaAnalyzer
+from athena_analyzer.infrastructure import FleetAthenaAnalyzer
+from athena_analyzer.query_template import FLEET_QUERY_EXECUTION_PARAMETERS
+from flow_logs_compactor.infrastructure import FlowLogsCompactor
+from scan_cost_estimator.infrastructure import ScanCostEstimator
+
+# Same retry policy as the LambdaInvoke task, for the source-agnostic Lambda invocations
+LAMBDA_INVOKE_RETRY = {
+    "ErrorEquals": [
+        "Lambda.ClientExecutionTimeoutException",
+        "Lambda.ServiceException",
+        "Lambda.AWSLambdaException",
+        "Lambda.SdkClientException",
+    ],
+    "IntervalSeconds": 2,
+    "MaxAttempts": 6,
+    "BackoffRate": 2,
+}
+
+# A failed shard query is run again, up to MAX_SHARD_ATTEMPTS times, the other shards are not
+MAX_SHARD_ATTEMPTS = 3
+SHARD_RETRY_INTERVAL = Duration.seconds(30)
+
+
+def create_record_analysis_run_chain(
+    scope: Construct,
+    id: str,
+    athena_analyzer: AthenaAnalyzer | FleetAthenaAnalyzer,
+    source: str,
+    query_name: str,
+) -> stepfunctions.Chain:
+    """
+    Creates the StepFunction states that record the statistics and the estimated cost
+    of the Athena Query that just completed (in $.QueryStatistics) in the analysis runs table
+    """
+    execution_parameters = {
+        "run_id": stepfunctions.JsonPath.format(
+            "'{}'", stepfunctions.JsonPath.string_at("$$.Execution.Name")
+        ),
+        "source": stepfunctions.JsonPath.format("'{}'", source),
+        "query_name": stepfunctions.JsonPath.format("'{}'", query_name),
+        "data_scanned_bytes": stepfunctions.JsonPath.format(
+            "{}",
+            stepfunctions.JsonPath.string_at("$.QueryStatistics.DataScannedInBytes"),
+        ),
+        "engine_execution_time_millis": stepfunctions.JsonPath.format(
+            "{}",
+            stepfunctions.JsonPath.string_at(
+                "$.QueryStatistics.EngineExecutionTimeInMillis"
+            ),
+        ),
+    }
+
+    prepare_analysis_run_parameters_state = stepfunctions.Pass(
+        scope,
+        id=f"Prepare-{id}-Parameters",
+        parameters={
+            "execution_parameters": stepfunctions.JsonPath.array(
+                *[
+                    execution_parameters[name]
+                    for name in athena_analyzer.analysis_run_query_execution_parameter_names
+                ]
+            )
+        },
+        result_path="$.AnalysisRun",
+    )
+
+    record_analysis_run_state = stepfunctions_tasks.AthenaStartQueryExecution(
+        scope,
+        id=id,
+        query_string=athena_analyzer.analysis_run_sql_query_string,
+        execution_parameters=stepfunctions.JsonPath.list_at(
+            "$.AnalysisRun.execution_parameters"
+        ),
+        query_execution_context=stepfunctions_tasks.QueryExecutionContext(
+            database_name=athena_analyzer.glue_database.database_name
+        ),
+        result_configuration=stepfunctions_tasks.ResultConfiguration(
+            output_location=s3.Location(
+                bucket_name=athena_analyzer.results_bucket.bucket_name,
+                object_key="query_results",
+            )
+        ),
+        work_group=athena_analyzer.work_group_name,
+        integration_pattern=stepfunctions.IntegrationPattern.RUN_JOB,
+        result_path=stepfunctions.JsonPath.DISCARD,
+    )
+
+    return prepare_analysis_run_parameters_state.next(record_analysis_run_state)
+
+
+def create_detect_anomalies_chain(
+    scope: Construct,
+    id: str,
+    athena_analyzer: AthenaAnalyzer | FleetAthenaAnalyzer,
+    anomaly_detector: AnomalyDetector,
+    query_string: str,
+    extractor_output_path: str,
+    source: str,
+) -> stepfunctions.Chain:
+    """
+    Creates the StepFunction states that select the results of the analyzed window and
+    fold them into the anomaly detector's traffic statistics. An error response of the
+    anomaly detector fails the chain with an AnomalyDetectionFailed error
+    """
+    prepare_new_results_parameters_state = stepfunctions.Pass(
+        scope,
+        id=f"Prepare-{id}-Parameters",
+        parameters={
+            "execution_parameters": stepfunctions.JsonPath.array(
+                *[
+                    stepfunctions.JsonPath.string_at(f"{extractor_output_path}.{name}")
+                    for name in athena_analyzer.new_results_query_execution_parameter_names
+                ]
+            )
+        },
+        result_path="$.NewResults",
+    )
+
+    select_new_results_state = stepfunctions_tasks.AthenaStartQueryExecution(
+        scope,
+        id=f"Select-{id}-Results",
+        query_string=query_string,
+        execution_parameters=stepfunctions.JsonPath.list_at(
+            "$.NewResults.execution_parameters"
+        ),
+        query_execution_context=stepfunctions_tasks.QueryExecutionContext(
+            database_name=athena_analyzer.glue_database.database_name
+        ),
+        result_configuration=stepfunctions_tasks.ResultConfiguration(
+            output_location=s3.Location(
+                bucket_name=athena_analyzer.results_bucket.bucket_name,
+                object_key="query_results",
+            )
+        ),
+        work_group=athena_analyzer.work_group_name,
+        integration_pattern=stepfunctions.IntegrationPattern.RUN_JOB,
+        result_selector={
+            "QueryExecutionId": stepfunctions.JsonPath.string_at(
+                "$.QueryExecution.QueryExecutionId"
+            )
+        },
+        result_path="$.NewResults",
+    )
+
+    detect_anomalies_state = stepfunctions_tasks.LambdaInvoke(
+        scope,
+        id=id,
+        lambda_function=anomaly_detector.lambda_function,
+        payload=stepfunctions.TaskInput.from_object(
+            {
+                "QueryExecutionId": stepfunctions.JsonPath.string_at(
+                    "$.NewResults.QueryExecutionId"
+                ),
+                "source": source,
+                "run_time": stepfunctions.JsonPath.string_at("$$.Execution.StartTime"),
+                "window_end": stepfunctions.JsonPath.number_at(
+                    f"{extractor_output_path}.last_run"
+                ),
+            }
+        ),
+        result_selector={
+            "Payload": stepfunctions.JsonPath.object_at("$.Payload"),
+        },
+        result_path="$.Anomalies",
+    )
+
+    http_success_condition = stepfunctions.Condition.number_equals(
+        "$.Anomalies.Payload.statusCode", 200
+    )
+    anomaly_detection_failed_state = stepfunctions.Fail(
+        scope,
+        f"{id}-Failed",
+        error="AnomalyDetectionFailed",
+        cause_path="$.Anomalies.Payload.body",
+    )
+
+    return (
+        prepare_new_results_parameters_state.next(select_new_results_state)
+        .next(detect_anomalies_state)
+        .next(
+            stepfunctions.Choice(scope, f"Check-{id}-Status-Code")
+            .when(
+                http_success_condition,
+                stepfunctions.Succeed(scope, f"{id}-Succeeded"),
+            )
+            .otherwise(anomaly_detection_failed_state)
+        )
+    )
 
 
 class OrchestratorStepFunction(Construct):
@@ -31,7 +226,12 @@ class OrchestratorStepFunction(Construct):
         id: str,
         pod_metadata_extractor_lambda_function: lambda_.Function,
         athena_analyzer: AthenaAnalyzer,
-        **kwargs
+        anomaly_detector: AnomalyDetector,
+        cluster_name: str,
+        metrics_namespace: str,
+        flow_logs_compactor: Optional[FlowLogsCompactor] = None,
+        scan_cost_estimator: Optional[ScanCostEstimator] = None,
+        **kwargs,
     ) -> None:
         super().__init__(scope, id, **kwargs)
 
@@ -40,12 +240,40 @@ class OrchestratorStepFunction(Construct):
                 pod_metadata_extractor_lambda_function
             )
         )
-        start_athena_query_state = self.__create_start_athena_query_state(
-            athena_analyzer
+        if athena_analyzer.shard_count > 1:
+            query_chain = self.__create_analyze_shards_chain(
+                athena_analyzer, cluster_name, metrics_namespace
+            )
+        else:
+            query_chain = self.__create_query_chain(
+                athena_analyzer, cluster_name, metrics_namespace
+            )
+        detect_anomalies_chain = create_detect_anomalies_chain(
+            self,
+            "Detect-Anomalies",
+            athena_analyzer,
+            anomaly_detector,
+            athena_analyzer.new_results_sql_query_string,
+            "$.Payload",
+            cluster_name,
         )
 
+        analysis_chain = query_chain.next(
+            self.__create_commit_schedule_state_chain(
+                pod_metadata_extractor_lambda_function, detect_anomalies_chain
+            )
+        )
+        if scan_cost_estimator is not None:
+            analysis_chain = self.__create_scan_budget_chain(
+                scan_cost_estimator, analysis_chain, cluster_name, metrics_namespace
+            )
+        if flow_logs_compactor is not None:
+            analysis_chain = self.__create_compact_flow_logs_chain(
+                flow_logs_compactor, analysis_chain
+            )
+
         state_machine_definition = self.__create_state_machine_definition(
-            invoke_pod_metadata_extractor_state, start_athena_query_state
+            invoke_pod_metadata_extractor_state, analysis_chain
         )
         self.state_machine = self.__create_state_machine(state_machine_definition)
 
@@ -89,31 +317,267 @@ class OrchestratorStepFunction(Construct):
     def __create_state_machine_definition(
         self,
         invoke_pod_metadata_extractor_state: stepfunctions_tasks.LambdaInvoke,
-        start_athena_query_state: stepfunctions_tasks.AthenaStartQueryExecution,
+        analysis_chain: stepfunctions.Chain,
     ) -> stepfunctions.Chain:
         """
         Creates a definition of the flow for a StepFunction StateMachine
         """
         fail_state = stepfunctions.Fail(self, "Fail-State")
+        skip_state = stepfunctions.Succeed(self, "Skip-Analysis")
         choice_state = stepfunctions.Choice(self, "Check-Statue-Code")
 
         http_success_condition = stepfunctions.Condition.number_equals(
             "$.Payload.statusCode", 200
         )
+        run_not_due_condition = stepfunctions.Condition.and_(
+            http_success_condition,
+            stepfunctions.Condition.boolean_equals("$.Payload.run_due", False),
+        )
 
         state_machine_definition = invoke_pod_metadata_extractor_state.next(
-            choice_state.when(
-                http_success_condition, start_athena_query_state
-            ).otherwise(fail_state)
+            choice_state.when(run_not_due_condition, skip_state)
+            .when(http_success_condition, analysis_chain)
+            .otherwise(fail_state)
         )
 
         return state_machine_definition
 
-    def __create_start_athena_query_state(
+    def __create_query_chain(
+        self, athena_analyzer: AthenaAnalyzer, cluster_name: str, metrics_namespace: str
+    ) -> stepfunctions.Chain:
+        """
+        Creates the StepFunction states that run the inter-az traffic Athena Query over the
+        window, publish and record its statistics
+        """
+        prepare_query_parameters_state = self.__create_prepare_query_parameters_state(
+            athena_analyzer
+        )
+        start_athena_query_state = self.__create_start_athena_query_state(
+            athena_analyzer
+        )
+        publish_query_metrics_state = self.__create_publish_query_metrics_state(
+            cluster_name, metrics_namespace
+        )
+        record_analysis_run_chain = create_record_analysis_run_chain(
+            self,
+            "Record-Analysis-Run",
+            athena_analyzer,
+            cluster_name,
+            "query-cross-az-traffic-by-app",
+        )
+
+        return (
+            prepare_query_parameters_state.next(start_athena_query_state)
+            .next(publish_query_metrics_state)
+            .next(record_analysis_run_chain)
+        )
+
+    def __create_analyze_shards_chain(
+        self, athena_analyzer: AthenaAnalyzer, cluster_name: str, metrics_namespace: str
+    ) -> stepfunctions.Chain:
+        """
+        Creates the StepFunction states of a sharded run: a Map state runs the query of
+        every shard concurrently, each shard is retried on its own. The results of the
+        successful attempts are then committed to the results table by one query.
+        """
+        list_shards_state = stepfunctions.Pass(
+            self,
+            id="List-Shards",
+            parameters={"shards": list(range(athena_analyzer.shard_count))},
+            result_path="$.Shards",
+        )
+
+        shard_attempt = stepfunctions.JsonPath.format(
+            "{}/{}/{}",
+            stepfunctions.JsonPath.string_at("$$.Execution.Name"),
+            stepfunctions.JsonPath.string_at("$.Shard.shard"),
+            stepfunctions.JsonPath.string_at("$.Shard.attempt"),
+        )
+        execution_parameters = {
+            "shard": stepfunctions.JsonPath.format(
+                "{}", stepfunctions.JsonPath.string_at("$.Shard.shard")
+            ),
+            "shard_attempt": stepfunctions.JsonPath.format("'{}'", shard_attempt),
+        }
+        prepare_shard_query_parameters_state = stepfunctions.Pass(
+            self,
+            id="Prepare-Shard-Query-Parameters",
+            parameters={
+                "execution_parameters": stepfunctions.JsonPath.array(
+                    *[
+                        execution_parameters.get(
+                            name, stepfunctions.JsonPath.string_at(f"$.Payload.{name}")
+                        )
+                        for name in athena_analyzer.shard_query_execution_parameter_names
+                    ]
+                )
+            },
+            result_path="$.Query",
+        )
+        start_shard_query_state = self.__create_start_athena_query_state(
+            athena_analyzer,
+            "Start-Shard-Athena-Query",
+            athena_analyzer.shard_sql_query_string,
+        )
+
+        # Every attempt is tagged with its number, the rows a failed attempt may have
+        # written are never committed
+        count_shard_attempt_state = stepfunctions.Pass(
+            self,
+            id="Count-Shard-Attempt",
+            parameters={
+                "shard": stepfunctions.JsonPath.number_at("$.Shard.shard"),
+                "attempt": stepfunctions.JsonPath.math_add(
+                    stepfunctions.JsonPath.number_at("$.Shard.attempt"), 1
+                ),
+            },
+            result_path="$.Shard",
+        )
+        start_shard_query_state.add_catch(
+            count_shard_attempt_state, result_path="$.Error"
+        )
+        retry_shard_state = stepfunctions.Choice(self, "Check-Shard-Attempts").when(
+            stepfunctions.Condition.number_less_than(
+                "$.Shard.attempt", MAX_SHARD_ATTEMPTS
+            ),
+            stepfunctions.Wait(
+                self,
+                "Wait-Before-Shard-Retry",
+                time=stepfunctions.WaitTime.duration(SHARD_RETRY_INTERVAL),
+            ).next(prepare_shard_query_parameters_state),
+        )
+        retry_shard_state.otherwise(stepfunctions.Fail(self, "Shard-Failed"))
+        count_shard_attempt_state.next(retry_shard_state)
+
+        shard_analyzed_state = stepfunctions.Pass(
+            self,
+            id="Shard-Analyzed",
+            parameters={"shard_attempt": shard_attempt},
+        )
+
+        # The shard's rows are written once its query succeeds: a failure to publish or
+        # record its statistics does not fail the shard, nor the commit
+        record_shard_statistics_state = stepfunctions.Parallel(
+            self,
+            "Record-Shard-Statistics",
+            result_path=stepfunctions.JsonPath.DISCARD,
+        )
+        record_shard_statistics_state.branch(
+            self.__create_publish_query_metrics_state(
+                cluster_name, metrics_namespace, "Publish-Shard-Query-Metrics"
+            ).next(
+                create_record_analysis_run_chain(
+                    self,
+                    "Record-Shard-Analysis-Run",
+                    athena_analyzer,
+                    cluster_name,
+                    "query-cross-az-traffic-by-app",
+                )
+            )
+        )
+        record_shard_statistics_state.add_catch(
+            shard_analyzed_state, result_path=stepfunctions.JsonPath.DISCARD
+        )
+
+        shard_chain = (
+            prepare_shard_query_parameters_state.next(start_shard_query_state)
+            .next(record_shard_statistics_state)
+            .next(shard_analyzed_state)
+        )
+
+        analyze_shards_state = stepfunctions.Map(
+            self,
+            "Analyze-Shards",
+            items_path="$.Shards.shards",
+            item_selector={
+                "Payload": stepfunctions.JsonPath.object_at("$.Payload"),
+                "Shard": {
+                    "shard": stepfunctions.JsonPath.number_at("$$.Map.Item.Value"),
+                    "attempt": 0,
+                },
+            },
+            max_concurrency=athena_analyzer.shard_count,
+            result_selector={
+                "shard_attempts": stepfunctions.JsonPath.list_at("$[*].shard_attempt")
+            },
+            result_path="$.Shards",
+        )
+        analyze_shards_state.item_processor(shard_chain)
+
+        prepare_commit_shards_parameters_state = stepfunctions.Pass(
+            self,
+            id="Prepare-Commit-Shards-Parameters",
+            parameters={
+                "execution_parameters": stepfunctions.JsonPath.array(
+                    stepfunctions.JsonPath.format(
+                        "'{}'",
+                        stepfunctions.JsonPath.json_to_string(
+                            stepfunctions.JsonPath.list_at("$.Shards.shard_attempts")
+                        ),
+                    )
+                )
+            },
+            result_path="$.Query",
+        )
+        commit_shards_state = self.__create_start_athena_query_state(
+            athena_analyzer,
+            "Commit-Shards",
+            athena_analyzer.commit_shards_sql_query_string,
+        )
+
+        publish_commit_shards_query_metrics_state = (
+            self.__create_publish_query_metrics_state(
+                cluster_name, metrics_namespace, "Publish-Commit-Shards-Query-Metrics"
+            )
+        )
+        record_commit_shards_run_chain = create_record_analysis_run_chain(
+            self,
+            "Record-Commit-Shards-Run",
+            athena_analyzer,
+            cluster_name,
+            "query-commit-shards",
+        )
+
+        return (
+            list_shards_state.next(analyze_shards_state)
+            .next(prepare_commit_shards_parameters_state)
+            .next(commit_shards_state)
+            .next(publish_commit_shards_query_metrics_state)
+            .next(record_commit_shards_run_chain)
+        )
+
+    def __create_prepare_query_parameters_state(
         self, athena_analyzer: AthenaAnalyzer
+    ) -> stepfunctions.Pass:
+        """
+        Creates a StepFunction state that builds the Athena Query execution parameters
+        (e.g. the analyzed window start) from the pod_metadata_extractor output
+        """
+        execution_parameters = stepfunctions.JsonPath.array(
+            *[
+                stepfunctions.JsonPath.string_at(f"$.Payload.{name}")
+                for name in athena_analyzer.query_execution_parameter_names
+            ]
+        )
+
+        prepare_query_parameters_state = stepfunctions.Pass(
+            self,
+            id="Prepare-Query-Parameters",
+            parameters={"execution_parameters": execution_parameters},
+            result_path="$.Query",
+        )
+
+        return prepare_query_parameters_state
+
+    def __create_start_athena_query_state(
+        self,
+        athena_analyzer: AthenaAnalyzer,
+        id: str = "Start-Athena-Query",
+        query_string: Optional[str] = None,
     ) -> stepfunctions_tasks.AthenaStartQueryExecution:
         """
-        Creates a StepFunction task that starts the inter-az traffic Athena Query
+        Creates a StepFunction task that runs the inter-az traffic Athena Query (or a
+        shard's, or the shards commit) and waits for it to complete, keeping the query statistics
         """
         query_execution_context = stepfunctions_tasks.QueryExecutionContext(
             database_name=athena_analyzer.glue_database.database_name
@@ -128,14 +592,72 @@ class OrchestratorStepFunction(Construct):
 
         start_athena_query_state = stepfunctions_tasks.AthenaStartQueryExecution(
             self,
-            id="Start-Athena-Query",
-            query_string=athena_analyzer.sql_query_string,
+            id=id,
+            query_string=query_string or athena_analyzer.sql_query_string,
+            execution_parameters=stepfunctions.JsonPath.list_at(
+                "$.Query.execution_parameters"
+            ),
             query_execution_context=query_execution_context,
             result_configuration=result_configuration,
+            work_group=athena_analyzer.work_group_name,
+            integration_pattern=stepfunctions.IntegrationPattern.RUN_JOB,
+            result_selector={
+                "DataScannedInBytes": stepfunctions.JsonPath.number_at(
+                    "$.QueryExecution.Statistics.DataScannedInBytes"
+                ),
+                "EngineExecutionTimeInMillis": stepfunctions.JsonPath.number_at(
+                    "$.QueryExecution.Statistics.EngineExecutionTimeInMillis"
+                ),
+            },
+            result_path="$.QueryStatistics",
         )
 
         return start_athena_query_state
 
+    def __create_publish_query_metrics_state(
+        self,
+        cluster_name: str,
+        metrics_namespace: str,
+        id: str = "Publish-Query-Metrics",
+    ) -> stepfunctions_tasks.CallAwsService:
+        """
+        Creates a StepFunction task that publishes the Athena Query statistics as CloudWatch metrics
+        """
+        dimensions = [{"Name": "ClusterName", "Value": cluster_name}]
+
+        publish_query_metrics_state = stepfunctions_tasks.CallAwsService(
+            self,
+            id=id,
+            service="cloudwatch",
+            action="putMetricData",
+            parameters={
+                "Namespace": metrics_namespace,
+                "MetricData": [
+                    {
+                        "MetricName": "DataScannedInBytes",
+                        "Dimensions": dimensions,
+                        "Unit": "Bytes",
+                        "Value": stepfunctions.JsonPath.number_at(
+                            "$.QueryStatistics.DataScannedInBytes"
+                        ),
+                    },
+                    {
+                        "MetricName": "EngineExecutionTime",
+                        "Dimensions": dimensions,
+                        "Unit": "Milliseconds",
+                        "Value": stepfunctions.JsonPath.number_at(
+                            "$.QueryStatistics.EngineExecutionTimeInMillis"
+                        ),
+                    },
+                ],
+            },
+            iam_resources=["*"],
+            iam_action="cloudwatch:PutMetricData",
+            result_path=stepfunctions.JsonPath.DISCARD,
+        )
+
+        return publish_query_metrics_state
+
     def __create_invoke_pod_metadata_extractor_state(
         self, pod_metadata_extractor_lambda_function: lambda_.Function
     ) -> stepfunctions_tasks.LambdaInvoke:
@@ -149,3 +671,635 @@ class OrchestratorStepFunction(Construct):
         )
 
         return invoke_pod_metadata_extractor_state
+
+    def __create_commit_schedule_state_chain(
+        self,
+        pod_metadata_extractor_lambda_function: lambda_.Function,
+        next_chain: stepfunctions.Chain,
+    ) -> stepfunctions.Chain:
+        """
+        Creates the StepFunction states that commit the run's schedule state once its
+        analysis query succeeded, the next run's window then starts at this run. Until
+        then, a failed or aborted run leaves its window to the next one
+        """
+        commit_schedule_state_state = stepfunctions_tasks.LambdaInvoke(
+            self,
+            id="Commit-Schedule-State",
+            lambda_function=pod_metadata_extractor_lambda_function,
+            payload=stepfunctions.TaskInput.from_object(
+                {
+                    "commit_schedule_state": {
+                        "last_run": stepfunctions.JsonPath.number_at(
+                            "$.Payload.last_run"
+                        )
+                    }
+                }
+            ),
+            result_selector={
+                "Payload": stepfunctions.JsonPath.object_at("$.Payload"),
+            },
+            result_path="$.ScheduleState",
+        )
+        schedule_state_commit_failed_state = stepfunctions.Fail(
+            self,
+            "Schedule-State-Commit-Failed",
+            error="ScheduleStateCommitFailed",
+            cause_path="$.ScheduleState.Payload.body",
+        )
+
+        return commit_schedule_state_state.next(
+            stepfunctions.Choice(self, "Check-Schedule-State-Commit")
+            .when(
+                stepfunctions.Condition.number_equals(
+                    "$.ScheduleState.Payload.statusCode", 200
+                ),
+                next_chain,
+            )
+            .otherwise(schedule_state_commit_failed_state)
+        )
+
+    def __create_scan_budget_chain(
+        self,
+        scan_cost_estimator: ScanCostEstimator,
+        analysis_chain: stepfunctions.Chain,
+        cluster_name: str,
+        metrics_namespace: str,
+    ) -> stepfunctions.Chain:
+        """
+        Creates the StepFunction states that estimate the bytes the run's query scans
+        before it starts. A run over budget fails with a ScanBudgetExceeded error, or has
+        its window narrowed, the bytes and seconds left unanalyzed are published as
+        CloudWatch metrics. When the estimate fails, the run goes on, still capped by the
+        workgroup's bytes scanned cutoff
+        """
+        estimate_scan_cost_state = stepfunctions_tasks.LambdaInvoke(
+            self,
+            id="Estimate-Scan-Cost",
+            lambda_function=scan_cost_estimator.lambda_function,
+            payload=stepfunctions.TaskInput.from_object(
+                {
+                    "window_start": stepfunctions.JsonPath.string_at(
+                        "$.Payload.window_start"
+                    )
+                }
+            ),
+            result_selector={
+                "Payload": stepfunctions.JsonPath.object_at("$.Payload"),
+            },
+            result_path="$.ScanCost",
+        )
+        estimate_scan_cost_state.add_catch(
+            analysis_chain, result_path=stepfunctions.JsonPath.DISCARD
+        )
+
+        # The analysis reads its execution parameters from the extractor output, the
+        # estimate's query parameters (the possibly narrowed window) override them
+        apply_scan_budget_state = stepfunctions.Pass(
+            self,
+            id="Apply-Scan-Budget",
+            parameters={
+                "Payload": stepfunctions.JsonPath.json_merge(
+                    stepfunctions.JsonPath.object_at("$.Payload"),
+                    stepfunctions.JsonPath.object_at(
+                        "$.ScanCost.Payload.query_parameters"
+                    ),
+                ),
+                "ScanCost": stepfunctions.JsonPath.object_at("$.ScanCost"),
+            },
+        )
+        scan_budget_exceeded_state = stepfunctions.Fail(
+            self,
+            "Scan-Budget-Exceeded",
+            error="ScanBudgetExceeded",
+            cause_path="$.ScanCost.Payload.body",
+        )
+        check_scan_budget_state = (
+            stepfunctions.Choice(self, "Check-Scan-Budget")
+            .when(
+                stepfunctions.Condition.boolean_equals(
+                    "$.ScanCost.Payload.run_allowed", False
+                ),
+                scan_budget_exceeded_state,
+            )
+            .otherwise(apply_scan_budget_state.next(analysis_chain))
+        )
+
+        dimensions = [{"Name": "ClusterName", "Value": cluster_name}]
+        publish_scan_cost_metrics_state = stepfunctions_tasks.CallAwsService(
+            self,
+            id="Publish-Scan-Cost-Metrics",
+            service="cloudwatch",
+            action="putMetricData",
+            parameters={
+                "Namespace": metrics_namespace,
+                "MetricData": [
+                    {
+                        "MetricName": "EstimatedBytesScanned",
+                        "Dimensions": dimensions,
+                        "Unit": "Bytes",
+                        "Value": stepfunctions.JsonPath.number_at(
+                            "$.ScanCost.Payload.estimated_bytes_scanned"
+                        ),
+                    },
+                    {
+                        "MetricName": "ScanBudgetDroppedBytes",
+                        "Dimensions": dimensions,
+                        "Unit": "Bytes",
+                        "Value": stepfunctions.JsonPath.number_at(
+                            "$.ScanCost.Payload.dropped_bytes"
+                        ),
+                    },
+                    {
+                        "MetricName": "ScanBudgetDroppedSeconds",
+                        "Dimensions": dimensions,
+                        "Unit": "Seconds",
+                        "Value": stepfunctions.JsonPath.number_at(
+                            "$.ScanCost.Payload.dropped_seconds"
+                        ),
+                    },
+                ],
+            },
+            iam_resources=["*"],
+            iam_action="cloudwatch:PutMetricData",
+            result_path=stepfunctions.JsonPath.DISCARD,
+        )
+        # The run is not held back by a failure to publish its scan cost
+        publish_scan_cost_metrics_state.add_catch(
+            check_scan_budget_state, result_path=stepfunctions.JsonPath.DISCARD
+        )
+
+        http_success_condition = stepfunctions.Condition.number_equals(
+            "$.ScanCost.Payload.statusCode", 200
+        )
+
+        return estimate_scan_cost_state.next(
+            stepfunctions.Choice(self, "Check-Scan-Cost-Status-Code")
+            .when(
+                http_success_condition,
+                publish_scan_cost_metrics_state.next(check_scan_budget_state),
+            )
+            .otherwise(analysis_chain)
+        )
+
+    def __create_compact_flow_logs_chain(
+        self,
+        flow_logs_compactor: FlowLogsCompactor,
+        analysis_chain: stepfunctions.Chain,
+    ) -> stepfunctions.Chain:
+        """
+        Creates the StepFunction states that compact the closed hours of flow logs before
+        the query, the compaction deletes the delivered objects a query would read twice.
+        A failed compaction may leave an hour half compacted, the run fails then instead
+        of analyzing it: its window is left to the next run, which resumes the compaction
+        """
+        compact_flow_logs_state = stepfunctions_tasks.LambdaInvoke(
+            self,
+            id="Compact-Flow-Logs",
+            lambda_function=flow_logs_compactor.lambda_function,
+            result_selector={
+                "Payload": stepfunctions.JsonPath.object_at("$.Payload"),
+            },
+            result_path="$.Compaction",
+        )
+        compaction_failed_state = stepfunctions.Fail(
+            self,
+            "Flow-Logs-Compaction-Failed",
+            error="FlowLogsCompactionFailed",
+            cause_path="$.Compaction.Payload.body",
+        )
+        compact_flow_logs_state.add_catch(
+            stepfunctions.Fail(
+                self,
+                "Flow-Logs-Compactor-Failed",
+                error="FlowLogsCompactionFailed",
+                cause_path="$.Compaction.Cause",
+            ),
+            result_path="$.Compaction",
+        )
+
+        return compact_flow_logs_state.next(
+            stepfunctions.Choice(self, "Check-Flow-Logs-Compaction")
+            .when(
+                stepfunctions.Condition.number_equals(
+                    "$.Compaction.Payload.statusCode", 200
+                ),
+                analysis_chain,
+            )
+            .otherwise(compaction_failed_state)
+        )
+
+
+class FleetOrchestratorStepFunction(Construct):
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        fleet_athena_analyzer: FleetAthenaAnalyzer,
+        anomaly_detector: AnomalyDetector,
+        sources: list[AnalysisSource],
+        max_concurrent_queries: int,
+        metrics_namespace: str,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Orchestrates central analysis mode: every source's pod_metadata_extractor is invoked
+        and its query run, at most `max_concurrent_queries` at a time, then the results of
+        the run are merged into the fleet-wide results. A failing source is reported as a
+        metric and left out of the merge instead of failing the other sources
+        """
+        super().__init__(scope, id, **kwargs)
+
+        list_sources_state = self.__create_list_sources_state(
+            fleet_athena_analyzer, sources
+        )
+        analyze_sources_state = self.__create_analyze_sources_state(
+            fleet_athena_analyzer,
+            anomaly_detector,
+            max_concurrent_queries,
+            metrics_namespace,
+        )
+        merge_fleet_results_state = self.__create_merge_fleet_results_state(
+            fleet_athena_analyzer
+        )
+        record_merge_analysis_run_chain = create_record_analysis_run_chain(
+            self,
+            "Record-Merge-Analysis-Run",
+            fleet_athena_analyzer,
+            "fleet",
+            "query-fleet-cross-az-traffic",
+        )
+
+        state_machine_definition = (
+            list_sources_state.next(analyze_sources_state)
+            .next(merge_fleet_results_state)
+            .next(record_merge_analysis_run_chain)
+        )
+        self.state_machine = self.__create_state_machine(state_machine_definition)
+
+        # Identity-based only: remote sources grant the invocation on their side
+        self.state_machine.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=["lambda:InvokeFunction"],
+                resources=[
+                    source.pod_metadata_extractor_lambda_function.function_arn
+                    for source in sources
+                ],
+            )
+        )
+        for source in sources:
+            source.pod_metadata_extractor_bucket.grant_read(self.state_machine)
+            source.flow_logs_bucket.grant_read(self.state_machine)
+        fleet_athena_analyzer.results_bucket.grant_read_write(self.state_machine)
+
+    def __create_state_machine(
+        self, state_machine_definition: stepfunctions.Chain
+    ) -> stepfunctions.StateMachine:
+        """
+        Creates a StepFunction StateMachine that orchestrates running of the fleet-wide inter-az traffic analysis
+        """
+        log_group = logs.LogGroup(
+            self,
+            "State-Machine-Log-Group",
+            log_group_name="Fleet-Orchestrator-Log-Group",
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_DAY,
+        )
+        logs_option = stepfunctions.LogOptions(
+            destination=log_group,
+            include_execution_data=True,
+            level=stepfunctions.LogLevel.ALL,
+        )
+
+        state_machine = stepfunctions.StateMachine(
+            self,
+            id="State-Machine",
+            definition=state_machine_definition,
+            state_machine_name="fleet-analysis-orchestrator",
+            logs=logs_option,
+            tracing_enabled=True,
+        )
+        log_group.grant_write(state_machine)
+
+        return state_machine
+
+    def __create_list_sources_state(
+        self, fleet_athena_analyzer: FleetAthenaAnalyzer, sources: list[AnalysisSource]
+    ) -> stepfunctions.Pass:
+        """
+        Creates a StepFunction state that lists the sources, with their query, and
+        builds the run ID execution parameter
+        """
+        sources_items = [
+            {
+                "source_id": source.source_id,
+                "function_name": source.pod_metadata_extractor_lambda_function.function_arn,
+                "query_string": fleet_athena_analyzer.source_query_strings[
+                    source.source_id
+                ],
+                "new_results_query_string": fleet_athena_analyzer.source_new_results_query_strings[
+                    source.source_id
+                ],
+            }
+            for source in sources
+        ]
+
+        list_sources_state = stepfunctions.Pass(
+            self,
+            id="List-Sources",
+            parameters={
+                "sources": sources_items,
+                "execution_parameters": stepfunctions.JsonPath.array(
+                    *[
+                        self.__get_fleet_execution_parameter(name)
+                        for name in fleet_athena_analyzer.fleet_query_execution_parameter_names
+                    ]
+                ),
+            },
+            result_path="$.Fleet",
+        )
+
+        return list_sources_state
+
+    def __create_analyze_sources_state(
+        self,
+        fleet_athena_analyzer: FleetAthenaAnalyzer,
+        anomaly_detector: AnomalyDetector,
+        max_concurrent_queries: int,
+        metrics_namespace: str,
+    ) -> stepfunctions.Map:
+        """
+        Creates a StepFunction Map state that analyzes the sources concurrently, up to
+        `max_concurrent_queries` so the runs stay within the Athena query quota
+        """
+        invoke_pod_metadata_extractor_state = stepfunctions.CustomState(
+            self,
+            "Invoke-Source-Pod-Metadata-Extractor",
+            state_json={
+                "Type": "Task",
+                "Resource": f"arn:{Aws.PARTITION}:states:::lambda:invoke",
+                "Parameters": {
+                    "FunctionName.$": "$.function_name",
+                    "Payload.$": "$$.Execution.Input",
+                },
+                "ResultSelector": {"Payload.$": "$.Payload"},
+                "ResultPath": "$.Extractor",
+                "Retry": [LAMBDA_INVOKE_RETRY],
+            },
+        )
+
+        execution_parameters = stepfunctions.JsonPath.array(
+            *[
+                self.__get_fleet_execution_parameter(name)
+                for name in fleet_athena_analyzer.query_execution_parameter_names
+            ]
+        )
+        prepare_query_parameters_state = stepfunctions.Pass(
+            self,
+            id="Prepare-Source-Query-Parameters",
+            parameters={"execution_parameters": execution_parameters},
+            result_path="$.Query",
+        )
+
+        start_athena_query_state = self.__create_start_athena_query_state(
+            fleet_athena_analyzer,
+            "Start-Source-Athena-Query",
+            stepfunctions.JsonPath.string_at("$.query_string"),
+            "$.Query.execution_parameters",
+        )
+
+        dimensions = [
+            {
+                "Name": "ClusterName",
+                "Value": stepfunctions.JsonPath.string_at("$.source_id"),
+            }
+        ]
+        publish_query_metrics_state = self.__create_put_metric_data_state(
+            "Publish-Source-Query-Metrics",
+            metrics_namespace,
+            [
+                {
+                    "MetricName": "DataScannedInBytes",
+                    "Dimensions": dimensions,
+                    "Unit": "Bytes",
+                    "Value": stepfunctions.JsonPath.number_at(
+                        "$.QueryStatistics.DataScannedInBytes"
+                    ),
+                },
+                {
+                    "MetricName": "EngineExecutionTime",
+                    "Dimensions": dimensions,
+                    "Unit": "Milliseconds",
+                    "Value": stepfunctions.JsonPath.number_at(
+                        "$.QueryStatistics.EngineExecutionTimeInMillis"
+                    ),
+                },
+            ],
+        )
+        publish_source_failure_state = self.__create_put_metric_data_state(
+            "Publish-Source-Failure",
+            metrics_namespace,
+            [
+                {
+                    "MetricName": "SourceAnalysisFailures",
+                    "Dimensions": dimensions,
+                    "Unit": "Count",
+                    "Value": 1,
+                },
+            ],
+        )
+        record_source_analysis_run_chain = create_record_analysis_run_chain(
+            self,
+            "Record-Source-Analysis-Run",
+            fleet_athena_analyzer,
+            stepfunctions.JsonPath.string_at("$.source_id"),
+            "query-cross-az-traffic-by-app",
+        )
+        detect_source_anomalies_chain = create_detect_anomalies_chain(
+            self,
+            "Detect-Source-Anomalies",
+            fleet_athena_analyzer,
+            anomaly_detector,
+            stepfunctions.JsonPath.string_at("$.new_results_query_string"),
+            "$.Extractor.Payload",
+            stepfunctions.JsonPath.string_at("$.source_id"),
+        )
+        skip_state = stepfunctions.Succeed(self, "Skip-Source-Analysis")
+        source_extractor_failed_state = stepfunctions.Fail(
+            self,
+            "Source-Extractor-Failed",
+            error="SourceExtractorFailed",
+            cause_path="$.Extractor.Payload.body",
+        )
+
+        http_success_condition = stepfunctions.Condition.number_equals(
+            "$.Extractor.Payload.statusCode", 200
+        )
+        run_not_due_condition = stepfunctions.Condition.and_(
+            http_success_condition,
+            stepfunctions.Condition.boolean_equals(
+                "$.Extractor.Payload.run_due", False
+            ),
+        )
+        # The source's schedule state is committed once its query succeeded, by its own
+        # pod_metadata_extractor, see OrchestratorStepFunction
+        commit_schedule_state_state = stepfunctions.CustomState(
+            self,
+            "Commit-Source-Schedule-State",
+            state_json={
+                "Type": "Task",
+                "Resource": f"arn:{Aws.PARTITION}:states:::lambda:invoke",
+                "Parameters": {
+                    "FunctionName.$": "$.function_name",
+                    "Payload": {
+                        "commit_schedule_state": {
+                            "last_run.$": "$.Extractor.Payload.last_run"
+                        }
+                    },
+                },
+                "ResultSelector": {"Payload.$": "$.Payload"},
+                "ResultPath": "$.ScheduleState",
+                "Retry": [LAMBDA_INVOKE_RETRY],
+            },
+        )
+        schedule_state_commit_failed_state = stepfunctions.Fail(
+            self,
+            "Source-Schedule-State-Commit-Failed",
+            error="ScheduleStateCommitFailed",
+            cause_path="$.ScheduleState.Payload.body",
+        )
+
+        source_analysis_chain = invoke_pod_metadata_extractor_state.next(
+            stepfunctions.Choice(self, "Check-Source-Status-Code")
+            .when(run_not_due_condition, skip_state)
+            .when(
+                http_success_condition,
+                prepare_query_parameters_state.next(start_athena_query_state)
+                .next(commit_schedule_state_state)
+                .next(
+                    stepfunctions.Choice(self, "Check-Source-Schedule-State-Commit")
+                    .when(
+                        stepfunctions.Condition.number_equals(
+                            "$.ScheduleState.Payload.statusCode", 200
+                        ),
+                        publish_query_metrics_state.next(
+                            record_source_analysis_run_chain
+                        ).next(detect_source_anomalies_chain),
+                    )
+                    .otherwise(schedule_state_commit_failed_state)
+                ),
+            )
+            .otherwise(source_extractor_failed_state)
+        )
+
+        # Any failing state of a source's analysis fails the source only: it is caught
+        # once around the whole chain, so the other sources and the merge still run
+        analyze_source_state = stepfunctions.Parallel(
+            self, "Analyze-Source", result_path=stepfunctions.JsonPath.DISCARD
+        )
+        analyze_source_state.branch(source_analysis_chain)
+        analyze_source_state.add_catch(
+            publish_source_failure_state, result_path="$.Error"
+        )
+        publish_source_failure_state.add_catch(
+            stepfunctions.Succeed(self, "Source-Failure-Not-Published"),
+            result_path=stepfunctions.JsonPath.DISCARD,
+        )
+
+        analyze_sources_state = stepfunctions.Map(
+            self,
+            "Analyze-Sources",
+            items_path="$.Fleet.sources",
+            max_concurrency=max_concurrent_queries,
+            result_path=stepfunctions.JsonPath.DISCARD,
+        )
+        analyze_sources_state.item_processor(analyze_source_state)
+
+        return analyze_sources_state
+
+    def __create_merge_fleet_results_state(
+        self, fleet_athena_analyzer: FleetAthenaAnalyzer
+    ) -> stepfunctions_tasks.AthenaStartQueryExecution:
+        """
+        Creates a StepFunction task that merges the results of the run into the fleet-wide results
+        """
+        return self.__create_start_athena_query_state(
+            fleet_athena_analyzer,
+            "Merge-Fleet-Results",
+            fleet_athena_analyzer.fleet_sql_query_string,
+            "$.Fleet.execution_parameters",
+        )
+
+    def __create_start_athena_query_state(
+        self,
+        fleet_athena_analyzer: FleetAthenaAnalyzer,
+        id: str,
+        query_string: str,
+        execution_parameters_path: str,
+    ) -> stepfunctions_tasks.AthenaStartQueryExecution:
+        """
+        Creates a StepFunction task that runs an Athena Query and waits for it to complete,
+        keeping the query statistics
+        """
+        query_execution_context = stepfunctions_tasks.QueryExecutionContext(
+            database_name=fleet_athena_analyzer.glue_database.database_name
+        )
+
+        result_configuration = stepfunctions_tasks.ResultConfiguration(
+            output_location=s3.Location(
+                bucket_name=fleet_athena_analyzer.results_bucket.bucket_name,
+                object_key="query_results",
+            )
+        )
+
+        start_athena_query_state = stepfunctions_tasks.AthenaStartQueryExecution(
+            self,
+            id=id,
+            query_string=query_string,
+            execution_parameters=stepfunctions.JsonPath.list_at(
+                execution_parameters_path
+            ),
+            query_execution_context=query_execution_context,
+            result_configuration=result_configuration,
+            work_group=fleet_athena_analyzer.work_group_name,
+            integration_pattern=stepfunctions.IntegrationPattern.RUN_JOB,
+            result_selector={
+                "DataScannedInBytes": stepfunctions.JsonPath.number_at(
+                    "$.QueryExecution.Statistics.DataScannedInBytes"
+                ),
+                "EngineExecutionTimeInMillis": stepfunctions.JsonPath.number_at(
+                    "$.QueryExecution.Statistics.EngineExecutionTimeInMillis"
+                ),
+            },
+            result_path="$.QueryStatistics",
+        )
+
+        return start_athena_query_state
+
+    def __create_put_metric_data_state(
+        self, id: str, metrics_namespace: str, metric_data: list[dict[str, Any]]
+    ) -> stepfunctions_tasks.CallAwsService:
+        """
+        Creates a StepFunction task that publishes CloudWatch metrics of a source
+        """
+        return stepfunctions_tasks.CallAwsService(
+            self,
+            id=id,
+            service="cloudwatch",
+            action="putMetricData",
+            parameters={"Namespace": metrics_namespace, "MetricData": metric_data},
+            iam_resources=["*"],
+            iam_action="cloudwatch:PutMetricData",
+            result_path=stepfunctions.JsonPath.DISCARD,
+        )
+
+    def __get_fleet_execution_parameter(self, name: str) -> str:
+        """
+        The run ID is the StepFunction execution name, quoted as a SQL string literal,
+        the other execution parameters come from the source's pod_metadata_extractor output
+        """
+        if name in FLEET_QUERY_EXECUTION_PARAMETERS:
+            return stepfunctions.JsonPath.format(
+                "'{}'", stepfunctions.JsonPath.string_at("$$.Execution.Name")
+            )
+
+        return stepfunctions.JsonPath.string_at(f"$.Extractor.Payload.{name}")
@@ -0,0 +1,57 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Ranks the Services by the cross-AZ bytes zone-local routing would save:
+
+    python -m placement_recommender --traffic-matrix matrix.csv --pods pods.csv
+
+matrix.csv is the output of the query-traffic-matrix-by-app-and-az Athena named query,
+pods.csv a pods snapshot of the pod_metadata_extractor Lambda Function (pods_metadata/ prefix)
+taken in the query's window.
+"""
+import argparse
+
+from .recommendations import read_pods
+from .recommendations import read_traffic_matrix
+from .recommendations import recommend_placements
+from .recommendations import write_recommendations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m placement_recommender")
+    parser.add_argument("--traffic-matrix", required=True)
+    parser.add_argument("--pods", required=True)
+    parser.add_argument("--output", help="Writes the recommendations table as CSV")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    recommendations = recommend_placements(
+        read_traffic_matrix(args.traffic_matrix), read_pods(args.pods)
+    )
+
+    for row in recommendations.slice(0, args.top).to_pylist():
+        print(
+            f"{row['rank']}. {row['service']}: {row['action']} "
+            f"saves {row['expected_saved_bytes']} of {row['cross_az_bytes']} cross-AZ bytes "
+            f"(replicas {row['replicas_by_zone']} -> {row['recommended_replicas_by_zone']})"
+        )
+
+    if args.output:
+        write_recommendations(recommendations, args.output)
+
+
+if __name__ == "__main__":
+    main()
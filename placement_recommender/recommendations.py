@@ -0,0 +1,256 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Ranks the Services (destination apps) by the cross-AZ bytes zone-local routing would save,
+from the app pair / AZ pair traffic matrix (query-traffic-matrix-by-app-and-az) and the
+per-AZ replica counts of the pods snapshot (pod_metadata_extractor output). All Services
+are evaluated at once on (Services x AZs) matrices.
+"""
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as csv
+
+TRAFFIC_MATRIX_COLUMNS = ("src_app", "dst_app", "src_az_id", "dst_az_id", "bytes")
+PODS_COLUMNS = ("app", "az_id")
+
+# Topology-aware routing is disabled by Kubernetes when an AZ would get more than
+# (1 + overload threshold) times its share of the endpoints, here measured on the traffic
+ZONE_OVERLOAD_THRESHOLD = 0.2
+
+ACTION_TOPOLOGY_AWARE_ROUTING = "topology-aware-routing"
+ACTION_ZONE_BALANCED_REPLICAS = "zone-balanced-replicas"
+ACTION_NONE = "none"
+
+RECOMMENDATIONS_SCHEMA = pa.schema(
+    [
+        ("rank", pa.int64()),
+        ("service", pa.string()),
+        ("action", pa.string()),
+        ("cross_az_bytes", pa.int64()),
+        ("expected_cross_az_bytes", pa.int64()),
+        ("expected_saved_bytes", pa.int64()),
+        ("max_zone_load_ratio", pa.float64()),
+        ("client_bytes_by_zone", pa.string()),
+        ("replicas_by_zone", pa.string()),
+        ("recommended_replicas_by_zone", pa.string()),
+    ]
+)
+
+
+def read_traffic_matrix(file_path: str) -> pa.Table:
+    """
+    Reads the CSV output of query-traffic-matrix-by-app-and-az
+    """
+    return csv.read_csv(
+        file_path,
+        convert_options=csv.ConvertOptions(
+            include_columns=list(TRAFFIC_MATRIX_COLUMNS),
+            column_types={"bytes": pa.int64()},
+            strings_can_be_null=False,
+        ),
+    )
+
+
+def read_pods(file_path: str) -> pa.Table:
+    """
+    Reads a pods snapshot CSV file of the pod_metadata_extractor Lambda Function
+    """
+    return csv.read_csv(
+        file_path,
+        convert_options=csv.ConvertOptions(
+            include_columns=list(PODS_COLUMNS),
+            column_types={name: pa.string() for name in PODS_COLUMNS},
+        ),
+    )
+
+
+def get_indices(values: pa.ChunkedArray, categories: np.ndarray) -> np.ndarray:
+    """
+    Returns the indices of the values in the sorted categories, -1 for the others
+    """
+    values = np.asarray(values.to_numpy(zero_copy_only=False), dtype=object)
+    if not len(categories):
+        return np.full(len(values), -1)
+
+    indices = np.searchsorted(categories, values)
+    indices[indices == len(categories)] = 0
+    return np.where(categories[indices] == values, indices, -1)
+
+
+def get_zone_matrix(
+    rows: np.ndarray, zones: np.ndarray, weights: np.ndarray, shape: tuple[int, int]
+) -> np.ndarray:
+    """
+    Sums the weights into a (rows x zones) matrix
+    """
+    return np.bincount(
+        rows * shape[1] + zones, weights=weights, minlength=shape[0] * shape[1]
+    ).reshape(shape)
+
+
+def get_expected_cross_az_bytes(
+    client_bytes: np.ndarray, replicas: np.ndarray
+) -> np.ndarray:
+    """
+    Returns the cross-AZ bytes of each Service under zone-local routing: only the clients
+    of the AZs without a replica still send their traffic to another AZ
+    """
+    cross_az_bytes: np.ndarray = np.where(replicas > 0, 0, client_bytes).sum(axis=1)
+    return cross_az_bytes
+
+
+def get_max_zone_load_ratio(
+    client_bytes: np.ndarray, replicas: np.ndarray
+) -> np.ndarray:
+    """
+    Returns, for each Service, the highest ratio of an AZ's share of the traffic to its
+    share of the replicas: the load of its replicas under zone-local routing, relative
+    to the average. Infinite when an AZ has clients but no replica.
+    """
+    traffic_share = client_bytes / np.maximum(
+        client_bytes.sum(axis=1, keepdims=True), 1
+    )
+    replicas_share = replicas / np.maximum(replicas.sum(axis=1, keepdims=True), 1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(traffic_share > 0, traffic_share / replicas_share, 0)
+    max_ratio: np.ndarray = ratio.max(axis=1, initial=0)
+    return max_ratio
+
+
+def get_zone_balanced_replicas(
+    client_bytes: np.ndarray, replicas: np.ndarray
+) -> np.ndarray:
+    """
+    Returns the replicas of each Service spread over the AZs in proportion to their traffic
+    (largest remainder method): one replica in each AZ with clients, the others by share.
+    Services get more replicas only when they have fewer than AZs with clients.
+    """
+    client_zones = client_bytes > 0
+    total = np.maximum(replicas.sum(axis=1), client_zones.sum(axis=1))
+    spare = total - client_zones.sum(axis=1)
+
+    traffic_share = client_bytes / np.maximum(
+        client_bytes.sum(axis=1, keepdims=True), 1
+    )
+    quota = np.maximum(total[:, None] * traffic_share - client_zones, 0)
+    quota = quota * (spare / np.maximum(quota.sum(axis=1), 1e-12))[:, None]
+    balanced = np.floor(quota).astype(np.int64)
+
+    # The replicas left over go to the AZs with the largest remainders
+    order = np.argsort(balanced - quota, axis=1, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(order.shape[1])[None, :], axis=1)
+    balanced += ranks < (spare - balanced.sum(axis=1))[:, None]
+
+    placement: np.ndarray = balanced + client_zones
+    return placement
+
+
+def format_by_zone(matrix: np.ndarray, zones: np.ndarray) -> list[str]:
+    return [
+        ",".join(f"{zone}:{int(value)}" for zone, value in zip(zones, row) if value > 0)
+        for row in matrix
+    ]
+
+
+def recommend_placements(traffic_matrix: pa.Table, pods: pa.Table) -> pa.Table:
+    """
+    Returns the recommendations table of the Services with replicas in the pods snapshot,
+    ranked by expected saved cross-AZ bytes. Topology-aware routing is recommended when
+    the current replicas can serve their AZ's clients, zone-balanced replicas (then
+    routing) otherwise.
+    """
+    services = np.unique(traffic_matrix["dst_app"].to_numpy(zero_copy_only=False))
+    zones = np.unique(
+        np.concatenate(
+            [
+                traffic_matrix[column].to_numpy(zero_copy_only=False)
+                for column in ("src_az_id", "dst_az_id")
+            ]
+            + [pods["az_id"].to_numpy(zero_copy_only=False)]
+        )
+    )
+    shape = (len(services), len(zones))
+
+    service_indices = get_indices(traffic_matrix["dst_app"], services)
+    src_zone_indices = get_indices(traffic_matrix["src_az_id"], zones)
+    dst_zone_indices = get_indices(traffic_matrix["dst_az_id"], zones)
+    traffic_bytes = traffic_matrix["bytes"].to_numpy().astype(np.float64)
+
+    client_bytes = get_zone_matrix(
+        service_indices, src_zone_indices, traffic_bytes, shape
+    )
+    cross_az_bytes = np.bincount(
+        service_indices,
+        weights=traffic_bytes * (src_zone_indices != dst_zone_indices),
+        minlength=len(services),
+    )
+
+    pod_service_indices = get_indices(pods["app"], services)
+    pod_zone_indices = get_indices(pods["az_id"], zones)
+    known = pod_service_indices >= 0
+    replicas = get_zone_matrix(
+        pod_service_indices[known],
+        pod_zone_indices[known],
+        np.ones(known.sum()),
+        shape,
+    ).astype(np.int64)
+
+    max_zone_load_ratio = get_max_zone_load_ratio(client_bytes, replicas)
+    balanced_replicas = get_zone_balanced_replicas(client_bytes, replicas)
+    routable = max_zone_load_ratio <= 1 + ZONE_OVERLOAD_THRESHOLD
+
+    expected_cross_az_bytes = np.where(
+        routable,
+        get_expected_cross_az_bytes(client_bytes, replicas),
+        get_expected_cross_az_bytes(client_bytes, balanced_replicas),
+    )
+    expected_cross_az_bytes = np.minimum(expected_cross_az_bytes, cross_az_bytes)
+    expected_saved_bytes = cross_az_bytes - expected_cross_az_bytes
+    actions = np.where(
+        expected_saved_bytes > 0,
+        np.where(
+            routable, ACTION_TOPOLOGY_AWARE_ROUTING, ACTION_ZONE_BALANCED_REPLICAS
+        ),
+        ACTION_NONE,
+    )
+    recommended_replicas = np.where(routable[:, None], replicas, balanced_replicas)
+
+    selected = np.flatnonzero(replicas.sum(axis=1) > 0)
+    selected = selected[
+        np.lexsort((services[selected], -expected_saved_bytes[selected]))
+    ]
+
+    return pa.table(
+        [
+            pa.array(np.arange(1, len(selected) + 1)),
+            pa.array(services[selected], pa.string()),
+            pa.array(actions[selected], pa.string()),
+            pa.array(cross_az_bytes[selected].round().astype(np.int64)),
+            pa.array(expected_cross_az_bytes[selected].round().astype(np.int64)),
+            pa.array(expected_saved_bytes[selected].round().astype(np.int64)),
+            pa.array(max_zone_load_ratio[selected]),
+            pa.array(format_by_zone(client_bytes[selected], zones)),
+            pa.array(format_by_zone(replicas[selected], zones)),
+            pa.array(format_by_zone(recommended_replicas[selected], zones)),
+        ],
+        schema=RECOMMENDATIONS_SCHEMA,
+    )
+
+
+def write_recommendations(recommendations: pa.Table, file_path: str) -> None:
+    csv.write_csv(recommendations, file_path)
@@ -27,6 +27,18 @@ from aws_cdk import lambda_layer_awscli
 from constructs import Construct
 
 APP_LABEL = "app"
+# Labels of the pods without APP_LABEL, in order, before falling back to their workload name
+APP_LABEL_FALLBACKS = ["app.kubernetes.io/name", "k8s-app"]
+
+PODS_METADATA_PREFIX = "pods/"
+NETWORK_INTERFACES_PREFIX = "network-interfaces/"
+
+# Warm invocations only re-parse the cached nodes whose resourceVersion changed in a
+# NotOlderThan list, all nodes are parsed again after this TTL
+NODES_CACHE_TTL = Duration.hours(1)
+# The load balancer ENIs are listed again after this TTL, see refresh_network_interfaces_index
+NETWORK_INTERFACES_INDEX_TTL = Duration.hours(1)
+
 
 class PodMetaDataExtractor(Construct):
     def __init__(
@@ -34,7 +46,11 @@ class PodMetaDataExtractor(Construct):
         scope: Construct,
         id: str,
         eks_cluster: eks.Cluster,
+        vpc_id: str,
         server_access_logs_bucket: s3.Bucket,
+        schedule_min_interval: Duration,
+        schedule_max_interval: Duration,
+        metrics_namespace: str,
         **kwargs: Any
     ) -> None:
         super().__init__(scope, id, **kwargs)
@@ -42,9 +58,14 @@ class PodMetaDataExtractor(Construct):
         self.bucket = self.__create_pod_state_bucket(server_access_logs_bucket)
 
         self.lambda_k8s_client = self.__create_pod_metadata_extractor_lambda_function(
-            eks_cluster, self.bucket
+            eks_cluster,
+            vpc_id,
+            self.bucket,
+            schedule_min_interval,
+            schedule_max_interval,
+            metrics_namespace,
         )
-        self.bucket.grant_write(self.lambda_k8s_client)
+        self.bucket.grant_read_write(self.lambda_k8s_client)
 
         self.eks_client_role = self.__create_k8s_client_iam_role(
             eks_cluster, self.lambda_k8s_client.role
@@ -75,11 +96,22 @@ class PodMetaDataExtractor(Construct):
         return bucket
 
     def __create_pod_metadata_extractor_lambda_function(
-        self, eks_cluster: eks.Cluster, bucket: s3.Bucket
+        self,
+        eks_cluster: eks.Cluster,
+        vpc_id: str,
+        bucket: s3.Bucket,
+        schedule_min_interval: Duration,
+        schedule_max_interval: Duration,
+        metrics_namespace: str,
     ) -> lambda_.Function:
         """
         Creates a Lambda Function that acts as a K8S Client.
         This Lambda Function will get all the pods' states and store them in an S3 Bucket.
+        It also picks the next analysis run interval, within the schedule bounds, based on pod churn.
+        Per-phase metrics are published in CloudWatch embedded metric format.
+        The load balancer ENIs of the VPC are indexed to resolve load balancer hops.
+        Nodes are cached across warm invocations and refreshed from a NotOlderThan list,
+        re-parsing only the nodes whose resourceVersion changed.
         """
 
         python_lambda_layers = self.__create_dependencies_lambda_layer()
@@ -98,9 +130,24 @@ class PodMetaDataExtractor(Construct):
             environment={
                 "REGION": Stack.of(self).region,
                 "CLUSTER_NAME": eks_cluster.cluster_name,
+                "VPC_ID": vpc_id,
                 "APP_LABEL": APP_LABEL,
+                "APP_LABEL_FALLBACKS": ",".join(APP_LABEL_FALLBACKS),
                 "OUTPUT_BUCKET_NAME": bucket.bucket_name,
+                "PODS_METADATA_PREFIX": PODS_METADATA_PREFIX,
+                "NETWORK_INTERFACES_PREFIX": NETWORK_INTERFACES_PREFIX,
                 "CURRENT_ACCOUNT_ID": Stack.of(self).account,
+                "SCHEDULE_MIN_INTERVAL_SECONDS": str(
+                    int(schedule_min_interval.to_seconds())
+                ),
+                "SCHEDULE_MAX_INTERVAL_SECONDS": str(
+                    int(schedule_max_interval.to_seconds())
+                ),
+                "METRICS_NAMESPACE": metrics_namespace,
+                "NODES_CACHE_TTL_SECONDS": str(int(NODES_CACHE_TTL.to_seconds())),
+                "NETWORK_INTERFACES_INDEX_TTL_SECONDS": str(
+                    int(NETWORK_INTERFACES_INDEX_TTL.to_seconds())
+                ),
             },
             layers=python_lambda_layers,
             tracing=lambda_.Tracing.ACTIVE,
@@ -175,6 +222,18 @@ class PodMetaDataExtractor(Construct):
             )
         )
 
+        # Allow lambda to map Availability Zone names to AZ IDs and to index the load balancer ENIs
+        lambda_function.add_to_role_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "ec2:DescribeAvailabilityZones",
+                    "ec2:DescribeNetworkInterfaces",
+                ],
+                effect=iam.Effect.ALLOW,
+                resources=["*"],
+            )
+        )
+
         # Allow lambda to describe the EKS cluster
         lambda_function.add_to_role_policy(
             iam.PolicyStatement(
@@ -0,0 +1,116 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import ipaddress
+from typing import Iterable, Optional, Union
+
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# VPC CNI prefix delegation assigns /28 IPv4 prefixes and /80 IPv6 prefixes to nodes
+POD_CIDR_PREFIX_LENGTHS = {4: 28, 6: 80}
+
+# Networks kept per IP family, prefixes are widened until the description fits
+MAX_POD_CIDRS = 128
+
+# Matches no flow, used when there are no pods so the query filter stays valid
+EMPTY_POD_CIDRS = "255.255.255.255/32"
+
+# IPv4 addresses are encoded as IPv4-mapped IPv6 addresses (::ffff:a.b.c.d)
+IPV4_MAPPED_PREFIX = 0xFFFF << 32
+
+
+def summarize_pod_addresses(pod_ips: Iterable[str]) -> list[str]:
+    """
+    Returns a compact list of CIDRs covering all the pod IPs.
+    The list may also cover some non-pod addresses, it is meant as a prefilter only.
+    """
+    addresses = [ipaddress.ip_address(ip) for ip in pod_ips if ip]
+    pod_cidrs: list[str] = []
+
+    for version, prefix_length in POD_CIDR_PREFIX_LENGTHS.items():
+        networks = collapse_networks(
+            ipaddress.ip_network((address, prefix_length), strict=False)
+            for address in addresses
+            if address.version == version
+        )
+        while len(networks) > MAX_POD_CIDRS and prefix_length > 0:
+            prefix_length -= 1
+            networks = collapse_networks(
+                (
+                    network.supernet(new_prefix=prefix_length)
+                    if network.prefixlen > prefix_length
+                    else network
+                )
+                for network in networks
+            )
+        pod_cidrs.extend(str(network) for network in networks)
+
+    return pod_cidrs
+
+
+def collapse_networks(networks: Iterable[IPNetwork]) -> list[IPNetwork]:
+    """
+    Collapses the networks, separately per IP version as collapse_addresses requires
+    """
+    unique_networks = set(networks)
+    ipv4_networks = [
+        network
+        for network in unique_networks
+        if isinstance(network, ipaddress.IPv4Network)
+    ]
+    ipv6_networks = [
+        network
+        for network in unique_networks
+        if isinstance(network, ipaddress.IPv6Network)
+    ]
+
+    return [
+        *ipaddress.collapse_addresses(ipv4_networks),
+        *ipaddress.collapse_addresses(ipv6_networks),
+    ]
+
+
+def format_pod_cidrs_parameter(pod_cidrs: list[str]) -> str:
+    """
+    Formats the CIDRs as a comma separated SQL string literal, for an Athena execution parameter
+    """
+    return f"'{','.join(pod_cidrs) or EMPTY_POD_CIDRS}'"
+
+
+def encode_ip_address(ip: str) -> tuple[int, int]:
+    """
+    Encodes an address as the signed 64-bit high and low halves of its 128-bit IPv6 form,
+    the way Athena reads them from CAST(CAST(ip AS IPADDRESS) AS VARBINARY).
+    The analysis query joins the flows to the pods on these integer keys.
+    """
+    address = ipaddress.ip_address(ip)
+    if address.version == 4:
+        address = ipaddress.IPv6Address(IPV4_MAPPED_PREFIX | int(address))
+
+    return (
+        int.from_bytes(address.packed[:8], "big", signed=True),
+        int.from_bytes(address.packed[8:], "big", signed=True),
+    )
+
+
+def get_encoded_ip_address_columns(ip: Optional[str]) -> dict[str, str]:
+    """
+    Returns the ip_hi and ip_lo CSV columns of an address, empty (NULL) without address
+    """
+    if not ip:
+        return {"ip_hi": "", "ip_lo": ""}
+
+    ip_hi, ip_lo = encode_ip_address(ip)
+    return {"ip_hi": str(ip_hi), "ip_lo": str(ip_lo)}
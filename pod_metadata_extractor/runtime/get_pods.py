@@ -15,13 +15,36 @@
 
 import logging
 import os
-
-import boto3
-from botocore.client import Config
+import time
+from typing import Any, Iterable, Iterator
+
+from address_space import format_pod_cidrs_parameter
+from address_space import get_encoded_ip_address_columns
+from address_space import summarize_pod_addresses
+from metrics import BYTES
+from metrics import COUNT
+from metrics import MetricsLogger
+from network_interfaces import get_network_interfaces_rows
+from network_interfaces import load_network_interfaces_index
+from network_interfaces import new_network_interfaces_index
+from network_interfaces import refresh_network_interfaces_index
+from network_interfaces import save_network_interfaces_index
+from nodes import new_nodes_cache
+from nodes import refresh_nodes_cache
+from scheduling import PENDING_SCHEDULE_STATE_OBJECT_KEY
+from scheduling import commit_schedule_state
+from scheduling import compute_pod_churn
+from scheduling import get_query_window_start
+from scheduling import is_run_due
+from scheduling import is_scheduled_invocation
+from scheduling import load_schedule_state
+from scheduling import pick_next_interval
+from scheduling import save_schedule_state
 from utils import create_kube_config_file
-
-from kubernetes import client
-from kubernetes import config
+from workloads import get_app_label_value
+from workloads import get_workload_name
+from workloads import new_owners_cache
+from workloads import refresh_owners_cache
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -30,53 +53,230 @@ HTTP_OK = 200
 HTTP_INTERNAL_SERVER_ERROR = 500
 
 DEFAULT_APP_LABEL = "app"
+DEFAULT_APP_LABEL_FALLBACKS = "app.kubernetes.io/name,k8s-app"
 
 K8S_CLIENT_ROLE_ARN = os.getenv("K8S_CLIENT_ROLE_ARN")
 OUTPUT_BUCKET_NAME = os.getenv("OUTPUT_BUCKET_NAME")
 CURRENT_ACCOUNT_ID = os.getenv("CURRENT_ACCOUNT_ID")
 CLUSTER_NAME = os.getenv("CLUSTER_NAME")
+VPC_ID = os.getenv("VPC_ID")
+PODS_METADATA_PREFIX = os.getenv("PODS_METADATA_PREFIX", "")
+NETWORK_INTERFACES_PREFIX = os.getenv("NETWORK_INTERFACES_PREFIX", "")
 
-APP_LABEL = os.getenv("APP_LABEL", DEFAULT_APP_LABEL)
-AZ_LABEL = "topology.kubernetes.io/zone"
+SCHEDULE_MIN_INTERVAL_SECONDS = int(os.getenv("SCHEDULE_MIN_INTERVAL_SECONDS", "900"))
+SCHEDULE_MAX_INTERVAL_SECONDS = int(os.getenv("SCHEDULE_MAX_INTERVAL_SECONDS", "3600"))
+NODES_CACHE_TTL_SECONDS = int(os.getenv("NODES_CACHE_TTL_SECONDS", "3600"))
+NETWORK_INTERFACES_INDEX_TTL_SECONDS = int(
+    os.getenv("NETWORK_INTERFACES_INDEX_TTL_SECONDS", "3600")
+)
 
+APP_LABEL = os.getenv("APP_LABEL", DEFAULT_APP_LABEL)
+APP_LABEL_FALLBACKS = os.getenv("APP_LABEL_FALLBACKS", DEFAULT_APP_LABEL_FALLBACKS)
+# Pods without APP_LABEL are labeled by the first of these they have, else by their workload
+APP_LABELS = [APP_LABEL] + [label for label in APP_LABEL_FALLBACKS.split(",") if label]
 TIME_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
 
 KUBE_CONFIG_FILE_PATH = "/tmp/kubeconfig"
 
 PODS_METADATA_FILENAME = "pods_metadata.csv"
+NETWORK_INTERFACES_FILENAME = "network_interfaces.csv"
 
-s3_client = boto3.client("s3", config=Config(signature_version="s3v4"))
+PODS_METADATA_COLUMNS = [
+    "name",
+    "ip",
+    "app",
+    "creation_time",
+    "node",
+    "az",
+    "az_id",
+    "ip_hi",
+    "ip_lo",
+]
+NETWORK_INTERFACES_COLUMNS = [
+    "ip",
+    "interface_id",
+    "owner_type",
+    "owner_name",
+    "app",
+    "az_id",
+    "ip_hi",
+    "ip_lo",
+]
 
-# Create kubeconfig file on cold-start
-logging.info(f"Creating kubeconfig file")
-try:
-    create_kube_config_file(
-        config_file_path=KUBE_CONFIG_FILE_PATH,
-        cluster_name=CLUSTER_NAME,
-        k8s_client_role_arn=K8S_CLIENT_ROLE_ARN,
-    )
-except Exception as exception:
-    logging.error(f"There was a problem creating kubeconfig file: {exception}")
-    raise exception
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "EksInterAzVisibility")
+
+POD_LIST_PAGE_SIZE = 500
+
+# Invocations by the orchestrator once the run's analysis query succeeded, see commit_run
+COMMIT_SCHEDULE_STATE_EVENT_KEY = "commit_schedule_state"
+
+# Availability Zone name -> AZ ID, AZ IDs do not change so they are kept across warm invocations
+availability_zone_ids: dict[str, str] = {}
+
+# Node -> AZ and internal IP, kept across warm invocations and refreshed by node changes
+nodes_cache: dict[str, Any] = new_nodes_cache()
+
+# ReplicaSet / Job -> top-level controller, kept across warm invocations
+owners_cache: dict[str, Any] = new_owners_cache()
+
+# Clients are created on first use (and kept across warm invocations): boto3 and
+# the kubernetes package are heavy to import, and skipped runs only need S3
+s3_client = None
+ec2_client = None
+v1 = None
+apps_v1 = None
+batch_v1 = None
+
+
+def get_s3_client() -> Any:
+    global s3_client
+
+    if s3_client is None:
+        import boto3
+        from botocore.client import Config
+
+        s3_client = boto3.client("s3", config=Config(signature_version="s3v4"))
+    return s3_client
+
+
+def get_ec2_client() -> Any:
+    global ec2_client
+
+    if ec2_client is None:
+        import boto3
 
-# Configure the python kubernetes client with the created kubeconfig
-config.load_kube_config(config_file=KUBE_CONFIG_FILE_PATH)
-v1 = client.CoreV1Api()
+        ec2_client = boto3.client("ec2")
+    return ec2_client
 
 
-def lambda_handler(event, context):
+def get_core_v1_api() -> Any:
+    """
+    Creates the kubeconfig file and the kubernetes client on first use
+    """
+    global v1
+
+    if v1 is None:
+        from kubernetes.client import CoreV1Api
+        from kubernetes.config import load_kube_config
+
+        logging.info("Creating kubeconfig file")
+        try:
+            create_kube_config_file(
+                config_file_path=KUBE_CONFIG_FILE_PATH,
+                cluster_name=CLUSTER_NAME,
+                k8s_client_role_arn=K8S_CLIENT_ROLE_ARN,
+            )
+        except Exception as exception:
+            logging.error(f"There was a problem creating kubeconfig file: {exception}")
+            raise exception
+
+        # Configure the python kubernetes client with the created kubeconfig
+        load_kube_config(config_file=KUBE_CONFIG_FILE_PATH)
+        v1 = CoreV1Api()
+    return v1
+
+
+def get_apps_v1_api() -> Any:
+    global apps_v1
+
+    if apps_v1 is None:
+        # Loads the kubeconfig
+        get_core_v1_api()
+        from kubernetes.client import AppsV1Api
+
+        apps_v1 = AppsV1Api()
+    return apps_v1
+
+
+def get_batch_v1_api() -> Any:
+    global batch_v1
+
+    if batch_v1 is None:
+        get_core_v1_api()
+        from kubernetes.client import BatchV1Api
+
+        batch_v1 = BatchV1Api()
+    return batch_v1
+
+
+def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
     """
     Handler function that will be excecuted when Lambda Function is invoked
     """
+    if COMMIT_SCHEDULE_STATE_EVENT_KEY in event:
+        return commit_run(event)
+
+    metrics = MetricsLogger(METRICS_NAMESPACE, {"ClusterName": CLUSTER_NAME})
+
+    try:
+        return extract_pods_metadata(event, metrics)
+    finally:
+        metrics.flush()
+
+
+def commit_run(event: dict[str, Any]) -> dict[str, Any]:
+    """
+    Commits the schedule state of the run, once the orchestrator has run its analysis
+    query: the next run's window starts at the end of this one
+    """
+    last_run = int(event[COMMIT_SCHEDULE_STATE_EVENT_KEY]["last_run"])
+
+    try:
+        commit_schedule_state(
+            get_s3_client(), OUTPUT_BUCKET_NAME, CURRENT_ACCOUNT_ID, last_run
+        )
+    except Exception as exception:
+        error_message = (
+            f"There was a problem committing the schedule state: {exception}"
+        )
+        logging.error(error_message)
+        return {
+            "statusCode": HTTP_INTERNAL_SERVER_ERROR,
+            "body": error_message,
+        }
+
+    return {
+        "statusCode": HTTP_OK,
+        "body": f"Schedule state of the run at {last_run} committed",
+    }
+
+
+def extract_pods_metadata(
+    event: dict[str, Any], metrics: MetricsLogger
+) -> dict[str, Any]:
+    """
+    Extracts the pods' metadata to S3 and picks the next analysis run interval
+    """
+    now = int(time.time())
+
+    try:
+        schedule_state = load_schedule_state(
+            get_s3_client(), OUTPUT_BUCKET_NAME, CURRENT_ACCOUNT_ID
+        )
+    except Exception as exception:
+        logging.warning(f"There was a problem loading the schedule state: {exception}")
+        schedule_state = {}
+
+    if is_scheduled_invocation(event) and not is_run_due(schedule_state, now):
+        logging.info("Next analysis run is not due yet, skipping")
+        return {
+            "statusCode": HTTP_OK,
+            "body": "Next analysis run is not due yet",
+            "run_due": False,
+        }
 
     logging.info(f"Starts extracting pod metadata from cluster: {CLUSTER_NAME}")
 
     try:
-        logging.info(f"Getting EKS nodes metadata")
-        nodes_azs = get_nodes_availability_zones()
+        logging.info("Getting EKS nodes metadata")
+        with metrics.timer("NodeListLatency"):
+            nodes_azs, nodes_ips = get_nodes_metadata(now, metrics)
+        zones_ids = get_availability_zone_ids(nodes_azs.values())
 
-        logging.info(f"Getting EKS pods metadata")
-        pods_info = get_pods_info(nodes_azs)
+        logging.info("Getting EKS pods metadata")
+        with metrics.timer("PodListLatency"):
+            pods_info = get_pods_info(nodes_azs, zones_ids, metrics)
+        metrics.put_metric("PodsEmitted", len(pods_info), COUNT)
 
     except Exception as exception:
         error_message = f"There was a problem with the requests to the EKS cluster, please verify role mapping in ConfigMap/aws-auth: {exception}"
@@ -87,8 +287,9 @@ def lambda_handler(event, context):
         }
 
     try:
-        logging.info(f"Ceating local CSV file from pods' metadata")
-        file_path = create_pods_metadata_csv_file(pods_info)
+        logging.info("Ceating local CSV file from pods' metadata")
+        with metrics.timer("SerializationTime"):
+            file_path = create_pods_metadata_csv_file(pods_info)
 
     except Exception as exception:
         error_message = f"There was a problem ceating local CSV file from pods' metadata: {exception}"
@@ -100,89 +301,325 @@ def lambda_handler(event, context):
 
     try:
         logging.info(f"Uploading pods' metadata to S3 Bucket ({OUTPUT_BUCKET_NAME})")
-        upload_file_to_s3(file_path)
+        metrics.put_metric("UploadBytes", os.path.getsize(file_path), BYTES)
+        with metrics.timer("UploadTime"):
+            upload_file_to_s3(
+                file_path, f"{PODS_METADATA_PREFIX}{PODS_METADATA_FILENAME}"
+            )
+
+    except Exception as exception:
+        error_message = f"There was a problem uploading CSV file to S3: {exception}"
+        logging.error(error_message)
+        return {
+            "statusCode": HTTP_INTERNAL_SERVER_ERROR,
+            "body": error_message,
+        }
+
+    network_interfaces_rows = extract_network_interfaces(
+        nodes_azs, nodes_ips, now, metrics
+    )
+
+    pod_keys = get_pod_keys(pods_info)
+    previous_pod_keys = schedule_state.get("pod_keys", [])
+    pods_added, pods_removed = compute_pod_churn(previous_pod_keys, pod_keys)
+    next_interval = pick_next_interval(
+        pods_added,
+        pods_removed,
+        len(previous_pod_keys),
+        SCHEDULE_MIN_INTERVAL_SECONDS,
+        SCHEDULE_MAX_INTERVAL_SECONDS,
+    )
+    window_start = get_query_window_start(
+        schedule_state, now, SCHEDULE_MAX_INTERVAL_SECONDS
+    )
+    metrics.put_metric("PodsAdded", pods_added, COUNT)
+    metrics.put_metric("PodsRemoved", pods_removed, COUNT)
+    logging.info(
+        f"Pod churn since last run: {pods_added} added, {pods_removed} removed, next run in {next_interval} seconds"
+    )
+
+    # Load balancer and node IPs are kept by the prefilter, for the LB/NodePort hops
+    pod_cidrs = summarize_pod_addresses(
+        [info["ip"] for info in pods_info]
+        + [row["ip"] for row in network_interfaces_rows]
+    )
+    metrics.put_metric("PodCidrs", len(pod_cidrs), COUNT)
 
+    # Committed by the orchestrator once the analysis query succeeded, see commit_run
+    try:
+        save_schedule_state(
+            get_s3_client(),
+            OUTPUT_BUCKET_NAME,
+            CURRENT_ACCOUNT_ID,
+            {"last_run": now, "next_interval": next_interval, "pod_keys": pod_keys},
+            PENDING_SCHEDULE_STATE_OBJECT_KEY,
+        )
     except Exception as exception:
-        logging.error(f"There was a problem uploading CSV file to S3: {exception}")
+        error_message = f"There was a problem saving the schedule state: {exception}"
+        logging.error(error_message)
+        return {
+            "statusCode": HTTP_INTERNAL_SERVER_ERROR,
+            "body": error_message,
+        }
 
     return {
         "statusCode": HTTP_OK,
         "body": "Pods' metadata successfully uploaded to S3",
+        "run_due": True,
+        "last_run": now,
+        "window_start": str(window_start),
+        "pod_cidrs": format_pod_cidrs_parameter(pod_cidrs),
+        "pods_added": pods_added,
+        "pods_removed": pods_removed,
+        "next_interval": next_interval,
     }
 
 
-def get_nodes_availability_zones() -> dict[str, str]:
+def extract_network_interfaces(
+    nodes_azs: dict[str, str],
+    nodes_ips: dict[str, str],
+    now: int,
+    metrics: MetricsLogger,
+) -> list[dict[str, str]]:
     """
-    Requests EKS nodes metadata and returns the nodes' availability zones
+    Refreshes the cached load balancer ENI index by delta and uploads the network
+    interfaces table (load balancer ENIs and nodes IPs) to S3
     """
+    try:
+        index = load_network_interfaces_index(
+            get_s3_client(), OUTPUT_BUCKET_NAME, CURRENT_ACCOUNT_ID
+        )
+    except Exception as exception:
+        logging.warning(
+            f"There was a problem loading the network interfaces index: {exception}"
+        )
+        index = new_network_interfaces_index()
+
+    try:
+        with metrics.timer("NetworkInterfacesRefreshLatency"):
+            index = refresh_network_interfaces_index(
+                index,
+                get_ec2_client(),
+                get_core_v1_api(),
+                VPC_ID,
+                APP_LABEL,
+                now,
+                NETWORK_INTERFACES_INDEX_TTL_SECONDS,
+            )
+        save_network_interfaces_index(
+            get_s3_client(), OUTPUT_BUCKET_NAME, CURRENT_ACCOUNT_ID, index
+        )
+    except Exception as exception:
+        logging.error(
+            f"There was a problem refreshing the network interfaces index, using the cached one: {exception}"
+        )
+
+    try:
+        zones_ids = get_availability_zone_ids(
+            [entry["az"] for entry in index["interfaces"].values()]
+            + list(nodes_azs.values())
+        )
+    except Exception as exception:
+        logging.error(
+            f"There was a problem getting the availability zones IDs: {exception}"
+        )
+        zones_ids = availability_zone_ids
+    nodes_azs_ids = {
+        node: zones_ids.get(az, "<none>") for node, az in nodes_azs.items()
+    }
+    rows: list[dict[str, str]] = get_network_interfaces_rows(
+        index, nodes_ips, nodes_azs_ids, zones_ids
+    )
+
+    try:
+        file_path = create_csv_file(
+            NETWORK_INTERFACES_FILENAME, NETWORK_INTERFACES_COLUMNS, rows
+        )
+        upload_file_to_s3(
+            file_path, f"{NETWORK_INTERFACES_PREFIX}{NETWORK_INTERFACES_FILENAME}"
+        )
+    except Exception as exception:
+        logging.error(
+            f"There was a problem uploading the network interfaces to S3: {exception}"
+        )
+
+    return rows
+
+
+def get_nodes_metadata(
+    now: int, metrics: MetricsLogger
+) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Returns the EKS nodes' availability zones and internal IPs, from the nodes cache
+    kept across warm invocations
+    """
+    listed = refresh_nodes_cache(
+        nodes_cache, get_core_v1_api(), now, NODES_CACHE_TTL_SECONDS
+    )
+    metrics.put_metric("NodesListed", int(listed), COUNT)
+
     nodes_azs = {}
+    nodes_ips = {}
 
-    nodes = v1.list_node(watch=False)
+    for node_name, entry in nodes_cache["nodes"].items():
+        nodes_azs[node_name] = entry["az"]
+        if entry["az"] != "<none>" and entry["az_id"]:
+            availability_zone_ids[entry["az"]] = entry["az_id"]
+        if entry["ip"]:
+            nodes_ips[node_name] = entry["ip"]
+    return nodes_azs, nodes_ips
 
-    for node in nodes.items:
-        nodes_azs[node.metadata.name] = (
-            node.metadata.labels[AZ_LABEL]
-            if AZ_LABEL in node.metadata.labels
-            else "<none>"
+
+def get_availability_zone_ids(zones_names: Iterable[str]) -> dict[str, str]:
+    """
+    Returns the AZ IDs (e.g. use2-az1) by Availability Zone name.
+    VPC Flow Logs report AZ IDs, which are consistent across accounts unlike AZ names.
+    The IDs come from the nodes' zone-id labels, the region's Availability Zones are
+    described when one of `zones_names` is not known from them.
+    """
+    missing_zones_names = {
+        zone_name
+        for zone_name in zones_names
+        if zone_name != "<none>" and zone_name not in availability_zone_ids
+    }
+    if missing_zones_names:
+        zones = get_ec2_client().describe_availability_zones()["AvailabilityZones"]
+        for zone in zones:
+            availability_zone_ids[zone["ZoneName"]] = zone["ZoneId"]
+
+    return availability_zone_ids
+
+
+def list_pods(metrics: MetricsLogger) -> Iterator[Any]:
+    """
+    Lists the pods page by page, so large clusters are not fetched in a single response.
+    All pods are listed, those without APP_LABEL are labeled by fallbacks.
+    """
+    pages = 0
+    continue_token = None
+
+    while True:
+        pods = get_core_v1_api().list_pod_for_all_namespaces(
+            limit=POD_LIST_PAGE_SIZE,
+            _continue=continue_token,
+            watch=False,
         )
-    return nodes_azs
+        pages += 1
+        yield from pods.items
 
+        continue_token = pods.metadata._continue
+        if not continue_token:
+            break
 
-def get_pods_info(nodes_azs: dict[str, str]) -> dict[str, str]:
+    metrics.put_metric("PodListPages", pages, COUNT)
+
+
+def get_pods_info(
+    nodes_azs: dict[str, str], zones_ids: dict[str, str], metrics: MetricsLogger
+) -> list[dict[str, str]]:
     """
-    Requests pods metadata from EKS
+    Requests pods metadata from EKS. Pods are labeled by the first of APP_LABELS they
+    have, else by their top-level controller, resolved in one batch for all of them.
     """
-    pods_info = []
+    pods_info: list[dict[str, str]] = []
+    unlabeled_pods = []
 
-    pods = v1.list_pod_for_all_namespaces(label_selector=APP_LABEL, watch=False)
+    for pod in list_pods(metrics):
+        # Host network pods have their node's IP, nodes are endpoints of their own
+        if not pod.status.pod_ip or pod.spec.host_network:
+            continue
 
-    for pod in pods.items:
         conditions = pod.status.conditions
-        
+
         if not conditions:
             continue
-        
-        ready_condition = next(filter(lambda cond: getattr(cond, "type", None) == "Ready", conditions), None)
-        
+
+        ready_condition = next(
+            filter(lambda cond: getattr(cond, "type", None) == "Ready", conditions),
+            None,
+        )
+
         if not ready_condition:
             continue
-        
+
         pod_creation_time = ready_condition.last_transition_time.strftime(
             TIME_DATE_FORMAT
-        )                
+        )
+        pod_az = nodes_azs.get(pod.spec.node_name, "<none>")
         info = {
             "name": pod.metadata.name,
             "ip": pod.status.pod_ip,
-            "app": pod.metadata.labels.get(APP_LABEL, "<none>"),
+            "app": get_app_label_value(pod.metadata.labels or {}, APP_LABELS),
             "creation_time": pod_creation_time,
             "node": pod.spec.node_name,
-            "az": nodes_azs.get(pod.spec.node_name, "<none>"),
+            "az": pod_az,
+            "az_id": zones_ids.get(pod_az, "<none>"),
+            **get_encoded_ip_address_columns(pod.status.pod_ip),
         }
-        pods_info.append(info)                
+        pods_info.append(info)
+        if info["app"] is None:
+            unlabeled_pods.append((info, pod))
+
+    if unlabeled_pods:
+        try:
+            with metrics.timer("OwnerResolutionLatency"):
+                kinds_listed = refresh_owners_cache(
+                    owners_cache,
+                    [pod for _, pod in unlabeled_pods],
+                    get_apps_v1_api(),
+                    get_batch_v1_api(),
+                    POD_LIST_PAGE_SIZE,
+                )
+            metrics.put_metric("OwnerKindsListed", kinds_listed, COUNT)
+        except Exception as exception:
+            # The pods are then labeled by their direct owner (ReplicaSet or Job)
+            logging.warning(
+                f"There was a problem resolving the pods' workloads: {exception}"
+            )
+
+    for info, pod in unlabeled_pods:
+        info["app"] = get_workload_name(pod.metadata, owners_cache) or "<none>"
+    metrics.put_metric("PodsLabeledByWorkload", len(unlabeled_pods), COUNT)
 
     return pods_info
 
 
-def create_pods_metadata_csv_file(pods_info: dict[str, str]) -> str:
+def create_pods_metadata_csv_file(pods_info: list[dict[str, str]]) -> str:
     """
     Creates a local /tmp/pods_metadata.csv file before uploading the pods metadata to S3
     """
-    file_path = f"/tmp/{PODS_METADATA_FILENAME}"
+    return create_csv_file(PODS_METADATA_FILENAME, PODS_METADATA_COLUMNS, pods_info)
 
-    pod_header_row = ",".join(["name", "ip", "app", "creation_time", "node", "az"])
-    pod_data_rows = [",".join(info.values()) for info in pods_info]
+
+def create_csv_file(
+    filename: str, columns: list[str], rows: list[dict[str, str]]
+) -> str:
+    """
+    Creates a local /tmp CSV file, with a header row, before uploading it to S3
+    """
+    file_path = f"/tmp/{filename}"
+
+    header_row = ",".join(columns)
+    data_rows = [",".join(row[column] for column in columns) for row in rows]
 
     with open(file_path, "w") as f:
-        f.write(f"{pod_header_row}\n")
-        f.write("\n".join(pod_data_rows))
+        f.write(f"{header_row}\n")
+        f.write("\n".join(data_rows))
 
     return file_path
 
 
-def upload_file_to_s3(file_path: str) -> None:
-    s3_client.upload_file(
+def get_pod_keys(pods_info: list[dict[str, str]]) -> list[str]:
+    """
+    Returns sorted keys identifying the pods of a snapshot, used to compute pod churn
+    """
+    return sorted(f"{info['name']}/{info['ip']}" for info in pods_info)
+
+
+def upload_file_to_s3(file_path: str, object_key: str) -> None:
+    get_s3_client().upload_file(
         file_path,
         OUTPUT_BUCKET_NAME,
-        PODS_METADATA_FILENAME,
+        object_key,
         ExtraArgs={"ExpectedBucketOwner": CURRENT_ACCOUNT_ID},
     )
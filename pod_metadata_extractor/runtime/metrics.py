@@ -0,0 +1,81 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+MILLISECONDS = "Milliseconds"
+BYTES = "Bytes"
+COUNT = "Count"
+
+
+class MetricsLogger:
+    """
+    Collects metrics during an invocation and flushes them as a single
+    CloudWatch Embedded Metric Format (EMF) record.
+    The record is printed to stdout by default, which Lambda ships to CloudWatch Logs
+    where the metrics are extracted. Any other callable taking the record can be used as sink.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        dimensions: dict[str, str],
+        sink: Callable[[str], None] = print,
+    ) -> None:
+        self.namespace = namespace
+        self.dimensions = dimensions
+        self.sink = sink
+        self.metrics: dict[str, tuple[float, str]] = {}
+
+    def put_metric(self, name: str, value: float, unit: str = COUNT) -> None:
+        self.metrics[name] = (value, unit)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """
+        Records the duration of the wrapped block as a metric (in milliseconds)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.put_metric(name, (time.perf_counter() - start) * 1000, MILLISECONDS)
+
+    def flush(self) -> None:
+        if not self.metrics:
+            return
+
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [list(self.dimensions.keys())],
+                        "Metrics": [
+                            {"Name": name, "Unit": unit}
+                            for name, (_, unit) in self.metrics.items()
+                        ],
+                    }
+                ],
+            },
+            **self.dimensions,
+            **{name: value for name, (value, _) in self.metrics.items()},
+        }
+        self.sink(json.dumps(record))
+        self.metrics = {}
@@ -0,0 +1,255 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import logging
+from typing import Any
+
+from address_space import get_encoded_ip_address_columns
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+NETWORK_INTERFACES_INDEX_OBJECT_KEY = "state/network_interfaces_index.json"
+
+LOAD_BALANCER_OWNER_TYPE = "load-balancer"
+NODE_OWNER_TYPE = "node"
+
+NODE_INTERNAL_IP_ADDRESS_TYPE = "InternalIP"
+
+# Hostnames of internal load balancers start with it, load balancer names cannot
+INTERNAL_LOAD_BALANCER_HOSTNAME_PREFIX = "internal-"
+
+# Elastic Load Balancing ENIs are described as "ELB net/<name>/<id>",
+# "ELB app/<name>/<id>" or "ELB <name>" for Classic Load Balancers
+LOAD_BALANCER_INTERFACE_DESCRIPTION_PREFIX = "ELB "
+
+
+def new_network_interfaces_index() -> dict[str, Any]:
+    """
+    Returns an empty ENI index: the IPs, AZ and owning Service by load balancer ENI ID,
+    and the time of the ENIs list it is up to date with
+    """
+    return {"interfaces": {}, "listed_at": None}
+
+
+def load_network_interfaces_index(
+    s3_client: Any, bucket_name: str, account_id: str
+) -> dict[str, Any]:
+    """
+    Loads the ENI index built by the previous runs, returns an empty index on the first run
+    """
+    try:
+        response = s3_client.get_object(
+            Bucket=bucket_name,
+            Key=NETWORK_INTERFACES_INDEX_OBJECT_KEY,
+            ExpectedBucketOwner=account_id,
+        )
+    except s3_client.exceptions.NoSuchKey:
+        logging.info("No previous network interfaces index found, building it")
+        return new_network_interfaces_index()
+
+    index: dict[str, Any] = json.loads(response["Body"].read())
+    if "interfaces" not in index:
+        logging.info("Previous network interfaces index format found, rebuilding it")
+        return new_network_interfaces_index()
+
+    return index
+
+
+def save_network_interfaces_index(
+    s3_client: Any, bucket_name: str, account_id: str, index: dict[str, Any]
+) -> None:
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=NETWORK_INTERFACES_INDEX_OBJECT_KEY,
+        Body=json.dumps(index).encode("utf-8"),
+        ExpectedBucketOwner=account_id,
+    )
+
+
+def refresh_network_interfaces_index(
+    index: dict[str, Any],
+    ec2_client: Any,
+    core_v1_api: Any,
+    vpc_id: str,
+    app_label: str,
+    now: int,
+    ttl: int,
+) -> dict[str, Any]:
+    """
+    Updates the ENI index by delta. Within the TTL, the index is used as is: load
+    balancer ENIs change as rarely as the LoadBalancer Services. Past the TTL, the ENIs
+    are listed again: ENIs that are gone are dropped, only new ENIs are resolved against
+    the Kubernetes Services. ENIs of load balancers that no Service owns are resolved
+    again at most once per TTL.
+    """
+    if index["listed_at"] is not None and now - index["listed_at"] < ttl:
+        logging.info("Network interfaces index is up to date")
+        return index
+
+    interfaces = list_load_balancer_interfaces(ec2_client, vpc_id)
+
+    refreshed_interfaces = {
+        interface_id: entry
+        for interface_id, entry in index["interfaces"].items()
+        if interface_id in interfaces
+    }
+    unresolved_interfaces = {
+        interface_id: interface
+        for interface_id, interface in interfaces.items()
+        if interface_id not in refreshed_interfaces
+        or (
+            refreshed_interfaces[interface_id]["app"] is None
+            and now - refreshed_interfaces[interface_id]["resolved_at"] >= ttl
+        )
+    }
+    logging.info(
+        f"Network interfaces index: {len(interfaces)} load balancer ENIs, "
+        f"{len(index['interfaces']) - len(refreshed_interfaces)} removed, "
+        f"{len(unresolved_interfaces)} to resolve"
+    )
+
+    # Services are listed only when there is something to resolve
+    load_balancers_apps = (
+        get_load_balancers_apps(core_v1_api, app_label) if unresolved_interfaces else {}
+    )
+
+    for interface_id, interface in unresolved_interfaces.items():
+        load_balancer_name = get_load_balancer_name(interface["Description"])
+        refreshed_interfaces[interface_id] = {
+            "ips": [
+                address["PrivateIpAddress"]
+                for address in interface["PrivateIpAddresses"]
+            ],
+            "owner_name": load_balancer_name,
+            "app": load_balancers_apps.get(load_balancer_name),
+            "az": interface["AvailabilityZone"],
+            "resolved_at": now,
+        }
+
+    return {"interfaces": refreshed_interfaces, "listed_at": now}
+
+
+def list_load_balancer_interfaces(
+    ec2_client: Any, vpc_id: str
+) -> dict[str, dict[str, Any]]:
+    """
+    Lists the Elastic Load Balancing ENIs in the VPC, by ENI ID
+    """
+    paginator = ec2_client.get_paginator("describe_network_interfaces")
+    pages = paginator.paginate(
+        Filters=[
+            {"Name": "vpc-id", "Values": [vpc_id]},
+            {
+                "Name": "description",
+                "Values": [f"{LOAD_BALANCER_INTERFACE_DESCRIPTION_PREFIX}*"],
+            },
+        ]
+    )
+
+    return {
+        interface["NetworkInterfaceId"]: interface
+        for page in pages
+        for interface in page["NetworkInterfaces"]
+    }
+
+
+def get_load_balancer_name(interface_description: str) -> str:
+    """
+    Returns the load balancer name from an Elastic Load Balancing ENI description
+    """
+    load_balancer = interface_description[
+        len(LOAD_BALANCER_INTERFACE_DESCRIPTION_PREFIX) :
+    ]
+    parts = load_balancer.split("/")
+
+    return parts[1] if len(parts) == 3 else load_balancer
+
+
+def get_load_balancers_apps(core_v1_api: Any, app_label: str) -> dict[str, str]:
+    """
+    Returns the app of the LoadBalancer Services, by load balancer name.
+    The load balancer name is the first label of the Service's ingress hostname
+    (e.g. <name>-<hash>.elb.<region>.amazonaws.com), without its trailing hash nor the
+    leading "internal-" of internal load balancers.
+    """
+    load_balancers_apps = {}
+
+    services = core_v1_api.list_service_for_all_namespaces(watch=False)
+
+    for service in services.items:
+        ingresses = (
+            service.status.load_balancer.ingress
+            if service.status.load_balancer
+            else None
+        )
+        app = (service.spec.selector or {}).get(app_label, service.metadata.name)
+
+        for ingress in ingresses or []:
+            if not ingress.hostname:
+                continue
+            load_balancer_name = ingress.hostname.split(".")[0].rsplit("-", 1)[0]
+            if load_balancer_name.startswith(INTERNAL_LOAD_BALANCER_HOSTNAME_PREFIX):
+                load_balancer_name = load_balancer_name[
+                    len(INTERNAL_LOAD_BALANCER_HOSTNAME_PREFIX) :
+                ]
+            load_balancers_apps[load_balancer_name] = app
+
+    return load_balancers_apps
+
+
+def get_network_interfaces_rows(
+    index: dict[str, Any],
+    nodes_ips: dict[str, str],
+    nodes_azs_ids: dict[str, str],
+    zones_ids: dict[str, str],
+) -> list[dict[str, str]]:
+    """
+    Returns the rows of the network interfaces table: one row per load balancer
+    ENI IP and per node IP (NodePort hops), with the app and AZ ID they stand for.
+    A flow through a hop is attributed as two legs, to and from the hop.
+    """
+    rows = []
+
+    for interface_id, entry in index["interfaces"].items():
+        app = entry["app"] or entry["owner_name"]
+        for ip in entry["ips"]:
+            rows.append(
+                {
+                    "ip": ip,
+                    "interface_id": interface_id,
+                    "owner_type": LOAD_BALANCER_OWNER_TYPE,
+                    "owner_name": entry["owner_name"],
+                    "app": f"{app} ({LOAD_BALANCER_OWNER_TYPE})",
+                    "az_id": zones_ids.get(entry["az"], "<none>"),
+                    **get_encoded_ip_address_columns(ip),
+                }
+            )
+
+    for node_name, ip in nodes_ips.items():
+        rows.append(
+            {
+                "ip": ip,
+                "interface_id": "<none>",
+                "owner_type": NODE_OWNER_TYPE,
+                "owner_name": node_name,
+                "app": NODE_OWNER_TYPE,
+                "az_id": nodes_azs_ids.get(node_name, "<none>"),
+                **get_encoded_ip_address_columns(ip),
+            }
+        )
+
+    return rows
@@ -0,0 +1,137 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import logging
+from typing import Any, Optional
+
+from network_interfaces import NODE_INTERNAL_IP_ADDRESS_TYPE
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+AZ_LABEL = "topology.kubernetes.io/zone"
+AZ_ID_LABEL = "topology.k8s.aws/zone-id"
+
+HTTP_GONE = 410
+
+
+def new_nodes_cache() -> dict[str, Any]:
+    """
+    Returns an empty nodes cache: the AZ, AZ ID, internal IP and resourceVersion by node
+    name, and the resourceVersion and time of the list they are up to date with
+    """
+    return {
+        "nodes": {},
+        "nodes_resource_versions": {},
+        "resource_version": None,
+        "listed_at": None,
+    }
+
+
+def refresh_nodes_cache(
+    cache: dict[str, Any], core_v1_api: Any, now: int, ttl: int
+) -> bool:
+    """
+    Brings the cache up to date and returns True when the nodes had to be listed from
+    scratch. Within the TTL, the nodes are listed from the API server cache, no older
+    than the cached resourceVersion: the call returns right away, and only the nodes
+    whose resourceVersion changed are parsed again (usually none, node topology rarely
+    changes). The nodes are listed from scratch when the TTL is over, or when the cached
+    resourceVersion is too old (410 Gone).
+    """
+    if cache["resource_version"] is None or now - cache["listed_at"] >= ttl:
+        list_nodes(cache, core_v1_api, now)
+        return True
+
+    try:
+        changes = apply_node_changes(cache, core_v1_api)
+    except Exception as exception:
+        if getattr(exception, "status", None) == HTTP_GONE:
+            logging.info("The cached nodes resourceVersion is too old, listing again")
+        else:
+            logging.warning(
+                f"There was a problem listing the node changes: {exception}"
+            )
+        list_nodes(cache, core_v1_api, now)
+        return True
+
+    logging.info(f"Nodes cache is up to date after {changes} node changes")
+    return False
+
+
+def list_nodes(cache: dict[str, Any], core_v1_api: Any, now: int) -> None:
+    nodes = core_v1_api.list_node(watch=False)
+
+    cache["nodes"] = {node.metadata.name: parse_node(node) for node in nodes.items}
+    cache["nodes_resource_versions"] = {
+        node.metadata.name: node.metadata.resource_version for node in nodes.items
+    }
+    cache["resource_version"] = nodes.metadata.resource_version
+    cache["listed_at"] = now
+
+
+def apply_node_changes(cache: dict[str, Any], core_v1_api: Any) -> int:
+    """
+    Applies the node changes since the cached resourceVersion, returns their number
+    """
+    # Served from the API server cache, no newer than the last known state needed
+    nodes = core_v1_api.list_node(
+        resource_version=cache["resource_version"],
+        resource_version_match="NotOlderThan",
+        watch=False,
+    )
+
+    changes = 0
+    nodes_resource_versions = {}
+
+    for node in nodes.items:
+        name = node.metadata.name
+        nodes_resource_versions[name] = node.metadata.resource_version
+        if cache["nodes_resource_versions"].get(name) != node.metadata.resource_version:
+            cache["nodes"][name] = parse_node(node)
+            changes += 1
+    for name in cache["nodes"].keys() - nodes_resource_versions.keys():
+        del cache["nodes"][name]
+        changes += 1
+
+    cache["nodes_resource_versions"] = nodes_resource_versions
+    cache["resource_version"] = nodes.metadata.resource_version
+
+    return changes
+
+
+def parse_node(node: Any) -> dict[str, Optional[str]]:
+    return get_node_entry(
+        node.metadata.labels or {},
+        [(address.type, address.address) for address in node.status.addresses or []],
+    )
+
+
+def get_node_entry(
+    labels: dict[str, str], addresses: list[tuple[str, str]]
+) -> dict[str, Optional[str]]:
+    return {
+        "az": labels.get(AZ_LABEL, "<none>"),
+        # Newer EKS nodes are labeled with their AZ ID, no need to ask EC2 for those
+        "az_id": labels.get(AZ_ID_LABEL),
+        "ip": next(
+            (
+                address
+                for address_type, address in addresses
+                if address_type == NODE_INTERNAL_IP_ADDRESS_TYPE
+            ),
+            None,
+        ),
+    }
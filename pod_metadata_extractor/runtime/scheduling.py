@@ -0,0 +1,150 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import json
+import logging
+from typing import Any
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SCHEDULE_STATE_OBJECT_KEY = "state/schedule_state.json"
+# The state of the run in progress, it replaces the schedule state once the run's
+# analysis query succeeded: a failed run leaves its window to the next one
+PENDING_SCHEDULE_STATE_OBJECT_KEY = "state/pending_schedule_state.json"
+
+# EventBridge scheduled rules may fire slightly early, tolerate some drift
+SCHEDULE_TOLERANCE_SECONDS = 60
+
+# Churn ratio (pods added + removed / previous pod count) at which the
+# shortest interval is picked
+CHURN_RATIO_FOR_MIN_INTERVAL = 0.2
+
+
+def is_scheduled_invocation(event: dict[str, Any]) -> bool:
+    """
+    Returns True when the execution was started by the EventBridge scheduled rule
+    """
+    return event.get("detail-type") == "Scheduled Event"
+
+
+def load_schedule_state(
+    s3_client: Any, bucket_name: str, account_id: str
+) -> dict[str, Any]:
+    """
+    Loads the state of the previous run from S3, returns an empty state on the first run
+    """
+    try:
+        response = s3_client.get_object(
+            Bucket=bucket_name,
+            Key=SCHEDULE_STATE_OBJECT_KEY,
+            ExpectedBucketOwner=account_id,
+        )
+    except s3_client.exceptions.NoSuchKey:
+        logging.info("No previous schedule state found, starting fresh")
+        return {}
+
+    state: dict[str, Any] = json.loads(response["Body"].read())
+    return state
+
+
+def save_schedule_state(
+    s3_client: Any,
+    bucket_name: str,
+    account_id: str,
+    state: dict[str, Any],
+    object_key: str = SCHEDULE_STATE_OBJECT_KEY,
+) -> None:
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=object_key,
+        Body=json.dumps(state).encode("utf-8"),
+        ExpectedBucketOwner=account_id,
+    )
+
+
+def commit_schedule_state(
+    s3_client: Any, bucket_name: str, account_id: str, last_run: int
+) -> None:
+    """
+    Replaces the schedule state by the pending state of the run started at `last_run`,
+    once its analysis query succeeded. Raises a ValueError when the pending state is
+    another run's.
+    """
+    response = s3_client.get_object(
+        Bucket=bucket_name,
+        Key=PENDING_SCHEDULE_STATE_OBJECT_KEY,
+        ExpectedBucketOwner=account_id,
+    )
+    state = json.loads(response["Body"].read())
+    if state.get("last_run") != last_run:
+        raise ValueError(
+            f"The pending schedule state is of the run at {state.get('last_run')}, "
+            f"not {last_run}"
+        )
+
+    save_schedule_state(s3_client, bucket_name, account_id, state)
+
+
+def is_run_due(state: dict[str, Any], now: int) -> bool:
+    """
+    Checks whether the interval picked by the previous run has elapsed
+    """
+    if "last_run" not in state:
+        return True
+
+    next_run: int = state["last_run"] + state["next_interval"]
+    return now >= next_run - SCHEDULE_TOLERANCE_SECONDS
+
+
+def compute_pod_churn(
+    previous_pod_keys: list[str], current_pod_keys: list[str]
+) -> tuple[int, int]:
+    """
+    Returns the number of pods added and removed since the previous snapshot
+    """
+    previous = set(previous_pod_keys)
+    current = set(current_pod_keys)
+
+    return len(current - previous), len(previous - current)
+
+
+def pick_next_interval(
+    pods_added: int,
+    pods_removed: int,
+    previous_pods_count: int,
+    min_interval: int,
+    max_interval: int,
+) -> int:
+    """
+    Picks the next run interval (in seconds) within the configured bounds.
+    An idle cluster is analyzed every `max_interval`, the interval shrinks
+    linearly towards `min_interval` as the pod churn grows.
+    """
+    churn_ratio = (pods_added + pods_removed) / max(previous_pods_count, 1)
+    churn_factor = min(churn_ratio / CHURN_RATIO_FOR_MIN_INTERVAL, 1.0)
+
+    return int(max_interval - (max_interval - min_interval) * churn_factor)
+
+
+def get_query_window_start(state: dict[str, Any], now: int, max_interval: int) -> int:
+    """
+    Returns the start (epoch seconds) of the flow logs window to analyze.
+    The window starts at the previous run, but never spans more than `max_interval`.
+    """
+    oldest_window_start = now - max_interval
+
+    last_run: int = state.get("last_run", oldest_window_start)
+    return max(last_run, oldest_window_start)
@@ -0,0 +1,120 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import logging
+from typing import Any, Callable, Iterator, Optional
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Controllers that are themselves owned by the top-level one: their owner is found by
+# listing all of them at once, not by getting them one by one
+OWNED_CONTROLLER_KINDS = {"ReplicaSet": "Deployment", "Job": "CronJob"}
+
+
+def new_owners_cache() -> dict[str, Any]:
+    """
+    Returns an empty owners cache: the top-level controller name by ReplicaSet or Job UID.
+    Owner references never change, entries are only dropped once no pod refers to them.
+    """
+    return {"owners": {}}
+
+
+def get_controller_reference(metadata: Any) -> Optional[Any]:
+    return next(
+        (
+            reference
+            for reference in metadata.owner_references or []
+            if reference.controller
+        ),
+        None,
+    )
+
+
+def list_controllers(
+    list_function: Callable[..., Any], page_size: int
+) -> Iterator[Any]:
+    continue_token = None
+
+    while True:
+        controllers = list_function(
+            limit=page_size, _continue=continue_token, watch=False
+        )
+        yield from controllers.items
+
+        continue_token = controllers.metadata._continue
+        if not continue_token:
+            break
+
+
+def refresh_owners_cache(
+    cache: dict[str, Any],
+    pods: list[Any],
+    apps_v1_api: Any,
+    batch_v1_api: Any,
+    page_size: int,
+) -> int:
+    """
+    Resolves the ReplicaSets and Jobs owning the pods to their Deployment or CronJob.
+    Each kind with owners missing from the cache is listed once (page by page) for
+    all the pods, returns the number of kinds listed.
+    """
+    list_functions = {
+        "ReplicaSet": apps_v1_api.list_replica_set_for_all_namespaces,
+        "Job": batch_v1_api.list_job_for_all_namespaces,
+    }
+    referenced = {}
+    for pod in pods:
+        reference = get_controller_reference(pod.metadata)
+        if reference is not None and reference.kind in OWNED_CONTROLLER_KINDS:
+            referenced[reference.uid] = reference.kind
+
+    owners = cache["owners"]
+    missing_kinds = {kind for uid, kind in referenced.items() if uid not in owners}
+    for kind in sorted(missing_kinds):
+        for controller in list_controllers(list_functions[kind], page_size):
+            if controller.metadata.uid not in referenced:
+                continue
+            reference = get_controller_reference(controller.metadata)
+            if reference is not None and reference.kind == OWNED_CONTROLLER_KINDS[kind]:
+                owners[controller.metadata.uid] = reference.name
+            else:
+                # A bare ReplicaSet or Job is its own top-level controller
+                owners[controller.metadata.uid] = controller.metadata.name
+
+    cache["owners"] = {uid: owners[uid] for uid in referenced if uid in owners}
+    return len(missing_kinds)
+
+
+def get_workload_name(metadata: Any, cache: dict[str, Any]) -> Optional[str]:
+    """
+    Returns the name of the pod's top-level controller (Deployment, CronJob, StatefulSet,
+    DaemonSet...), None for a bare pod
+    """
+    reference = get_controller_reference(metadata)
+    if reference is None:
+        return None
+
+    name: str = reference.name
+    if reference.kind in OWNED_CONTROLLER_KINDS:
+        name = cache["owners"].get(reference.uid, name)
+    return name
+
+
+def get_app_label_value(labels: dict[str, str], app_labels: list[str]) -> Optional[str]:
+    """
+    Returns the value of the first of the app labels the pod has
+    """
+    return next((labels[label] for label in app_labels if labels.get(label)), None)
@@ -0,0 +1,138 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Serves the cross-AZ traffic results over HTTP, for dashboards and on-call tooling:
+
+    python -m results_query_service --bucket <athena results bucket> --port 8080
+    curl 'localhost:8080/cross-az-traffic?start=2024-10-01T00:00:00Z&end=2024-10-01T06:00:00Z&group_by=app_pair'
+
+start and end are ISO 8601 times or epoch seconds, the last hour by default. group_by is one of
+app_pair, az_pair and app_and_az_pair (default), by_minute=true adds a per-minute breakdown.
+"""
+import argparse
+import datetime
+import json
+import logging
+import time
+import urllib.parse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Any
+
+from .results import DEFAULT_LISTING_TTL_SECONDS
+from .results import DEFAULT_MAX_CACHE_BYTES
+from .results import RESULTS_PREFIX
+from .results import ResultsReader
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RANGE_SECONDS = 3600
+
+
+def parse_time(value: str) -> datetime.datetime:
+    if value.isdigit():
+        return datetime.datetime.fromtimestamp(int(value), tz=datetime.timezone.utc)
+
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def make_handler(reader: ResultsReader) -> type:
+    class CrossAzTrafficHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urllib.parse.urlparse(self.path)
+            if url.path != "/cross-az-traffic":
+                self.send_json(
+                    HTTPStatus.NOT_FOUND, {"error": f"Not found: {url.path}"}
+                )
+                return
+
+            parameters = dict(urllib.parse.parse_qsl(url.query))
+            try:
+                end = (
+                    parse_time(parameters["end"])
+                    if "end" in parameters
+                    else datetime.datetime.now(datetime.timezone.utc)
+                )
+                start = (
+                    parse_time(parameters["start"])
+                    if "start" in parameters
+                    else end - datetime.timedelta(seconds=DEFAULT_RANGE_SECONDS)
+                )
+                started = time.perf_counter()
+                table = reader.get_cross_az_traffic(
+                    start,
+                    end,
+                    group_by=parameters.get("group_by", "app_and_az_pair"),
+                    by_minute=parameters.get("by_minute", "false").lower() == "true",
+                )
+            except ValueError as e:
+                self.send_json(HTTPStatus.BAD_REQUEST, {"error": str(e)})
+                return
+
+            self.send_json(
+                HTTPStatus.OK,
+                {
+                    "start": start.isoformat(),
+                    "end": end.isoformat(),
+                    "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "rows": table.to_pylist(),
+                },
+            )
+
+        def send_json(self, status: HTTPStatus, body: dict[str, Any]) -> None:
+            payload = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            logger.info(format, *args)
+
+    return CrossAzTrafficHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m results_query_service")
+    parser.add_argument("--bucket", required=True, help="The Athena results bucket")
+    parser.add_argument("--prefix", default=RESULTS_PREFIX)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-cache-bytes", type=int, default=DEFAULT_MAX_CACHE_BYTES)
+    parser.add_argument(
+        "--listing-ttl-seconds", type=float, default=DEFAULT_LISTING_TTL_SECONDS
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    reader = ResultsReader(
+        args.bucket,
+        args.prefix,
+        max_cache_bytes=args.max_cache_bytes,
+        listing_ttl_seconds=args.listing_ttl_seconds,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(reader))
+    logger.info(f"Serving s3://{args.bucket}/{args.prefix} on {args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
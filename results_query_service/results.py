@@ -0,0 +1,289 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Answers "cross-AZ bytes by app pair / AZ pair for a time range" straight from the Parquet
+objects of athena-results-table, without an Athena query. The objects are immutable (each
+analysis run INSERTs new ones): they are listed, pruned by time range, and read with column
+projection once, then served from an LRU cache keyed by their ETag.
+"""
+import datetime
+import io
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import boto3
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# s3_prefix of athena-results-table, see AthenaAnalyzer
+RESULTS_PREFIX = "inter-az-traffic/"
+
+# The projected columns, sample_rate (and the fleet tables' source, run_id) are not read
+RESULTS_COLUMNS = {
+    "timestamp": pa.timestamp("s"),
+    "cross_az_traffic": pa.string(),
+    "src_az_id": pa.string(),
+    "dst_az_id": pa.string(),
+    "bytes_transfered": pa.int64(),
+    "packets_transfered": pa.int64(),
+    "bytes_transfered_ci95": pa.int64(),
+}
+
+GROUP_BY_COLUMNS = {
+    "app_pair": ["cross_az_traffic"],
+    "az_pair": ["src_az_id", "dst_az_id"],
+    "app_and_az_pair": ["cross_az_traffic", "src_az_id", "dst_az_id"],
+}
+
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024**2
+
+# Analysis runs are at least 15 minutes apart, a listing is reused for this long
+DEFAULT_LISTING_TTL_SECONDS = 60
+
+
+@dataclass
+class ResultsObject:
+    key: str
+    etag: str
+    last_modified: datetime.datetime
+
+
+class TablesCache:
+    """
+    LRU cache of decoded tables, evicts the least recently used ones above `max_bytes`
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.tables: OrderedDict[str, pa.Table] = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[pa.Table]:
+        with self.lock:
+            table = self.tables.get(key)
+            if table is not None:
+                self.tables.move_to_end(key)
+            return table
+
+    def put(self, key: str, table: pa.Table) -> None:
+        with self.lock:
+            if key in self.tables:
+                return
+            self.tables[key] = table
+            self.bytes += table.nbytes
+            while self.bytes > self.max_bytes and len(self.tables) > 1:
+                _, evicted = self.tables.popitem(last=False)
+                self.bytes -= evicted.nbytes
+
+
+def read_results_table(body: bytes) -> pa.Table:
+    """
+    Decodes the projected columns of a results object. Objects written before a column
+    was added to the table get it as nulls, like Athena reads them.
+    """
+    parquet_file = pq.ParquetFile(io.BytesIO(body))
+    names = [
+        name for name in RESULTS_COLUMNS if name in parquet_file.schema_arrow.names
+    ]
+    table = parquet_file.read(columns=names)
+
+    return pa.table(
+        [
+            (
+                table[name].cast(column_type, safe=False)
+                if name in names
+                else pa.nulls(table.num_rows, column_type)
+            )
+            for name, column_type in RESULTS_COLUMNS.items()
+        ],
+        names=list(RESULTS_COLUMNS),
+    )
+
+
+def to_naive_utc(value: datetime.datetime) -> datetime.datetime:
+    """
+    Athena timestamps are naive UTC
+    """
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def get_time_range(table: pa.Table) -> tuple[Any, Any]:
+    time_range = pc.min_max(table["timestamp"])
+    return time_range["min"].as_py(), time_range["max"].as_py()
+
+
+class ResultsReader:
+    def __init__(
+        self,
+        bucket_name: str,
+        prefix: str = RESULTS_PREFIX,
+        s3_client: Any = None,
+        max_cache_bytes: int = DEFAULT_MAX_CACHE_BYTES,
+        listing_ttl_seconds: float = DEFAULT_LISTING_TTL_SECONDS,
+    ) -> None:
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.s3_client = s3_client or boto3.client("s3")
+        self.listing_ttl_seconds = listing_ttl_seconds
+        self.cache = TablesCache(max_cache_bytes)
+
+        self.listing: list[ResultsObject] = []
+        self.listing_time = float("-inf")
+        # (min, max) timestamps of the objects read so far, kept after their eviction
+        self.time_ranges: dict[str, tuple[Any, Any]] = {}
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.pruned_objects = 0
+
+    def list_objects(self) -> list[ResultsObject]:
+        if time.monotonic() - self.listing_time < self.listing_ttl_seconds:
+            return self.listing
+
+        listing = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=self.prefix):
+            for content in page.get("Contents", []):
+                if content["Size"] == 0:
+                    continue
+                listing.append(
+                    ResultsObject(
+                        content["Key"], content["ETag"], content["LastModified"]
+                    )
+                )
+
+        etags = {results_object.etag for results_object in listing}
+        self.time_ranges = {
+            etag: time_range
+            for etag, time_range in self.time_ranges.items()
+            if etag in etags
+        }
+        self.listing = listing
+        self.listing_time = time.monotonic()
+        return listing
+
+    def is_pruned(
+        self,
+        results_object: ResultsObject,
+        start: datetime.datetime,
+        end: datetime.datetime,
+    ) -> bool:
+        """
+        Whether the object has no rows in [start, end): a run writes the minutes it analyzed,
+        all before the object's creation. Otherwise by the object's time range, once read.
+        """
+        if results_object.last_modified < start:
+            return True
+
+        time_range = self.time_ranges.get(results_object.etag)
+        if time_range is None or time_range[0] is None:
+            return False
+        min_timestamp, max_timestamp = time_range
+        return bool(
+            max_timestamp < to_naive_utc(start) or min_timestamp >= to_naive_utc(end)
+        )
+
+    def get_table(self, results_object: ResultsObject) -> pa.Table:
+        table = self.cache.get(results_object.etag)
+        if table is not None:
+            self.cache_hits += 1
+            return table
+
+        self.cache_misses += 1
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name, Key=results_object.key
+        )
+        table = read_results_table(response["Body"].read())
+        self.time_ranges[results_object.etag] = get_time_range(table)
+        self.cache.put(results_object.etag, table)
+        return table
+
+    def get_cross_az_traffic(
+        self,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        group_by: str = "app_and_az_pair",
+        by_minute: bool = False,
+    ) -> pa.Table:
+        """
+        Returns the cross-AZ bytes and packets between `start` (included) and `end`
+        (excluded), timezone-aware, by app pair, AZ pair or both, and by minute if
+        `by_minute`. The 95% confidence interval half-widths of the summed rows add in
+        quadrature.
+        """
+        if group_by not in GROUP_BY_COLUMNS:
+            raise ValueError(
+                f"group_by must be one of {list(GROUP_BY_COLUMNS)}, got: {group_by}"
+            )
+
+        tables = []
+        for results_object in self.list_objects():
+            if self.is_pruned(results_object, start, end):
+                self.pruned_objects += 1
+                continue
+            tables.append(self.get_table(results_object))
+
+        if tables:
+            table = pa.concat_tables(tables)
+        else:
+            table = pa.schema(list(RESULTS_COLUMNS.items())).empty_table()
+        table = table.filter(
+            pc.and_(
+                pc.greater_equal(
+                    table["timestamp"],
+                    pa.scalar(to_naive_utc(start), RESULTS_COLUMNS["timestamp"]),
+                ),
+                pc.less(
+                    table["timestamp"],
+                    pa.scalar(to_naive_utc(end), RESULTS_COLUMNS["timestamp"]),
+                ),
+            )
+        )
+        table = table.append_column(
+            "bytes_transfered_ci95_squared",
+            pc.multiply(
+                pc.cast(table["bytes_transfered_ci95"], pa.float64()),
+                pc.cast(table["bytes_transfered_ci95"], pa.float64()),
+            ),
+        )
+
+        keys = (["timestamp"] if by_minute else []) + GROUP_BY_COLUMNS[group_by]
+        grouped = table.group_by(keys, use_threads=False).aggregate(
+            [
+                ("bytes_transfered", "sum"),
+                ("packets_transfered", "sum"),
+                ("bytes_transfered_ci95_squared", "sum"),
+            ]
+        )
+        grouped = pa.table(
+            {
+                **{key: grouped[key] for key in keys},
+                "bytes_transfered": grouped["bytes_transfered_sum"],
+                "packets_transfered": grouped["packets_transfered_sum"],
+                "bytes_transfered_ci95": pc.cast(
+                    pc.round(pc.sqrt(grouped["bytes_transfered_ci95_squared_sum"])),
+                    pa.int64(),
+                ),
+            }
+        )
+
+        sort_keys = [("timestamp", "ascending")] if by_minute else []
+        return grouped.sort_by(sort_keys + [("bytes_transfered", "descending")])
@@ -0,0 +1,88 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import pathlib
+from typing import Any
+
+from aws_cdk import Duration
+from aws_cdk import Stack
+from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_s3 as s3
+from constructs import Construct
+
+# What a run estimated over budget does: analyze nothing, or the most recent hours that
+# fit the budget
+SCAN_BUDGET_ACTIONS = ("abort", "narrow-window")
+
+
+class ScanCostEstimator(Construct):
+    def __init__(
+        self,
+        scope: Construct,
+        id: str,
+        flow_logs_bucket: s3.Bucket,
+        scan_budget_bytes: int,
+        scan_budget_action: str = "abort",
+        **kwargs: Any,
+    ) -> None:
+        """
+        Estimates, before each run, the bytes the analysis query scans from the sizes of
+        the flow logs objects in `flow_logs_bucket` of the analyzed window. Over
+        `scan_budget_bytes`, `scan_budget_action` aborts the run or narrows the window
+        """
+        super().__init__(scope, id, **kwargs)
+
+        if scan_budget_action not in SCAN_BUDGET_ACTIONS:
+            raise ValueError(
+                f"scan_budget_action must be one of {SCAN_BUDGET_ACTIONS}, "
+                f"got: {scan_budget_action}"
+            )
+
+        self.lambda_function = self.__create_scan_cost_estimator_lambda_function(
+            flow_logs_bucket, scan_budget_bytes, scan_budget_action
+        )
+        flow_logs_bucket.grant_read(self.lambda_function)
+
+    def __create_scan_cost_estimator_lambda_function(
+        self,
+        flow_logs_bucket: s3.Bucket,
+        scan_budget_bytes: int,
+        scan_budget_action: str,
+    ) -> lambda_.Function:
+        """
+        Creates a Lambda Function that lists the hourly prefixes of the window, the
+        listings of the closed hours are cached across warm invocations
+        """
+        lambda_function = lambda_.Function(
+            self,
+            "scan-cost-estimator-lambda-function",
+            function_name="analysis_scan_cost_estimator",
+            description="Estimates the bytes scanned by the inter-az traffic analysis query",
+            runtime=lambda_.Runtime.PYTHON_3_9,
+            code=lambda_.Code.from_asset(
+                str(pathlib.Path(__file__).parent.joinpath("runtime").resolve())
+            ),
+            handler="estimate_scan_cost.lambda_handler",
+            timeout=Duration.minutes(1),
+            environment={
+                "REGION": Stack.of(self).region,
+                "CURRENT_ACCOUNT_ID": Stack.of(self).account,
+                "FLOW_LOGS_BUCKET_NAME": flow_logs_bucket.bucket_name,
+                "SCAN_BUDGET_BYTES": str(scan_budget_bytes),
+                "SCAN_BUDGET_ACTION": scan_budget_action,
+            },
+            tracing=lambda_.Tracing.ACTIVE,
+        )
+        return lambda_function
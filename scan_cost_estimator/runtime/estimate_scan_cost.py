@@ -0,0 +1,232 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import logging
+import os
+import time
+from typing import Any
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+HTTP_OK = 200
+HTTP_INTERNAL_SERVER_ERROR = 500
+
+REGION = os.getenv("REGION")
+CURRENT_ACCOUNT_ID = os.getenv("CURRENT_ACCOUNT_ID")
+FLOW_LOGS_BUCKET_NAME = os.getenv("FLOW_LOGS_BUCKET_NAME", "")
+SCAN_BUDGET_BYTES = int(os.getenv("SCAN_BUDGET_BYTES", str(100 * 1024**3)))
+# Over budget, the run is aborted ("abort"), its window is left to the next run since
+# the schedule state is only committed once the query succeeded. Or the analyzed window
+# is narrowed to the most recent hours that fit the budget ("narrow-window"), the flow
+# logs of the dropped span are then never analyzed.
+SCAN_BUDGET_ACTIONS = ("abort", "narrow-window")
+SCAN_BUDGET_ACTION = os.getenv("SCAN_BUDGET_ACTION", "abort")
+if SCAN_BUDGET_ACTION not in SCAN_BUDGET_ACTIONS:
+    raise ValueError(
+        f"SCAN_BUDGET_ACTION must be one of {SCAN_BUDGET_ACTIONS}, "
+        f"got: {SCAN_BUDGET_ACTION}"
+    )
+
+# The objects of an hour are all delivered by then, its listing is cached from then on
+# (see the VPC Flow Logs documentation and FlowLogsCompactor)
+HOUR_CLOSED_DELAY_SECONDS = int(os.getenv("HOUR_CLOSED_DELAY_SECONDS", "1200"))
+
+# Per hour partitions, without Hive-compatible names (see VPCFlowLogs destination
+# options)
+FLOW_LOGS_HOUR_PREFIX_TEMPLATE = "AWSLogs/{account_id}/vpcflowlogs/{region}/{hour}/"
+HOUR_PREFIX_FORMAT = "%Y/%m/%d/%H"
+
+SECONDS_PER_HOUR = 3600
+
+# Clients are created on first use and kept across warm invocations
+s3_client = None
+
+# Bytes and objects of the closed hours, kept across warm invocations. Only the hours
+# of the last window are kept.
+hour_listings_cache: dict[str, dict[str, int]] = {}
+
+
+def get_s3_client() -> Any:
+    global s3_client
+
+    if s3_client is None:
+        import boto3
+
+        s3_client = boto3.client("s3", region_name=REGION)
+    return s3_client
+
+
+def lambda_handler(event: dict[str, Any], context: Any) -> dict[str, Any]:
+    """
+    Estimates the bytes the analysis query of the window starting at the event's
+    `window_start` scans, from the sizes of the flow logs objects of the window's hours.
+    Over SCAN_BUDGET_BYTES, the run is aborted (`run_allowed`) or the window narrowed,
+    the span left unanalyzed is returned (`dropped_bytes` and `dropped_seconds`).
+    """
+    try:
+        estimate = estimate_scan(
+            get_s3_client(),
+            FLOW_LOGS_BUCKET_NAME,
+            int(event["window_start"]),
+            int(time.time()),
+            hour_listings_cache,
+            SCAN_BUDGET_BYTES,
+            SCAN_BUDGET_ACTION,
+        )
+    except Exception as exception:
+        error_message = (
+            f"There was a problem estimating the analysis scan cost: {exception}"
+        )
+        logging.warning(error_message)
+        return {"statusCode": HTTP_INTERNAL_SERVER_ERROR, "body": error_message}
+
+    logging.info(f"Analysis scan estimate: {estimate}")
+    return {"statusCode": HTTP_OK, **estimate}
+
+
+def get_hour_prefix(hour_start: int) -> str:
+    return FLOW_LOGS_HOUR_PREFIX_TEMPLATE.format(
+        account_id=CURRENT_ACCOUNT_ID,
+        region=REGION,
+        hour=time.strftime(HOUR_PREFIX_FORMAT, time.gmtime(hour_start)),
+    )
+
+
+def list_hour(s3_client: Any, bucket_name: str, prefix: str) -> dict[str, int]:
+    """
+    Returns the bytes and number of the flow logs objects of an hour
+    """
+    listing = {"bytes": 0, "objects": 0}
+    paginator = s3_client.get_paginator("list_objects_v2")
+
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for content in page.get("Contents", []):
+            # Athena skips the objects whose name starts with an underscore
+            if content["Key"].rsplit("/", 1)[-1].startswith("_"):
+                continue
+            listing["bytes"] += content["Size"]
+            listing["objects"] += 1
+
+    return listing
+
+
+def get_hour_listings(
+    s3_client: Any,
+    bucket_name: str,
+    window_start: int,
+    now: int,
+    cache: dict[str, dict[str, int]],
+) -> list[tuple[int, dict[str, int]]]:
+    """
+    Returns the listings of the hours the window spans, most recent first. Records with
+    a start time in the window are delivered in their hour or in a later one, earlier
+    hours are only read for their Parquet footers by the query.
+    """
+    hour_listings = []
+    hour_starts = range(
+        now // SECONDS_PER_HOUR * SECONDS_PER_HOUR,
+        window_start // SECONDS_PER_HOUR * SECONDS_PER_HOUR - 1,
+        -SECONDS_PER_HOUR,
+    )
+
+    for hour_start in hour_starts:
+        prefix = get_hour_prefix(hour_start)
+        listing = cache.get(prefix)
+        if listing is None:
+            listing = list_hour(s3_client, bucket_name, prefix)
+            hour_closed = (
+                hour_start + SECONDS_PER_HOUR + HOUR_CLOSED_DELAY_SECONDS <= now
+            )
+            if hour_closed:
+                cache[prefix] = listing
+        hour_listings.append((hour_start, listing))
+
+    window_prefixes = {get_hour_prefix(hour_start) for hour_start in hour_starts}
+    for prefix in list(cache):
+        if prefix not in window_prefixes:
+            del cache[prefix]
+
+    return hour_listings
+
+
+def estimate_scan(
+    s3_client: Any,
+    bucket_name: str,
+    window_start: int,
+    now: int,
+    cache: dict[str, dict[str, int]],
+    budget_bytes: int,
+    budget_action: str,
+) -> dict[str, Any]:
+    """
+    Estimates the flow logs bytes scanned by the query of the window, from the objects
+    of the window's hour prefixes only. It is not a bound: the query only reads some of
+    the flow logs columns and skips row groups by their statistics, but the flow logs
+    table is not partitioned, so Athena also lists the whole bucket and reads the
+    Parquet footers of every hour, and it reads the metadata tables. Over
+    `budget_bytes`, the run is not allowed ("abort"), its window is left to the next
+    run. Or the window start is moved to the oldest hour that keeps the estimate within
+    the budget ("narrow-window"), a narrowed window must still hold flow logs, the run
+    is not allowed otherwise. The bytes and seconds of the window the run leaves
+    unanalyzed for good are returned.
+    """
+    if budget_action not in SCAN_BUDGET_ACTIONS:
+        raise ValueError(
+            f"budget_action must be one of {SCAN_BUDGET_ACTIONS}, got: {budget_action}"
+        )
+
+    hour_listings = get_hour_listings(s3_client, bucket_name, window_start, now, cache)
+    estimated_bytes = sum(listing["bytes"] for _, listing in hour_listings)
+    estimate: dict[str, Any] = {
+        "estimated_bytes_scanned": estimated_bytes,
+        "scan_budget_bytes": budget_bytes,
+        "objects": sum(listing["objects"] for _, listing in hour_listings),
+        "run_allowed": True,
+        "dropped_bytes": 0,
+        "dropped_seconds": 0,
+        "query_parameters": {"window_start": str(window_start)},
+    }
+    if estimated_bytes <= budget_bytes:
+        estimate["body"] = f"{estimated_bytes} bytes to scan, within the budget"
+        return estimate
+
+    narrowed_window_start = None
+    narrowed_bytes = 0
+    if budget_action == "narrow-window":
+        for hour_start, listing in hour_listings:
+            if narrowed_bytes + listing["bytes"] > budget_bytes:
+                break
+            narrowed_window_start = hour_start
+            narrowed_bytes += listing["bytes"]
+
+    if narrowed_window_start is None or narrowed_bytes == 0:
+        estimate["run_allowed"] = False
+        estimate["body"] = (
+            f"Analysis aborted: {estimated_bytes} bytes to scan, "
+            f"over the {budget_bytes} bytes budget, the window is left to the next run"
+        )
+        return estimate
+
+    estimate["estimated_bytes_scanned"] = narrowed_bytes
+    estimate["dropped_bytes"] = estimated_bytes - narrowed_bytes
+    estimate["dropped_seconds"] = narrowed_window_start - window_start
+    estimate["query_parameters"]["window_start"] = str(narrowed_window_start)
+    estimate["body"] = (
+        f"Window narrowed to start at {narrowed_window_start}: {narrowed_bytes} bytes "
+        f"to scan instead of {estimated_bytes}, over the {budget_bytes} bytes budget, "
+        f"{estimate['dropped_seconds']}s of flow logs are left unanalyzed"
+    )
+    return estimate
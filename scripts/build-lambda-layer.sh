@@ -0,0 +1,47 @@
+#!/bin/bash
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Builds the Lambda Layer of a component (pod_metadata_extractor by default) from its runtime dependencies,
+# trimmed of what the Lambda Function never loads, with bytecode precompiled for the
+# Lambda Python runtime: the layer is read-only, so bytecode can not be cached at cold-start.
+
+set -o errexit
+
+COMPONENT="${1:-pod_metadata_extractor}"
+LAYER_DIR="${COMPONENT}/requirements_layer/python"
+# Python version of the Lambda Function runtime (lambda_.Runtime.PYTHON_3_9)
+LAMBDA_PYTHON="${LAMBDA_PYTHON:-python3.9}"
+
+rm -rf "${LAYER_DIR}"
+# Binary wheels (pyarrow) are installed for the Lambda platform, not the build host
+pip install --no-compile -r "${COMPONENT}/runtime/requirements.txt" --target "${LAYER_DIR}" \
+    --platform manylinux2014_x86_64 --implementation cp --python-version 3.9 --only-binary=:all:
+
+# boto3 and its dependencies are provided by the Lambda Python runtime
+rm -rf "${LAYER_DIR}"/boto3* "${LAYER_DIR}"/botocore* "${LAYER_DIR}"/s3transfer* "${LAYER_DIR}"/jmespath*
+
+# Tests and stale bytecode are never loaded
+find "${LAYER_DIR}" -type d \( -name tests -o -name test -o -name __pycache__ \) -prune -exec rm -rf {} +
+
+if command -v "${LAMBDA_PYTHON}" > /dev/null; then
+    # Asset zips do not keep the files' mtimes, hash based .pyc files stay valid
+    "${LAMBDA_PYTHON}" -m compileall -q -j 0 --invalidation-mode unchecked-hash "${LAYER_DIR}"
+else
+    echo "${LAMBDA_PYTHON} not found, the layer is not precompiled (slower cold-starts)"
+fi
+
+du -sh "${LAYER_DIR}"
@@ -24,5 +24,8 @@ npm install
 # Install project dependencies
 pip install -r pod_metadata_extractor/runtime/requirements.txt -r requirements.txt
 
-# Install runtime dependencies for pod_metadata_extractor lambda layer
-pip install -r pod_metadata_extractor/runtime/requirements.txt --target pod_metadata_extractor/requirements_layer/python/
+# Build the trimmed pod_metadata_extractor lambda layer from the runtime dependencies
+./scripts/build-lambda-layer.sh
+
+# Build the flow_logs_compactor lambda layer (pyarrow)
+./scripts/build-lambda-layer.sh flow_logs_compactor
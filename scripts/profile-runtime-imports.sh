@@ -0,0 +1,31 @@
+#!/bin/bash
+
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Profiles the import time of the pod_metadata_extractor runtime, including the
+# lazily imported kubernetes client, against the built Lambda Layer.
+# Usage: ./scripts/profile-runtime-imports.sh [modules to import...]
+
+set -o errexit
+
+LAYER_DIR="pod_metadata_extractor/requirements_layer/python"
+MODULES="${*:-get_pods kubernetes.client kubernetes.config}"
+
+IMPORTS=$(printf "import %s;" ${MODULES})
+
+PYTHONPATH="pod_metadata_extractor/runtime:${LAYER_DIR}" python -X importtime -c "${IMPORTS}" 2>&1 \
+    | sort -t '|' -k 2 -n -r \
+    | head -n 30
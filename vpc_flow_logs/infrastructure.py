@@ -20,7 +20,9 @@ from aws_cdk import aws_s3 as s3
 from constructs import Construct
 
 FLOW_LOGS_FORMAT = (
-    "${az-id} ${flow-direction} ${pkt-srcaddr} ${pkt-dstaddr} ${start} ${bytes}"
+    "${az-id} ${flow-direction} ${pkt-srcaddr} ${pkt-dstaddr} ${start} ${bytes} "
+    "${packets} ${subnet-id} ${interface-id} "
+    "${pkt-src-aws-service} ${pkt-dst-aws-service} ${traffic-path}"
 )
 
 